@@ -0,0 +1,190 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Activities per second of a worker running blocking and async activities, with and without an activity executor
+
+Each workflow runs ``--activities`` activities at the same time, a ``--blocking-ratio`` of them blocking, calling a
+synchronous client that answers after ``--latency`` seconds, the others async, awaiting an answer as long. Each
+``--mode`` runs the blocking activities as a worker can:
+
+- ``event-loop``: defined with ``async def``, so they block the event loop of the worker, as the currency conversion
+  once did with ``requests``
+- ``executor``: defined with ``def``, run by Temporal in the executor of the loan worker, ``create_activity_executor``,
+  with a thread per activity slot
+
+A line is printed per mode, with the activities per second and how late the async activities got their answer:
+
+    python -m benchmarks.activity_executor --workflows 50 --activities 20 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from datetime import timedelta
+from typing import List, Optional
+
+from temporalio import activity, workflow
+from temporalio.client import Client
+from temporalio.worker import UnsandboxedWorkflowRunner, Worker
+
+from benchmarks.load_test import _percentile, start_environment
+from kuflow_samples_temporal_loan.configuration import SamplesConfiguration
+from kuflow_samples_temporal_loan.worker import create_activity_executor
+
+
+MODES = ("event-loop", "executor")
+
+_ASYNC_ACTIVITY = "Benchmark_asyncCall"
+_BLOCKING_ACTIVITY = "Benchmark_blockingCall"
+
+
+@workflow.defn(name="BenchmarkMixedActivities")
+class MixedActivitiesWorkflow:
+    @workflow.run
+    async def run(self, blocking_activities: int, async_activities: int, latency: float) -> None:
+        names = [_BLOCKING_ACTIVITY] * blocking_activities + [_ASYNC_ACTIVITY] * async_activities
+        await asyncio.gather(
+            *(workflow.execute_activity(name, latency, start_to_close_timeout=timedelta(minutes=5)) for name in names)
+        )
+
+
+class _MixedActivities:
+    def __init__(self) -> None:
+        # Seconds each async activity got its answer after it was due
+        self.async_lags: List[float] = []
+
+    @activity.defn(name=_ASYNC_ACTIVITY)
+    async def async_call(self, latency: float) -> None:
+        due_at = time.perf_counter() + latency
+        await asyncio.sleep(latency)
+        self.async_lags.append(time.perf_counter() - due_at)
+
+    @activity.defn(name=_BLOCKING_ACTIVITY)
+    def blocking_call(self, latency: float) -> None:
+        time.sleep(latency)
+
+    @activity.defn(name=_BLOCKING_ACTIVITY)
+    async def blocking_call_on_event_loop(self, latency: float) -> None:
+        time.sleep(latency)
+
+
+async def measure(
+    mode: str,
+    client: Client,
+    *,
+    workflows: int,
+    activities: int,
+    blocking_ratio: float,
+    latency: float,
+    max_concurrent_activities: int,
+) -> str:
+    task_queue = f"activity-executor-{uuid.uuid4()}"
+    mixed_activities = _MixedActivities()
+    blocking_activities = round(activities * blocking_ratio)
+
+    activity_executor = None
+    if mode == "executor":
+        activity_executor = create_activity_executor(
+            SamplesConfiguration(
+                kuflow_api_client_id="benchmark",
+                kuflow_api_client_secret="benchmark",
+                temporal_queue=task_queue,
+                temporal_worker_max_concurrent_activities=max_concurrent_activities,
+            )
+        )
+        blocking_call = mixed_activities.blocking_call
+    else:
+        blocking_call = mixed_activities.blocking_call_on_event_loop
+
+    worker = Worker(
+        client,
+        task_queue=task_queue,
+        workflows=[MixedActivitiesWorkflow],
+        activities=[mixed_activities.async_call, blocking_call],
+        activity_executor=activity_executor,
+        max_concurrent_activities=max_concurrent_activities,
+        # The workflow only schedules the activities, which are what is measured
+        workflow_runner=UnsandboxedWorkflowRunner(),
+    )
+    try:
+        async with worker:
+            started_at = time.perf_counter()
+            await asyncio.gather(
+                *(
+                    client.execute_workflow(
+                        MixedActivitiesWorkflow.run,
+                        args=[blocking_activities, activities - blocking_activities, latency],
+                        id=f"{task_queue}-{index}",
+                        task_queue=task_queue,
+                    )
+                    for index in range(workflows)
+                )
+            )
+            elapsed = time.perf_counter() - started_at
+    finally:
+        if activity_executor is not None:
+            activity_executor.shutdown()
+
+    lags = mixed_activities.async_lags
+    return (
+        f"{mode:<10} {workflows * activities / elapsed:8.1f} activities/s   async activities late "
+        f"p50 {_percentile(lags, 50) * 1000:7.2f} ms   p99 {_percentile(lags, 99) * 1000:7.2f} ms"
+    )
+
+
+async def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.activity_executor", description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=MODES, action="append", help="default all the modes")
+    parser.add_argument("--workflows", type=int, default=50, help="workflows to run, all at the same time")
+    parser.add_argument("--activities", type=int, default=20, help="activities run at the same time by each workflow")
+    parser.add_argument("--blocking-ratio", type=float, default=0.5, help="fraction of the activities that block")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds each activity waits for its answer")
+    parser.add_argument("--max-concurrent-activities", type=int, default=100, help="activity slots of the worker")
+    parser.add_argument(
+        "--server",
+        default="fake",
+        help="local (dev server), time-skipping (test server), fake (in-process stand-in) or host:port of a server",
+    )
+    args = parser.parse_args(arguments)
+
+    async with await start_environment(args.server) as environment:
+        for mode in args.mode or MODES:
+            print(
+                await measure(
+                    mode,
+                    environment.client,
+                    workflows=args.workflows,
+                    activities=args.activities,
+                    blocking_ratio=args.blocking_ratio,
+                    latency=args.latency,
+                    max_concurrent_activities=args.max_concurrent_activities,
+                )
+            )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
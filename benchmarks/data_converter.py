@@ -0,0 +1,105 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""Encode and decode time of the KuFlow models, with the KuFlow converter and with the typed converter
+
+Uses the requests and responses of a run of each sample, built from realistic process items.
+
+    python -m benchmarks.data_converter --comments-size 500 --iterations 2000
+"""
+
+import argparse
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+from kuflow_temporal_common import KuFlowComposableEncodingPayloadConverter
+from temporalio.converter import EncodingPayloadConverter
+
+from benchmarks.payloads import workflow_run_values
+from benchmarks.samples import SAMPLES, TYPED_MODEL_PAYLOAD_CONVERTER
+
+
+def measure(function: Callable[[], Any], *, iterations: int) -> float:
+    """Seconds per call"""
+
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        function()
+
+    return (time.perf_counter() - started_at) / iterations
+
+
+def measure_converter(converter: EncodingPayloadConverter, values: List[Any], *, iterations: int) -> Dict[str, tuple]:
+    """Encode and decode seconds of each model, summed for the values of the same model"""
+
+    times: Dict[str, List[float]] = defaultdict(lambda: [0.0, 0.0])
+    for value in values:
+        payload = converter.to_payload(value)
+        times[type(value).__name__][0] += measure(
+            lambda value=value: converter.to_payload(value), iterations=iterations
+        )
+        times[type(value).__name__][1] += measure(
+            lambda payload=payload, type_hint=type(value): converter.from_payload(payload, type_hint),
+            iterations=iterations,
+        )
+
+    return {name: tuple(encode_decode) for name, encode_decode in times.items()}
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.data_converter", description=__doc__.splitlines()[0])
+    parser.add_argument("--comments-size", type=int, default=500, help="characters of free text in the task data")
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args(arguments)
+
+    kuflow_converter = KuFlowComposableEncodingPayloadConverter()
+
+    print(f"{'model':34} {'encode':>9} {'typed':>9} {'decode':>9} {'typed':>9}")
+    for name, sample in sorted(SAMPLES.items()):
+        values = workflow_run_values(sample, comments_size=args.comments_size)
+        kuflow_times = measure_converter(kuflow_converter, values, iterations=args.iterations)
+        typed_times = measure_converter(TYPED_MODEL_PAYLOAD_CONVERTER, values, iterations=args.iterations)
+
+        print(f"{name} sample")
+        for model, (encode, decode) in kuflow_times.items():
+            typed_encode, typed_decode = typed_times[model]
+            print(
+                f"  {model:32} {encode * 1e6:>7.1f}us {typed_encode * 1e6:>7.1f}us "
+                f"{decode * 1e6:>7.1f}us {typed_decode * 1e6:>7.1f}us"
+            )
+
+        encode, decode = (sum(it) for it in zip(*kuflow_times.values()))
+        typed_encode, typed_decode = (sum(it) for it in zip(*typed_times.values()))
+        print(
+            f"  {'whole run':32} {encode * 1e6:>7.1f}us {typed_encode * 1e6:>7.1f}us "
+            f"{decode * 1e6:>7.1f}us {typed_decode * 1e6:>7.1f}us"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
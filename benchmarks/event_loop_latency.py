@@ -0,0 +1,146 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Event loop latency of a worker while many currency conversions are in flight
+
+Runs ``--conversions`` conversions, ``--concurrency`` at a time, that all miss the conversion table cache and call a
+local stand-in of the currency endpoint answering after ``--endpoint-latency`` seconds. Meanwhile a probe, standing in
+for the other activities of the worker, wakes up every millisecond and measures how late the event loop runs it. Each
+``--mode`` calls the endpoint as a version of the activity did:
+
+- ``blocking``: ``requests`` right in the event loop, as the activity originally did
+- ``default-executor``: in the default executor of the loop, through ``asyncio.to_thread``
+- ``executor``: in the thread pool of the activities, as it does now
+
+    python -m benchmarks.event_loop_latency --conversions 500 --concurrency 100 --endpoint-latency 0.05
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from typing import List, Optional
+
+from benchmarks.fake_kuflow import CURRENCY_RATES, FakeKuFlowServer
+from benchmarks.load_test import _percentile
+from kuflow_samples_temporal_loan.activities import CurrencyConversionActivities
+
+
+MODES = ("blocking", "default-executor", "executor")
+
+
+class _BlockingCurrencyConversionActivities(CurrencyConversionActivities):
+    async def _retrieve_conversion_table(self, base_currency: str) -> dict:
+        response = self._http_get(f"{self._endpoint}/{base_currency}.json")
+        response.raise_for_status()
+
+        return response.json()[base_currency]
+
+
+class _DefaultExecutorCurrencyConversionActivities(CurrencyConversionActivities):
+    async def _retrieve_conversion_table(self, base_currency: str) -> dict:
+        async with self._semaphore:
+            response = await asyncio.to_thread(self._http_get, f"{self._endpoint}/{base_currency}.json")
+        response.raise_for_status()
+
+        return response.json()[base_currency]
+
+
+_ACTIVITIES = {
+    "blocking": _BlockingCurrencyConversionActivities,
+    "default-executor": _DefaultExecutorCurrencyConversionActivities,
+    "executor": CurrencyConversionActivities,
+}
+
+
+async def measure(
+    mode: str, *, endpoint: str, conversions: int, concurrency: int, max_concurrent_requests: int, interval: float
+) -> str:
+    activities = _ACTIVITIES[mode](
+        endpoint=endpoint, max_connections=max_concurrent_requests, max_concurrent_requests=max_concurrent_requests
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+    currencies = sorted(CURRENCY_RATES)
+    lags: List[float] = []
+    probing = True
+
+    async def probe() -> None:
+        while probing:
+            expected_at = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - expected_at)
+
+    async def convert(index: int) -> None:
+        async with semaphore:
+            # Straight to the endpoint, as when every conversion misses the cache
+            await activities._retrieve_conversion_table(currencies[index % len(currencies)])
+
+    probe_task = asyncio.create_task(probe())
+    started_at = time.perf_counter()
+    try:
+        await asyncio.gather(*(convert(index) for index in range(conversions)))
+    finally:
+        elapsed = time.perf_counter() - started_at
+        probing = False
+        await probe_task
+        activities.close()
+
+    return (
+        f"{mode:<17} {conversions / elapsed:8.1f} conversions/s   event loop lag "
+        f"p50 {_percentile(lags, 50) * 1000:7.2f} ms   p99 {_percentile(lags, 99) * 1000:7.2f} ms   "
+        f"max {max(lags, default=0) * 1000:7.2f} ms"
+    )
+
+
+async def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.event_loop_latency", description=__doc__.splitlines()[0]
+    )
+    parser.add_argument("--mode", choices=MODES, action="append", help="default all the modes")
+    parser.add_argument("--conversions", type=int, default=500, help="conversions to run")
+    parser.add_argument("--concurrency", type=int, default=100, help="conversions in flight at the same time")
+    parser.add_argument(
+        "--max-concurrent-requests", type=int, default=10, help="endpoint calls allowed at a time by the activities"
+    )
+    parser.add_argument("--endpoint-latency", type=float, default=0.05, help="seconds the endpoint takes to answer")
+    parser.add_argument("--probe-interval", type=float, default=0.001, help="seconds between wake-ups of the probe")
+    args = parser.parse_args(arguments)
+
+    with FakeKuFlowServer(latency=args.endpoint_latency) as server:
+        for mode in args.mode or MODES:
+            print(
+                await measure(
+                    mode,
+                    endpoint=server.currency_endpoint,
+                    conversions=args.conversions,
+                    concurrency=args.concurrency,
+                    max_concurrent_requests=args.max_concurrent_requests,
+                    interval=args.probe_interval,
+                )
+            )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,276 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import json
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+# Conversion tables served by the currency endpoint stand-in, relative to one unit of the base currency
+CURRENCY_RATES = {"eur": 1.0, "usd": 1.08, "gbp": 0.85}
+
+_PROCESS = re.compile(r"^(?:/v[\d-]+)?/processes/(?P<id>[^/]+)$")
+_PROCESS_METADATA = re.compile(r"^(?:/v[\d-]+)?/processes/(?P<id>[^/]+)/metadata$")
+_PROCESS_ITEMS = re.compile(r"^(?:/v[\d-]+)?/process-items$")
+_PROCESS_ITEM = re.compile(r"^(?:/v[\d-]+)?/process-items/(?P<id>[^/]+)$")
+_PROCESS_ITEM_TASK_DATA = re.compile(r"^(?:/v[\d-]+)?/process-items/(?P<id>[^/]+)/task/data$")
+_PROCESS_ITEM_TASK_COMPLETE = re.compile(r"^(?:/v[\d-]+)?/process-items/(?P<id>[^/]+)/task/~actions/complete$")
+_CURRENCY = re.compile(r"^/currencies/(?P<base>[a-z]+)\.json$")
+
+
+@dataclass
+class KuFlowFault:
+    """Fault of the next ``times`` requests of ``method`` whose path matches the ``path`` regular expression"""
+
+    method: str
+    path: str
+    times: int = 1
+    # Seconds the request hangs before it is answered, or until the server stops
+    hang: float = 0
+    # Status of the error answered instead of serving the request
+    status: Optional[int] = None
+
+
+class FakeKuFlowServer:
+    """Local HTTP stand-in for the KuFlow REST API and the currency conversion endpoint
+
+    Serves, from memory, the few operations the sample activities call, each one delayed by ``latency`` seconds to
+    stand in for the network and the KuFlow API. ``on_process_item_created`` is called, from the server thread, with
+    every process item the workflows create, so a driver can play the humans completing the tasks. ``faults`` make
+    some requests hang or fail, to test how the workers recover.
+    """
+
+    def __init__(
+        self,
+        *,
+        latency: float = 0,
+        tenant_id: str = "tenant",
+        on_process_item_created: Optional[Callable[[Dict[str, Any]], None]] = None,
+        faults: Sequence[KuFlowFault] = (),
+    ):
+        self.latency = latency
+        self.tenant_id = tenant_id
+        self.on_process_item_created = on_process_item_created
+
+        self._lock = threading.Lock()
+        self._processes: Dict[str, Dict[str, Any]] = {}
+        self._process_items: Dict[str, Dict[str, Any]] = {}
+        # Pending faults, with the requests each one has left
+        self._faults: List[List[Any]] = [[fault, fault.times] for fault in faults]
+        self._stopped = threading.Event()
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(self))
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        """Endpoint of the KuFlow REST API stand-in"""
+
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def currency_endpoint(self) -> str:
+        """Endpoint of the currency conversion stand-in"""
+
+        return f"{self.endpoint}/currencies"
+
+    def start(self) -> "FakeKuFlowServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-kuflow", daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self) -> None:
+        # Releases the hanging requests
+        self._stopped.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeKuFlowServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def create_process(self, process_id: str, *, initiator_id: str = "initiator") -> Dict[str, Any]:
+        """Register a process, as KuFlow does before starting its workflow"""
+
+        process = {
+            "id": process_id,
+            "state": "RUNNING",
+            "tenantId": self.tenant_id,
+            "initiatorId": initiator_id,
+            "metadata": {"value": {}},
+        }
+        with self._lock:
+            self._processes[process_id] = process
+
+        return process
+
+    def complete_task(self, process_item_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Fill in and complete a task, as a user does in the KuFlow APP"""
+
+        with self._lock:
+            process_item = self._process_items[process_item_id]
+            process_item["task"]["data"] = {"value": data}
+            process_item["task"]["state"] = "COMPLETED"
+
+            return process_item
+
+    def inject(self, fault: KuFlowFault) -> None:
+        with self._lock:
+            self._faults.append([fault, fault.times])
+
+    def _fault(self, method: str, path: str) -> Optional[KuFlowFault]:
+        with self._lock:
+            for pending in self._faults:
+                fault, times = pending
+                if times > 0 and fault.method == method and re.search(fault.path, path):
+                    pending[1] = times - 1
+                    return fault
+
+        return None
+
+    def _handle(self, method: str, path: str, body: Optional[Dict[str, Any]]):
+        if method == "GET" and (match := _CURRENCY.match(path)):
+            base = match["base"]
+            if base not in CURRENCY_RATES:
+                return 404, None
+            rates = {currency: rate / CURRENCY_RATES[base] for currency, rate in CURRENCY_RATES.items()}
+            return 200, {"date": datetime.now(timezone.utc).date().isoformat(), base: rates}
+
+        with self._lock:
+            if method == "GET" and (match := _PROCESS.match(path)):
+                return self._found(self._processes.get(match["id"]))
+
+            if method == "PATCH" and (match := _PROCESS_METADATA.match(path)):
+                process = self._processes.get(match["id"])
+                if process is not None:
+                    for operation in body:
+                        process["metadata"]["value"][operation["path"].lstrip("/")] = operation.get("value")
+                return self._found(process)
+
+            if method == "POST" and _PROCESS_ITEMS.match(path):
+                process_item = self._create_process_item(body)
+            elif method == "GET" and (match := _PROCESS_ITEM.match(path)):
+                return self._found(self._process_items.get(match["id"]))
+            elif method == "PUT" and (match := _PROCESS_ITEM_TASK_DATA.match(path)):
+                process_item = self._process_items.get(match["id"])
+                if process_item is not None:
+                    process_item["task"]["data"] = body["data"]
+                return self._found(process_item)
+            elif method == "POST" and (match := _PROCESS_ITEM_TASK_COMPLETE.match(path)):
+                process_item = self._process_items.get(match["id"])
+                if process_item is not None:
+                    process_item["task"]["state"] = "COMPLETED"
+                return self._found(process_item)
+            else:
+                return 404, None
+
+        # Only a process item creation gets here, notified out of the lock
+        if self.on_process_item_created is not None:
+            self.on_process_item_created(process_item)
+
+        return 201, process_item
+
+    def _create_process_item(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        task = params.get("task") or {}
+        process_item = {
+            "id": params.get("id") or str(uuid.uuid4()),
+            "type": params["type"],
+            "processId": params["processId"],
+            "ownerId": params.get("ownerId"),
+            "tenantId": self.tenant_id,
+            "processItemDefinitionRef": {
+                "id": str(uuid.uuid5(uuid.NAMESPACE_OID, params["processItemDefinitionCode"])),
+                "version": "1",
+                "code": params["processItemDefinitionCode"],
+            },
+            "task": {"state": "READY", "data": task.get("data") or {"value": {}}},
+        }
+        self._process_items[process_item["id"]] = process_item
+
+        return process_item
+
+    @staticmethod
+    def _found(resource: Optional[Dict[str, Any]]):
+        if resource is None:
+            return 404, {"status": 404, "message": "Not found"}
+
+        return 200, resource
+
+
+def _handler(server: FakeKuFlowServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # The headers and the body are written apart, Nagle's algorithm would hold the body until the client acks
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+        def do_PUT(self):
+            self._dispatch("PUT")
+
+        def do_PATCH(self):
+            self._dispatch("PATCH")
+
+        def _dispatch(self, method: str):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else None
+
+            if server.latency:
+                time.sleep(server.latency)
+
+            path = self.path.split("?", 1)[0]
+            fault = server._fault(method, path)
+            if fault is not None and fault.hang:
+                server._stopped.wait(fault.hang)
+            if fault is not None and fault.status is not None:
+                status, payload = fault.status, {"status": fault.status, "message": "Fault injected"}
+            else:
+                status, payload = server._handle(method, path, body)
+
+            content = json.dumps(payload).encode("utf-8") if payload is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return Handler
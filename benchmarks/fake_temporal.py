@@ -0,0 +1,1305 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""In-process stand-in for the Temporal frontend service
+
+Serves, from memory, the part of the Temporal gRPC API the SDK client and workers use to run the sample workflows.
+Workflow tasks are turned into history events as the Temporal server does, so the recorded histories replay with the
+``Replayer``, but it is no Temporal server: a history that replays here has not been checked against one. Record the
+replay fixtures with a real server, see ``scripts/record_histories.sh``.
+
+Modelled, as the Temporal server does:
+
+- starting workflows, with memo, search attributes and headers, signalling them and reading their histories
+- workflow tasks: polling, completion, failure and timeout, sticky task queues with their schedule to start timeout
+  and the reset of the sticky queue, and the signals received while a task runs, buffered until it completes
+- the commands of activities, timers, markers (local activities, patches), search attribute upserts, memo
+  modification, workflow completion and failure, and continue-as-new
+- activity tasks: polling, completion, failure and cancellation, heartbeats with their details, the retry policies
+  and the start to close, schedule to close and heartbeat timeouts
+- the continue-as-new suggestion, at 4 Ki events or 4 MiB of history, and the history size sent to the workers
+
+Not modelled: the cancellation and termination of workflows, child workflows, external signals, queries, updates,
+workflow retries, cron schedules, the workflow execution and run timeouts, the activity schedule to start timeout,
+search, namespaces other than the one given, authentication and the persistence of the histories, lost with the
+process. The history size is the size of the events as serialized here, close to but not exactly the size the server
+reports.
+
+``time_scale`` aside, the durations are the ones of the server. It needs ``grpcio``, a development dependency of the
+repository, as the Temporal SDK does not depend on it.
+"""
+
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+import grpc
+from google.protobuf.duration_pb2 import Duration
+from google.protobuf.timestamp_pb2 import Timestamp
+from temporalio.api.common.v1 import message_pb2 as common
+from temporalio.api.enums.v1 import command_type_pb2, event_type_pb2, failed_cause_pb2, namespace_pb2, task_queue_pb2
+from temporalio.api.enums.v1 import workflow_pb2 as workflow_enums
+from temporalio.api.failure.v1 import message_pb2 as failure
+from temporalio.api.history.v1 import message_pb2 as history
+from temporalio.api.namespace.v1 import message_pb2 as namespace
+from temporalio.api.taskqueue.v1 import message_pb2 as task_queue
+from temporalio.api.workflowservice.v1 import request_response_pb2 as service
+from temporalio.api.workflowservice.v1 import service_pb2_grpc
+
+
+EventType = event_type_pb2.EventType
+CommandType = command_type_pb2.CommandType
+RetryState = workflow_enums.RetryState
+HISTORY_EVENT_FILTER_TYPE_CLOSE_EVENT = workflow_enums.HISTORY_EVENT_FILTER_TYPE_CLOSE_EVENT
+TimeoutType = workflow_enums.TimeoutType
+
+# As the Temporal server defaults
+DEFAULT_WORKFLOW_TASK_TIMEOUT = timedelta(seconds=10)
+DEFAULT_RETRY_INITIAL_INTERVAL = timedelta(seconds=1)
+DEFAULT_RETRY_BACKOFF_COEFFICIENT = 2.0
+SUGGEST_CONTINUE_AS_NEW_HISTORY_LENGTH = 4 * 1024
+SUGGEST_CONTINUE_AS_NEW_HISTORY_SIZE = 4 * 1024 * 1024
+
+
+class FakeTemporalServer:
+    """Temporal frontend stand-in listening on ``target``, served from its own thread
+
+    ``time_scale`` multiplies the durations the server enforces: the activity timeouts and retry intervals, also sent
+    scaled to the workers, and the workflow timers. Tests can then observe a ten minute timeout in a fraction of a
+    second, while the histories keep the durations the workflows asked for. ``poll_timeout`` is how long the polls
+    wait for a task before returning an empty one.
+    """
+
+    def __init__(self, *, namespace: str = "default", time_scale: float = 1, poll_timeout: float = 10):
+        self.namespace = namespace
+        self.time_scale = time_scale
+        self.poll_timeout = poll_timeout
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._server: Optional[grpc.aio.Server] = None
+        self._port = 0
+        self._started = threading.Event()
+        self._state: Optional[_State] = None
+
+    @property
+    def target(self) -> str:
+        """host:port to connect the clients to"""
+
+        return f"127.0.0.1:{self._port}"
+
+    def start(self) -> "FakeTemporalServer":
+        self._thread = threading.Thread(target=self._serve, name="fake-temporal", daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+        return self
+
+    def stop(self) -> None:
+        if self._loop is None:
+            return
+
+        asyncio.run_coroutine_threadsafe(self._server.stop(grace=None), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def __enter__(self) -> "FakeTemporalServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def history_events(self, workflow_id: str) -> List[history.HistoryEvent]:
+        """Events of all the runs of a workflow, as a copy"""
+
+        async def events():
+            return [history.HistoryEvent().FromString(it.SerializeToString()) for it in self._state.events(workflow_id)]
+
+        return asyncio.run_coroutine_threadsafe(events(), self._loop).result()
+
+    def workflow_pollers(self, task_queue: str) -> Set[str]:
+        """Identities of the workers that polled the workflow tasks of ``task_queue``, one per worker process"""
+
+        async def pollers():
+            return set(self._state.workflow_pollers.get(task_queue, ()))
+
+        return asyncio.run_coroutine_threadsafe(pollers(), self._loop).result()
+
+    def _serve(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+
+        self._state = _State(self)
+        self._server = grpc.aio.server(options=[("grpc.max_receive_message_length", 128 * 1024 * 1024)])
+        service_pb2_grpc.add_WorkflowServiceServicer_to_server(_WorkflowService(self._state), self._server)
+        self._port = self._server.add_insecure_port("127.0.0.1:0")
+        self._loop.run_until_complete(self._server.start())
+        self._started.set()
+
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+
+class _NotFound(Exception):
+    pass
+
+
+class _TaskQueue:
+    """Tasks waiting for a poller, and pollers waiting for a task"""
+
+    def __init__(self) -> None:
+        self._tasks: Deque[Any] = deque()
+        self._pollers: Deque[asyncio.Future] = deque()
+
+    def put(self, task: Any) -> None:
+        while self._pollers:
+            poller = self._pollers.popleft()
+            if not poller.done():
+                poller.set_result(task)
+                return
+
+        self._tasks.append(task)
+
+    async def get(self, timeout: float) -> Optional[Any]:
+        if self._tasks:
+            return self._tasks.popleft()
+
+        poller = asyncio.get_running_loop().create_future()
+        self._pollers.append(poller)
+        try:
+            return await asyncio.wait_for(asyncio.shield(poller), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # A task handed over while the poll was given up goes back to the queue
+            if poller.done() and not poller.cancelled():
+                self._tasks.appendleft(poller.result())
+            else:
+                poller.cancel()
+            if asyncio.current_task().cancelling():
+                raise
+            return None
+
+
+@dataclass
+class _WorkflowTask:
+    scheduled_event_id: int
+    attempt: int
+    sticky: bool = False
+    started_event_id: Optional[int] = None
+    timeout: Optional[asyncio.TimerHandle] = None
+
+
+@dataclass
+class _Activity:
+    run: "_Run"
+    scheduled_event_id: int
+    attributes: Any
+    scheduled_at: float
+    attempt: int = 1
+    started: bool = False
+    attempt_scheduled_at: float = 0
+    started_at: float = 0
+    identity: str = ""
+    heartbeat_details: Optional[common.Payloads] = None
+    last_failure: Optional[failure.Failure] = None
+    cancel_requested_event_id: Optional[int] = None
+    timeouts: List[asyncio.TimerHandle] = field(default_factory=list)
+    heartbeat_timeout: Optional[asyncio.TimerHandle] = None
+
+    def cancel_timeouts(self) -> None:
+        for timeout in self.timeouts:
+            timeout.cancel()
+        self.timeouts.clear()
+        if self.heartbeat_timeout is not None:
+            self.heartbeat_timeout.cancel()
+            self.heartbeat_timeout = None
+
+
+@dataclass
+class _Run:
+    workflow_id: str
+    run_id: str
+    workflow_type: str
+    task_queue: str
+    workflow_task_timeout: timedelta
+    first_execution_run_id: str
+    events: List[history.HistoryEvent] = field(default_factory=list)
+    history_size: int = 0
+    closed: bool = False
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+    workflow_task: Optional[_WorkflowTask] = None
+    workflow_task_attempt: int = 1
+    # Events that happened while a workflow task was running, added once it completes
+    buffered_events: List[history.HistoryEvent] = field(default_factory=list)
+    previous_started_event_id: int = 0
+    sticky_queue: Optional[str] = None
+    sticky_schedule_to_start_timeout: float = 0
+    activities: Dict[int, _Activity] = field(default_factory=dict)
+    timers: Dict[str, Tuple[int, asyncio.TimerHandle]] = field(default_factory=dict)
+
+
+class _State:
+    def __init__(self, server: FakeTemporalServer):
+        self._server = server
+        self._runs: Dict[str, _Run] = {}
+        self._executions: Dict[str, List[_Run]] = {}
+        self._workflow_queues: Dict[str, _TaskQueue] = {}
+        self._activity_queues: Dict[str, _TaskQueue] = {}
+        self._task_id = 0
+        self.workflow_pollers: Dict[str, Set[str]] = {}
+
+    def events(self, workflow_id: str) -> List[history.HistoryEvent]:
+        return [event for run in self._executions.get(workflow_id, []) for event in run.events]
+
+    # Workflows
+
+    def start_workflow(self, request: service.StartWorkflowExecutionRequest) -> _Run:
+        runs = self._executions.setdefault(request.workflow_id, [])
+        if runs and not runs[-1].closed:
+            raise _AlreadyStarted(f"Workflow {request.workflow_id} is already running")
+
+        run = self._new_run(
+            request.workflow_id,
+            request.workflow_type.name,
+            request.task_queue.name,
+            request.workflow_task_timeout,
+            first_execution_run_id=None,
+        )
+        attributes = history.WorkflowExecutionStartedEventAttributes(
+            workflow_type=request.workflow_type,
+            task_queue=task_queue.TaskQueue(name=run.task_queue, kind=task_queue_pb2.TASK_QUEUE_KIND_NORMAL),
+            input=request.input,
+            workflow_execution_timeout=request.workflow_execution_timeout,
+            workflow_run_timeout=request.workflow_run_timeout,
+            workflow_task_timeout=_duration(run.workflow_task_timeout),
+            original_execution_run_id=run.run_id,
+            identity=request.identity,
+            first_execution_run_id=run.run_id,
+            retry_policy=request.retry_policy if request.HasField("retry_policy") else None,
+            attempt=1,
+            memo=request.memo,
+            search_attributes=request.search_attributes,
+            header=request.header,
+            workflow_id=request.workflow_id,
+        )
+        self._append(run, EventType.EVENT_TYPE_WORKFLOW_EXECUTION_STARTED, attributes)
+        self._schedule_workflow_task(run)
+
+        return run
+
+    def signal_workflow(self, request: service.SignalWorkflowExecutionRequest) -> None:
+        run = self.run(request.workflow_execution.workflow_id, request.workflow_execution.run_id)
+        if run.closed:
+            raise _NotFound(f"Workflow {run.workflow_id} already completed")
+
+        attributes = history.WorkflowExecutionSignaledEventAttributes(
+            signal_name=request.signal_name, input=request.input, identity=request.identity, header=request.header
+        )
+        self._add_workflow_event(run, EventType.EVENT_TYPE_WORKFLOW_EXECUTION_SIGNALED, attributes)
+
+    def run(self, workflow_id: str, run_id: str = "") -> _Run:
+        if run_id:
+            run = self._runs.get(run_id)
+        else:
+            runs = self._executions.get(workflow_id)
+            run = runs[-1] if runs else None
+        if run is None or run.workflow_id != workflow_id:
+            raise _NotFound(f"Workflow {workflow_id} not found")
+
+        return run
+
+    def reset_sticky_task_queue(self, workflow_id: str, run_id: str) -> None:
+        run = self.run(workflow_id, run_id)
+        run.sticky_queue = None
+
+    def _new_run(
+        self,
+        workflow_id: str,
+        workflow_type: str,
+        task_queue_name: str,
+        workflow_task_timeout: Duration,
+        *,
+        first_execution_run_id: Optional[str],
+    ) -> _Run:
+        run_id = str(uuid.uuid4())
+        run = _Run(
+            workflow_id=workflow_id,
+            run_id=run_id,
+            workflow_type=workflow_type,
+            task_queue=task_queue_name,
+            workflow_task_timeout=(
+                workflow_task_timeout.ToTimedelta()
+                if workflow_task_timeout.ToTimedelta()
+                else DEFAULT_WORKFLOW_TASK_TIMEOUT
+            ),
+            first_execution_run_id=first_execution_run_id or run_id,
+        )
+        self._runs[run_id] = run
+        self._executions.setdefault(workflow_id, []).append(run)
+
+        return run
+
+    # Workflow tasks
+
+    async def poll_workflow_task(
+        self, request: service.PollWorkflowTaskQueueRequest
+    ) -> service.PollWorkflowTaskQueueResponse:
+        queue = self._workflow_queue(request.task_queue.name)
+        self.workflow_pollers.setdefault(request.task_queue.name, set()).add(request.identity)
+        deadline = time.monotonic() + self._server.poll_timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            entry = await queue.get(remaining)
+            if entry is None:
+                break
+
+            run, workflow_task = entry
+            # Stale when already taken from the other queue, sticky or normal, or timed out
+            if run.workflow_task is not workflow_task or workflow_task.started_event_id is not None:
+                continue
+
+            return self._start_workflow_task(run, request.identity, sticky=request.task_queue.name == run.sticky_queue)
+
+        return service.PollWorkflowTaskQueueResponse()
+
+    def complete_workflow_task(
+        self, request: service.RespondWorkflowTaskCompletedRequest
+    ) -> service.RespondWorkflowTaskCompletedResponse:
+        run, workflow_task = self._started_workflow_task(request.task_token)
+
+        closing_commands = (
+            CommandType.COMMAND_TYPE_COMPLETE_WORKFLOW_EXECUTION,
+            CommandType.COMMAND_TYPE_FAIL_WORKFLOW_EXECUTION,
+            CommandType.COMMAND_TYPE_CONTINUE_AS_NEW_WORKFLOW_EXECUTION,
+        )
+        if run.buffered_events and any(command.command_type in closing_commands for command in request.commands):
+            # The workflow cannot close before handling the events that happened meanwhile, as in the Temporal server
+            self._fail_workflow_task(
+                run,
+                workflow_task,
+                failed_cause_pb2.WORKFLOW_TASK_FAILED_CAUSE_UNHANDLED_COMMAND,
+                failure.Failure(message="Unhandled command"),
+                request.identity,
+            )
+            return service.RespondWorkflowTaskCompletedResponse()
+
+        workflow_task.timeout.cancel()
+        completed_event_id = self._append(
+            run,
+            EventType.EVENT_TYPE_WORKFLOW_TASK_COMPLETED,
+            history.WorkflowTaskCompletedEventAttributes(
+                scheduled_event_id=workflow_task.scheduled_event_id,
+                started_event_id=workflow_task.started_event_id,
+                identity=request.identity,
+                binary_checksum=request.binary_checksum,
+                worker_version=request.worker_version_stamp,
+                sdk_metadata=request.sdk_metadata,
+                metering_metadata=request.metering_metadata,
+            ),
+        ).event_id
+        run.workflow_task = None
+        run.workflow_task_attempt = 1
+        run.previous_started_event_id = workflow_task.started_event_id
+
+        if request.sticky_attributes.worker_task_queue.name:
+            run.sticky_queue = request.sticky_attributes.worker_task_queue.name
+            run.sticky_schedule_to_start_timeout = (
+                request.sticky_attributes.schedule_to_start_timeout.ToTimedelta().total_seconds()
+            )
+
+        new_events = False
+        for command in request.commands:
+            new_events = self._handle_command(run, command, completed_event_id) or new_events
+            if run.closed:
+                break
+
+        if run.closed:
+            run.buffered_events.clear()
+            return service.RespondWorkflowTaskCompletedResponse()
+
+        self._append_events(run, run.buffered_events)
+        new_events = new_events or bool(run.buffered_events)
+        run.buffered_events.clear()
+
+        response = service.RespondWorkflowTaskCompletedResponse()
+        if request.force_create_new_workflow_task or new_events:
+            self._schedule_workflow_task(run, dispatch=not request.return_new_workflow_task)
+            if request.return_new_workflow_task:
+                # The worker keeps the workflow task, as for the local activities running longer than a workflow task
+                response.workflow_task.CopyFrom(self._start_workflow_task(run, request.identity, sticky=True))
+
+        return response
+
+    def fail_workflow_task(self, request: service.RespondWorkflowTaskFailedRequest) -> None:
+        run, workflow_task = self._started_workflow_task(request.task_token)
+        self._fail_workflow_task(run, workflow_task, request.cause, request.failure, request.identity)
+
+    def _schedule_workflow_task(self, run: _Run, *, dispatch: bool = True) -> None:
+        if run.workflow_task is not None or run.closed:
+            return
+
+        attributes = history.WorkflowTaskScheduledEventAttributes(
+            task_queue=task_queue.TaskQueue(name=run.task_queue, kind=task_queue_pb2.TASK_QUEUE_KIND_NORMAL),
+            start_to_close_timeout=_duration(run.workflow_task_timeout),
+            attempt=run.workflow_task_attempt,
+        )
+        event = self._append(run, EventType.EVENT_TYPE_WORKFLOW_TASK_SCHEDULED, attributes)
+        run.workflow_task = _WorkflowTask(scheduled_event_id=event.event_id, attempt=run.workflow_task_attempt)
+
+        if dispatch:
+            self._dispatch_workflow_task(run, run.workflow_task)
+
+    def _dispatch_workflow_task(self, run: _Run, workflow_task: _WorkflowTask) -> None:
+        if run.sticky_queue is None:
+            self._workflow_queue(run.task_queue).put((run, workflow_task))
+            return
+
+        self._workflow_queue(run.sticky_queue).put((run, workflow_task))
+
+        # Back to the normal queue if the sticky worker does not take it in time, as when it is gone
+        def sticky_timeout() -> None:
+            if run.workflow_task is workflow_task and workflow_task.started_event_id is None:
+                run.sticky_queue = None
+                self._workflow_queue(run.task_queue).put((run, workflow_task))
+
+        asyncio.get_running_loop().call_later(run.sticky_schedule_to_start_timeout or 5, sticky_timeout)
+
+    def _start_workflow_task(self, run: _Run, identity: str, *, sticky: bool) -> service.PollWorkflowTaskQueueResponse:
+        workflow_task = run.workflow_task
+        suggest_continue_as_new = (
+            len(run.events) >= SUGGEST_CONTINUE_AS_NEW_HISTORY_LENGTH
+            or run.history_size >= SUGGEST_CONTINUE_AS_NEW_HISTORY_SIZE
+        )
+        started = self._append(
+            run,
+            EventType.EVENT_TYPE_WORKFLOW_TASK_STARTED,
+            history.WorkflowTaskStartedEventAttributes(
+                scheduled_event_id=workflow_task.scheduled_event_id,
+                identity=identity,
+                request_id=str(uuid.uuid4()),
+                suggest_continue_as_new=suggest_continue_as_new,
+                history_size_bytes=run.history_size,
+            ),
+        )
+        workflow_task.started_event_id = started.event_id
+        workflow_task.sticky = sticky
+        workflow_task.timeout = asyncio.get_running_loop().call_later(
+            run.workflow_task_timeout.total_seconds(), self._time_out_workflow_task, run, workflow_task
+        )
+
+        # A sticky worker has the workflow in its cache, it only gets the events after the task it completed last
+        first_event = run.previous_started_event_id if sticky else 0
+        scheduled_event = run.events[workflow_task.scheduled_event_id - 1]
+
+        return service.PollWorkflowTaskQueueResponse(
+            task_token=_token(run=run.run_id, workflow_task=workflow_task.scheduled_event_id),
+            workflow_execution=common.WorkflowExecution(workflow_id=run.workflow_id, run_id=run.run_id),
+            workflow_type=common.WorkflowType(name=run.workflow_type),
+            previous_started_event_id=run.previous_started_event_id,
+            started_event_id=started.event_id,
+            attempt=workflow_task.attempt,
+            history=history.History(events=run.events[first_event:]),
+            workflow_execution_task_queue=task_queue.TaskQueue(
+                name=run.task_queue, kind=task_queue_pb2.TASK_QUEUE_KIND_NORMAL
+            ),
+            scheduled_time=scheduled_event.event_time,
+            started_time=started.event_time,
+        )
+
+    def _started_workflow_task(self, task_token: bytes) -> Tuple[_Run, _WorkflowTask]:
+        token = json.loads(task_token)
+        run = self._runs.get(token.get("run"))
+        if (
+            run is None
+            or run.workflow_task is None
+            or run.workflow_task.scheduled_event_id != token.get("workflow_task")
+            or run.workflow_task.started_event_id is None
+        ):
+            raise _NotFound("Workflow task not found")
+
+        return run, run.workflow_task
+
+    def _fail_workflow_task(
+        self, run: _Run, workflow_task: _WorkflowTask, cause: int, task_failure: failure.Failure, identity: str
+    ) -> None:
+        workflow_task.timeout.cancel()
+        self._append(
+            run,
+            EventType.EVENT_TYPE_WORKFLOW_TASK_FAILED,
+            history.WorkflowTaskFailedEventAttributes(
+                scheduled_event_id=workflow_task.scheduled_event_id,
+                started_event_id=workflow_task.started_event_id,
+                cause=cause,
+                failure=task_failure,
+                identity=identity,
+            ),
+        )
+        self._retry_workflow_task(run)
+
+    def _time_out_workflow_task(self, run: _Run, workflow_task: _WorkflowTask) -> None:
+        if run.workflow_task is not workflow_task:
+            return
+
+        self._append(
+            run,
+            EventType.EVENT_TYPE_WORKFLOW_TASK_TIMED_OUT,
+            history.WorkflowTaskTimedOutEventAttributes(
+                scheduled_event_id=workflow_task.scheduled_event_id,
+                started_event_id=workflow_task.started_event_id,
+                timeout_type=TimeoutType.TIMEOUT_TYPE_START_TO_CLOSE,
+            ),
+        )
+        self._retry_workflow_task(run)
+
+    def _retry_workflow_task(self, run: _Run) -> None:
+        # The worker may have lost the workflow, the next attempt goes to any worker with the whole history
+        run.workflow_task = None
+        run.workflow_task_attempt += 1
+        run.sticky_queue = None
+        self._append_events(run, run.buffered_events)
+        run.buffered_events.clear()
+
+        self._schedule_workflow_task(run)
+
+    # Commands
+
+    def _handle_command(self, run: _Run, command: Any, completed_event_id: int) -> bool:
+        """Add the events of a command, returning whether they require a new workflow task"""
+
+        command_type = command.command_type
+
+        if command_type == CommandType.COMMAND_TYPE_SCHEDULE_ACTIVITY_TASK:
+            self._schedule_activity(run, command.schedule_activity_task_command_attributes, completed_event_id)
+        elif command_type == CommandType.COMMAND_TYPE_REQUEST_CANCEL_ACTIVITY_TASK:
+            return self._request_cancel_activity(
+                run, command.request_cancel_activity_task_command_attributes.scheduled_event_id, completed_event_id
+            )
+        elif command_type == CommandType.COMMAND_TYPE_START_TIMER:
+            self._start_timer(run, command.start_timer_command_attributes, completed_event_id)
+        elif command_type == CommandType.COMMAND_TYPE_CANCEL_TIMER:
+            self._cancel_timer(run, command.cancel_timer_command_attributes.timer_id, completed_event_id)
+        elif command_type == CommandType.COMMAND_TYPE_RECORD_MARKER:
+            attributes = command.record_marker_command_attributes
+            self._append(
+                run,
+                EventType.EVENT_TYPE_MARKER_RECORDED,
+                history.MarkerRecordedEventAttributes(
+                    marker_name=attributes.marker_name,
+                    details=attributes.details,
+                    workflow_task_completed_event_id=completed_event_id,
+                    header=attributes.header,
+                    failure=attributes.failure if attributes.HasField("failure") else None,
+                ),
+            )
+        elif command_type == CommandType.COMMAND_TYPE_UPSERT_WORKFLOW_SEARCH_ATTRIBUTES:
+            self._append(
+                run,
+                EventType.EVENT_TYPE_UPSERT_WORKFLOW_SEARCH_ATTRIBUTES,
+                history.UpsertWorkflowSearchAttributesEventAttributes(
+                    workflow_task_completed_event_id=completed_event_id,
+                    search_attributes=command.upsert_workflow_search_attributes_command_attributes.search_attributes,
+                ),
+            )
+        elif command_type == CommandType.COMMAND_TYPE_MODIFY_WORKFLOW_PROPERTIES:
+            self._append(
+                run,
+                EventType.EVENT_TYPE_WORKFLOW_PROPERTIES_MODIFIED,
+                history.WorkflowPropertiesModifiedEventAttributes(
+                    workflow_task_completed_event_id=completed_event_id,
+                    upserted_memo=command.modify_workflow_properties_command_attributes.upserted_memo,
+                ),
+            )
+        elif command_type == CommandType.COMMAND_TYPE_COMPLETE_WORKFLOW_EXECUTION:
+            self._append(
+                run,
+                EventType.EVENT_TYPE_WORKFLOW_EXECUTION_COMPLETED,
+                history.WorkflowExecutionCompletedEventAttributes(
+                    result=command.complete_workflow_execution_command_attributes.result,
+                    workflow_task_completed_event_id=completed_event_id,
+                ),
+            )
+            self._close(run)
+        elif command_type == CommandType.COMMAND_TYPE_FAIL_WORKFLOW_EXECUTION:
+            self._append(
+                run,
+                EventType.EVENT_TYPE_WORKFLOW_EXECUTION_FAILED,
+                history.WorkflowExecutionFailedEventAttributes(
+                    failure=command.fail_workflow_execution_command_attributes.failure,
+                    retry_state=RetryState.RETRY_STATE_RETRY_POLICY_NOT_SET,
+                    workflow_task_completed_event_id=completed_event_id,
+                ),
+            )
+            self._close(run)
+        elif command_type == CommandType.COMMAND_TYPE_CONTINUE_AS_NEW_WORKFLOW_EXECUTION:
+            self._continue_as_new(
+                run, command.continue_as_new_workflow_execution_command_attributes, completed_event_id
+            )
+        else:
+            raise _InvalidArgument(f"Command {CommandType.Name(command_type)} not supported")
+
+        return False
+
+    def _close(self, run: _Run) -> None:
+        run.closed = True
+        run.workflow_task = None
+        for activity in run.activities.values():
+            activity.cancel_timeouts()
+        run.activities.clear()
+        for _, timer in run.timers.values():
+            timer.cancel()
+        run.timers.clear()
+
+    def _continue_as_new(self, run: _Run, attributes: Any, completed_event_id: int) -> None:
+        new_run = self._new_run(
+            run.workflow_id,
+            attributes.workflow_type.name or run.workflow_type,
+            attributes.task_queue.name or run.task_queue,
+            attributes.workflow_task_timeout,
+            first_execution_run_id=run.first_execution_run_id,
+        )
+        self._append(
+            run,
+            EventType.EVENT_TYPE_WORKFLOW_EXECUTION_CONTINUED_AS_NEW,
+            history.WorkflowExecutionContinuedAsNewEventAttributes(
+                new_execution_run_id=new_run.run_id,
+                workflow_type=common.WorkflowType(name=new_run.workflow_type),
+                task_queue=task_queue.TaskQueue(name=new_run.task_queue, kind=task_queue_pb2.TASK_QUEUE_KIND_NORMAL),
+                input=attributes.input,
+                workflow_run_timeout=attributes.workflow_run_timeout,
+                workflow_task_timeout=_duration(new_run.workflow_task_timeout),
+                workflow_task_completed_event_id=completed_event_id,
+                header=attributes.header,
+                memo=attributes.memo,
+                search_attributes=attributes.search_attributes,
+            ),
+        )
+        self._close(run)
+
+        self._append(
+            new_run,
+            EventType.EVENT_TYPE_WORKFLOW_EXECUTION_STARTED,
+            history.WorkflowExecutionStartedEventAttributes(
+                workflow_type=common.WorkflowType(name=new_run.workflow_type),
+                task_queue=task_queue.TaskQueue(name=new_run.task_queue, kind=task_queue_pb2.TASK_QUEUE_KIND_NORMAL),
+                input=attributes.input,
+                workflow_run_timeout=attributes.workflow_run_timeout,
+                workflow_task_timeout=_duration(new_run.workflow_task_timeout),
+                continued_execution_run_id=run.run_id,
+                initiator=attributes.initiator,
+                original_execution_run_id=new_run.run_id,
+                first_execution_run_id=new_run.first_execution_run_id,
+                attempt=1,
+                header=attributes.header,
+                memo=attributes.memo,
+                search_attributes=attributes.search_attributes,
+                workflow_id=new_run.workflow_id,
+            ),
+        )
+        self._schedule_workflow_task(new_run)
+
+    # Timers
+
+    def _start_timer(self, run: _Run, attributes: Any, completed_event_id: int) -> None:
+        started = self._append(
+            run,
+            EventType.EVENT_TYPE_TIMER_STARTED,
+            history.TimerStartedEventAttributes(
+                timer_id=attributes.timer_id,
+                start_to_fire_timeout=attributes.start_to_fire_timeout,
+                workflow_task_completed_event_id=completed_event_id,
+            ),
+        )
+
+        def fire() -> None:
+            if run.timers.pop(attributes.timer_id, None) is None:
+                return
+            self._add_workflow_event(
+                run,
+                EventType.EVENT_TYPE_TIMER_FIRED,
+                history.TimerFiredEventAttributes(timer_id=attributes.timer_id, started_event_id=started.event_id),
+            )
+
+        handle = asyncio.get_running_loop().call_later(self._scaled(attributes.start_to_fire_timeout), fire)
+        run.timers[attributes.timer_id] = (started.event_id, handle)
+
+    def _cancel_timer(self, run: _Run, timer_id: str, completed_event_id: int) -> None:
+        started_event_id, handle = run.timers.pop(timer_id, (0, None))
+        if handle is not None:
+            handle.cancel()
+
+        self._append(
+            run,
+            EventType.EVENT_TYPE_TIMER_CANCELED,
+            history.TimerCanceledEventAttributes(
+                timer_id=timer_id,
+                started_event_id=started_event_id,
+                workflow_task_completed_event_id=completed_event_id,
+            ),
+        )
+
+    # Activities
+
+    def _schedule_activity(self, run: _Run, command_attributes: Any, completed_event_id: int) -> None:
+        attributes = history.ActivityTaskScheduledEventAttributes(
+            activity_id=command_attributes.activity_id,
+            activity_type=command_attributes.activity_type,
+            task_queue=task_queue.TaskQueue(
+                name=command_attributes.task_queue.name or run.task_queue, kind=task_queue_pb2.TASK_QUEUE_KIND_NORMAL
+            ),
+            header=command_attributes.header,
+            input=command_attributes.input,
+            schedule_to_close_timeout=command_attributes.schedule_to_close_timeout,
+            schedule_to_start_timeout=command_attributes.schedule_to_start_timeout,
+            start_to_close_timeout=command_attributes.start_to_close_timeout,
+            heartbeat_timeout=command_attributes.heartbeat_timeout,
+            workflow_task_completed_event_id=completed_event_id,
+            retry_policy=command_attributes.retry_policy,
+        )
+        # The server completes the timeouts and the retry policy the workflow leaves unset
+        if not attributes.start_to_close_timeout.ToTimedelta():
+            attributes.start_to_close_timeout.CopyFrom(attributes.schedule_to_close_timeout)
+        if not attributes.schedule_to_close_timeout.ToTimedelta():
+            attributes.schedule_to_close_timeout.CopyFrom(
+                run.events[0].workflow_execution_started_event_attributes.workflow_run_timeout
+            )
+        if not attributes.retry_policy.initial_interval.ToTimedelta():
+            attributes.retry_policy.initial_interval.CopyFrom(_duration(DEFAULT_RETRY_INITIAL_INTERVAL))
+        if not attributes.retry_policy.backoff_coefficient:
+            attributes.retry_policy.backoff_coefficient = DEFAULT_RETRY_BACKOFF_COEFFICIENT
+        if not attributes.retry_policy.maximum_interval.ToTimedelta():
+            attributes.retry_policy.maximum_interval.CopyFrom(
+                _duration(attributes.retry_policy.initial_interval.ToTimedelta() * 100)
+            )
+
+        event = self._append(run, EventType.EVENT_TYPE_ACTIVITY_TASK_SCHEDULED, attributes)
+        activity = _Activity(
+            run=run, scheduled_event_id=event.event_id, attributes=attributes, scheduled_at=time.time()
+        )
+        run.activities[event.event_id] = activity
+
+        schedule_to_close_timeout = self._scaled(attributes.schedule_to_close_timeout)
+        if schedule_to_close_timeout:
+            asyncio.get_running_loop().call_later(
+                schedule_to_close_timeout,
+                self._time_out_activity,
+                activity,
+                None,
+                TimeoutType.TIMEOUT_TYPE_SCHEDULE_TO_CLOSE,
+            )
+
+        self._dispatch_activity(activity)
+
+    def _dispatch_activity(self, activity: _Activity) -> None:
+        activity.attempt_scheduled_at = time.time()
+        self._activity_queue(activity.attributes.task_queue.name).put((activity, activity.attempt))
+
+    async def poll_activity_task(
+        self, request: service.PollActivityTaskQueueRequest
+    ) -> service.PollActivityTaskQueueResponse:
+        queue = self._activity_queue(request.task_queue.name)
+        deadline = time.monotonic() + self._server.poll_timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            entry = await queue.get(remaining)
+            if entry is None:
+                break
+
+            activity, attempt = entry
+            if activity.run.activities.get(activity.scheduled_event_id) is not activity or activity.attempt != attempt:
+                continue
+
+            return self._start_activity(activity, request.identity)
+
+        return service.PollActivityTaskQueueResponse()
+
+    def _start_activity(self, activity: _Activity, identity: str) -> service.PollActivityTaskQueueResponse:
+        attributes = activity.attributes
+        activity.started = True
+        activity.started_at = time.time()
+        activity.identity = identity
+
+        loop = asyncio.get_running_loop()
+        attempt = activity.attempt
+        start_to_close_timeout = self._scaled(attributes.start_to_close_timeout)
+        if start_to_close_timeout:
+            activity.timeouts.append(
+                loop.call_later(
+                    start_to_close_timeout,
+                    self._time_out_activity,
+                    activity,
+                    attempt,
+                    TimeoutType.TIMEOUT_TYPE_START_TO_CLOSE,
+                )
+            )
+        self._reset_heartbeat_timeout(activity)
+
+        remaining_schedule_to_close = max(
+            self._scaled(attributes.schedule_to_close_timeout) - (time.time() - activity.scheduled_at), 0.001
+        )
+        run = activity.run
+
+        return service.PollActivityTaskQueueResponse(
+            task_token=_token(run=run.run_id, activity=activity.scheduled_event_id, attempt=attempt),
+            workflow_namespace=self._server.namespace,
+            workflow_type=common.WorkflowType(name=run.workflow_type),
+            workflow_execution=common.WorkflowExecution(workflow_id=run.workflow_id, run_id=run.run_id),
+            activity_type=attributes.activity_type,
+            activity_id=attributes.activity_id,
+            header=attributes.header,
+            input=attributes.input,
+            heartbeat_details=activity.heartbeat_details,
+            scheduled_time=_timestamp(activity.scheduled_at),
+            current_attempt_scheduled_time=_timestamp(activity.attempt_scheduled_at),
+            started_time=_timestamp(activity.started_at),
+            attempt=attempt,
+            schedule_to_close_timeout=_duration(timedelta(seconds=remaining_schedule_to_close)),
+            start_to_close_timeout=_duration(timedelta(seconds=start_to_close_timeout)),
+            heartbeat_timeout=_duration(timedelta(seconds=self._scaled(attributes.heartbeat_timeout))),
+            retry_policy=attributes.retry_policy,
+        )
+
+    def heartbeat_activity(self, request: service.RecordActivityTaskHeartbeatRequest) -> bool:
+        activity = self._started_activity(request.task_token)
+        if request.HasField("details"):
+            activity.heartbeat_details = request.details
+        self._reset_heartbeat_timeout(activity)
+
+        return activity.cancel_requested_event_id is not None
+
+    def complete_activity(self, request: service.RespondActivityTaskCompletedRequest) -> None:
+        activity = self._started_activity(request.task_token)
+        self._close_activity(
+            activity,
+            EventType.EVENT_TYPE_ACTIVITY_TASK_COMPLETED,
+            history.ActivityTaskCompletedEventAttributes(
+                result=request.result, scheduled_event_id=activity.scheduled_event_id, identity=request.identity
+            ),
+        )
+
+    def fail_activity(self, request: service.RespondActivityTaskFailedRequest) -> None:
+        activity = self._started_activity(request.task_token)
+        if request.HasField("last_heartbeat_details"):
+            activity.heartbeat_details = request.last_heartbeat_details
+        self._fail_activity(activity, request.failure, request.identity)
+
+    def cancel_activity(self, request: service.RespondActivityTaskCanceledRequest) -> None:
+        activity = self._started_activity(request.task_token)
+        self._close_activity(
+            activity,
+            EventType.EVENT_TYPE_ACTIVITY_TASK_CANCELED,
+            history.ActivityTaskCanceledEventAttributes(
+                details=request.details,
+                latest_cancel_requested_event_id=activity.cancel_requested_event_id or 0,
+                scheduled_event_id=activity.scheduled_event_id,
+                identity=request.identity,
+            ),
+        )
+
+    def _request_cancel_activity(self, run: _Run, scheduled_event_id: int, completed_event_id: int) -> bool:
+        activity = run.activities.get(scheduled_event_id)
+        requested = self._append(
+            run,
+            EventType.EVENT_TYPE_ACTIVITY_TASK_CANCEL_REQUESTED,
+            history.ActivityTaskCancelRequestedEventAttributes(
+                scheduled_event_id=scheduled_event_id, workflow_task_completed_event_id=completed_event_id
+            ),
+        )
+        if activity is None:
+            return False
+
+        activity.cancel_requested_event_id = requested.event_id
+        if activity.started:
+            # Cancelled by the worker once it learns about it from a heartbeat
+            return False
+
+        activity.cancel_timeouts()
+        del run.activities[scheduled_event_id]
+        self._append(
+            run,
+            EventType.EVENT_TYPE_ACTIVITY_TASK_CANCELED,
+            history.ActivityTaskCanceledEventAttributes(
+                latest_cancel_requested_event_id=requested.event_id, scheduled_event_id=scheduled_event_id
+            ),
+        )
+
+        return True
+
+    def _started_activity(self, task_token: bytes) -> _Activity:
+        token = json.loads(task_token)
+        run = self._runs.get(token.get("run"))
+        activity = run.activities.get(token.get("activity")) if run is not None else None
+        if activity is None or not activity.started or activity.attempt != token.get("attempt"):
+            raise _NotFound("Activity task not found")
+
+        return activity
+
+    def _close_activity(self, activity: _Activity, event_type: int, attributes: Any) -> None:
+        """Remove the activity and add its closing event, after the started event of the last attempt if running
+
+        The server only writes the started event of an activity once it closes, so the retries are not in the history.
+        """
+
+        activity.cancel_timeouts()
+        del activity.run.activities[activity.scheduled_event_id]
+
+        events = []
+        if activity.started:
+            events.append(
+                self._new_event(
+                    EventType.EVENT_TYPE_ACTIVITY_TASK_STARTED,
+                    history.ActivityTaskStartedEventAttributes(
+                        scheduled_event_id=activity.scheduled_event_id,
+                        identity=activity.identity,
+                        request_id=str(uuid.uuid4()),
+                        attempt=activity.attempt,
+                        last_failure=activity.last_failure,
+                    ),
+                )
+            )
+        events.append(self._new_event(event_type, attributes))
+
+        self._add_workflow_events(activity.run, events)
+
+    def _fail_activity(
+        self, activity: _Activity, activity_failure: failure.Failure, identity: str, timeout_type: int = 0
+    ) -> None:
+        activity.cancel_timeouts()
+        retry_state = self._retry_state(activity, activity_failure, timeout_type)
+        if retry_state == RetryState.RETRY_STATE_IN_PROGRESS:
+            activity.last_failure = activity_failure
+            activity.started = False
+            activity.attempt += 1
+            asyncio.get_running_loop().call_later(self._retry_interval(activity), self._dispatch_activity, activity)
+            return
+
+        if timeout_type:
+            self._close_activity(
+                activity,
+                EventType.EVENT_TYPE_ACTIVITY_TASK_TIMED_OUT,
+                history.ActivityTaskTimedOutEventAttributes(
+                    failure=activity_failure, scheduled_event_id=activity.scheduled_event_id, retry_state=retry_state
+                ),
+            )
+        else:
+            self._close_activity(
+                activity,
+                EventType.EVENT_TYPE_ACTIVITY_TASK_FAILED,
+                history.ActivityTaskFailedEventAttributes(
+                    failure=activity_failure,
+                    scheduled_event_id=activity.scheduled_event_id,
+                    identity=identity,
+                    retry_state=retry_state,
+                ),
+            )
+
+    def _time_out_activity(self, activity: _Activity, attempt: Optional[int], timeout_type: int) -> None:
+        # attempt is None for the schedule to close timeout, which spans all the attempts
+        if activity.run.activities.get(activity.scheduled_event_id) is not activity:
+            return
+        if attempt is not None and (activity.attempt != attempt or not activity.started):
+            return
+
+        timeout_failure = failure.Failure(
+            message="activity timeout",
+            timeout_failure_info=failure.TimeoutFailureInfo(
+                timeout_type=timeout_type, last_heartbeat_details=activity.heartbeat_details
+            ),
+        )
+        self._fail_activity(activity, timeout_failure, activity.identity, timeout_type)
+
+    def _reset_heartbeat_timeout(self, activity: _Activity) -> None:
+        heartbeat_timeout = self._scaled(activity.attributes.heartbeat_timeout)
+        if not heartbeat_timeout:
+            return
+
+        if activity.heartbeat_timeout is not None:
+            activity.heartbeat_timeout.cancel()
+        activity.heartbeat_timeout = asyncio.get_running_loop().call_later(
+            heartbeat_timeout, self._time_out_activity, activity, activity.attempt, TimeoutType.TIMEOUT_TYPE_HEARTBEAT
+        )
+
+    def _retry_state(self, activity: _Activity, activity_failure: failure.Failure, timeout_type: int) -> int:
+        retry_policy = activity.attributes.retry_policy
+        if timeout_type == TimeoutType.TIMEOUT_TYPE_SCHEDULE_TO_CLOSE:
+            return RetryState.RETRY_STATE_TIMEOUT
+
+        application_failure = activity_failure.application_failure_info
+        if activity_failure.HasField("application_failure_info") and (
+            application_failure.non_retryable or application_failure.type in retry_policy.non_retryable_error_types
+        ):
+            return RetryState.RETRY_STATE_NON_RETRYABLE_FAILURE
+
+        if retry_policy.maximum_attempts and activity.attempt >= retry_policy.maximum_attempts:
+            return RetryState.RETRY_STATE_MAXIMUM_ATTEMPTS_REACHED
+
+        schedule_to_close_timeout = self._scaled(activity.attributes.schedule_to_close_timeout)
+        if schedule_to_close_timeout and (
+            time.time() + self._retry_interval(activity) - activity.scheduled_at >= schedule_to_close_timeout
+        ):
+            return RetryState.RETRY_STATE_TIMEOUT
+
+        return RetryState.RETRY_STATE_IN_PROGRESS
+
+    def _retry_interval(self, activity: _Activity) -> float:
+        retry_policy = activity.attributes.retry_policy
+        interval = retry_policy.initial_interval.ToTimedelta().total_seconds() * retry_policy.backoff_coefficient ** (
+            activity.attempt - 1
+        )
+
+        return min(interval, retry_policy.maximum_interval.ToTimedelta().total_seconds()) * self._server.time_scale
+
+    # Histories
+
+    async def get_history(
+        self, request: service.GetWorkflowExecutionHistoryRequest
+    ) -> service.GetWorkflowExecutionHistoryResponse:
+        run = self.run(request.execution.workflow_id, request.execution.run_id)
+        close_event_only = request.history_event_filter_type == HISTORY_EVENT_FILTER_TYPE_CLOSE_EVENT
+        first_event = int(request.next_page_token or b"0")
+
+        if request.wait_new_event:
+            deadline = time.monotonic() + self._server.poll_timeout
+            while not run.closed and (close_event_only or len(run.events) <= first_event):
+                run.changed.clear()
+                try:
+                    await asyncio.wait_for(run.changed.wait(), deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    # No events yet, the client asks again with the same page
+                    return service.GetWorkflowExecutionHistoryResponse(next_page_token=str(first_event).encode())
+
+        if close_event_only:
+            return service.GetWorkflowExecutionHistoryResponse(history=history.History(events=run.events[-1:]))
+
+        events = run.events[first_event:]
+        next_page_token = b"" if run.closed or not request.wait_new_event else str(len(run.events)).encode()
+
+        return service.GetWorkflowExecutionHistoryResponse(
+            history=history.History(events=events), next_page_token=next_page_token
+        )
+
+    def _add_workflow_event(self, run: _Run, event_type: int, attributes: Any) -> None:
+        self._add_workflow_events(run, [self._new_event(event_type, attributes)])
+
+    def _add_workflow_events(self, run: _Run, events: List[history.HistoryEvent]) -> None:
+        """Add events from outside the workflow, a workflow task running at the moment gets them once it completes"""
+
+        if run.workflow_task is not None and run.workflow_task.started_event_id is not None:
+            run.buffered_events.extend(events)
+            return
+
+        self._append_events(run, events)
+        self._schedule_workflow_task(run)
+
+    def _append(self, run: _Run, event_type: int, attributes: Any) -> history.HistoryEvent:
+        event = self._new_event(event_type, attributes)
+        self._append_events(run, [event])
+
+        return event
+
+    def _new_event(self, event_type: int, attributes: Any) -> history.HistoryEvent:
+        self._task_id += 1
+        event = history.HistoryEvent(event_type=event_type, task_id=self._task_id)
+        event.event_time.GetCurrentTime()
+        getattr(event, _ATTRIBUTES_FIELDS[event_type]).CopyFrom(attributes)
+
+        return event
+
+    def _append_events(self, run: _Run, events: List[history.HistoryEvent]) -> None:
+        started_event_id = 0
+        for event in events:
+            event.event_id = len(run.events) + 1
+            # The closing event of an activity follows its started event, whose id is only known now
+            if event.event_type in _ACTIVITY_CLOSED_EVENT_TYPES:
+                getattr(event, _ATTRIBUTES_FIELDS[event.event_type]).started_event_id = started_event_id
+            started_event_id = event.event_id if event.event_type == EventType.EVENT_TYPE_ACTIVITY_TASK_STARTED else 0
+
+            run.events.append(event)
+            run.history_size += event.ByteSize()
+
+        run.changed.set()
+
+    def _scaled(self, duration: Duration) -> float:
+        return duration.ToTimedelta().total_seconds() * self._server.time_scale
+
+    def _workflow_queue(self, name: str) -> _TaskQueue:
+        return self._workflow_queues.setdefault(name, _TaskQueue())
+
+    def _activity_queue(self, name: str) -> _TaskQueue:
+        return self._activity_queues.setdefault(name, _TaskQueue())
+
+
+class _AlreadyStarted(Exception):
+    pass
+
+
+class _InvalidArgument(Exception):
+    pass
+
+
+class _WorkflowService(service_pb2_grpc.WorkflowServiceServicer):
+    def __init__(self, state: _State):
+        self._state = state
+
+    async def GetSystemInfo(self, request, context):
+        return service.GetSystemInfoResponse(
+            server_version="1.22.0",
+            capabilities=service.GetSystemInfoResponse.Capabilities(
+                signal_and_query_header=True,
+                internal_error_differentiation=True,
+                activity_failure_include_heartbeat=True,
+                encoded_failure_attributes=True,
+                upsert_memo=True,
+                sdk_metadata=True,
+            ),
+        )
+
+    async def DescribeNamespace(self, request, context):
+        return service.DescribeNamespaceResponse(
+            namespace_info=namespace.NamespaceInfo(
+                name=request.namespace,
+                state=namespace_pb2.NAMESPACE_STATE_REGISTERED,
+                id=str(uuid.uuid5(uuid.NAMESPACE_OID, request.namespace or "default")),
+            ),
+            config=namespace.NamespaceConfig(workflow_execution_retention_ttl=_duration(timedelta(days=1))),
+        )
+
+    async def StartWorkflowExecution(self, request, context):
+        run = await self._call(context, self._state.start_workflow, request)
+        return service.StartWorkflowExecutionResponse(run_id=run.run_id)
+
+    async def SignalWorkflowExecution(self, request, context):
+        await self._call(context, self._state.signal_workflow, request)
+        return service.SignalWorkflowExecutionResponse()
+
+    async def GetWorkflowExecutionHistory(self, request, context):
+        try:
+            return await self._state.get_history(request)
+        except _NotFound as e:
+            await context.abort(grpc.StatusCode.NOT_FOUND, str(e))
+
+    async def ResetStickyTaskQueue(self, request, context):
+        await self._call(
+            context, self._state.reset_sticky_task_queue, request.execution.workflow_id, request.execution.run_id
+        )
+        return service.ResetStickyTaskQueueResponse()
+
+    async def PollWorkflowTaskQueue(self, request, context):
+        return await self._state.poll_workflow_task(request)
+
+    async def RespondWorkflowTaskCompleted(self, request, context):
+        return await self._call(context, self._state.complete_workflow_task, request)
+
+    async def RespondWorkflowTaskFailed(self, request, context):
+        await self._call(context, self._state.fail_workflow_task, request)
+        return service.RespondWorkflowTaskFailedResponse()
+
+    async def PollActivityTaskQueue(self, request, context):
+        return await self._state.poll_activity_task(request)
+
+    async def RecordActivityTaskHeartbeat(self, request, context):
+        cancel_requested = await self._call(context, self._state.heartbeat_activity, request)
+        return service.RecordActivityTaskHeartbeatResponse(cancel_requested=cancel_requested)
+
+    async def RespondActivityTaskCompleted(self, request, context):
+        await self._call(context, self._state.complete_activity, request)
+        return service.RespondActivityTaskCompletedResponse()
+
+    async def RespondActivityTaskFailed(self, request, context):
+        await self._call(context, self._state.fail_activity, request)
+        return service.RespondActivityTaskFailedResponse()
+
+    async def RespondActivityTaskCanceled(self, request, context):
+        await self._call(context, self._state.cancel_activity, request)
+        return service.RespondActivityTaskCanceledResponse()
+
+    @staticmethod
+    async def _call(context, function, *args):
+        try:
+            return function(*args)
+        except _NotFound as e:
+            await context.abort(grpc.StatusCode.NOT_FOUND, str(e))
+        except _AlreadyStarted as e:
+            await context.abort(grpc.StatusCode.ALREADY_EXISTS, str(e))
+        except _InvalidArgument as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+
+
+_ACTIVITY_CLOSED_EVENT_TYPES = (
+    EventType.EVENT_TYPE_ACTIVITY_TASK_COMPLETED,
+    EventType.EVENT_TYPE_ACTIVITY_TASK_FAILED,
+    EventType.EVENT_TYPE_ACTIVITY_TASK_TIMED_OUT,
+    EventType.EVENT_TYPE_ACTIVITY_TASK_CANCELED,
+)
+
+# Attributes field of the history events of each type
+_ATTRIBUTES_FIELDS = {
+    EventType.Value(f"EVENT_TYPE_{name}"): f"{name.lower()}_event_attributes"
+    for name in (
+        "WORKFLOW_EXECUTION_STARTED",
+        "WORKFLOW_EXECUTION_COMPLETED",
+        "WORKFLOW_EXECUTION_FAILED",
+        "WORKFLOW_EXECUTION_CONTINUED_AS_NEW",
+        "WORKFLOW_EXECUTION_SIGNALED",
+        "WORKFLOW_TASK_SCHEDULED",
+        "WORKFLOW_TASK_STARTED",
+        "WORKFLOW_TASK_COMPLETED",
+        "WORKFLOW_TASK_FAILED",
+        "WORKFLOW_TASK_TIMED_OUT",
+        "ACTIVITY_TASK_SCHEDULED",
+        "ACTIVITY_TASK_STARTED",
+        "ACTIVITY_TASK_COMPLETED",
+        "ACTIVITY_TASK_FAILED",
+        "ACTIVITY_TASK_TIMED_OUT",
+        "ACTIVITY_TASK_CANCEL_REQUESTED",
+        "ACTIVITY_TASK_CANCELED",
+        "TIMER_STARTED",
+        "TIMER_FIRED",
+        "TIMER_CANCELED",
+        "MARKER_RECORDED",
+        "UPSERT_WORKFLOW_SEARCH_ATTRIBUTES",
+        "WORKFLOW_PROPERTIES_MODIFIED",
+    )
+}
+
+
+def _token(**values: Any) -> bytes:
+    return json.dumps(values).encode()
+
+
+def _duration(value: timedelta) -> Duration:
+    duration = Duration()
+    duration.FromTimedelta(value)
+
+    return duration
+
+
+def _timestamp(seconds: float) -> Timestamp:
+    timestamp = Timestamp()
+    timestamp.FromNanoseconds(int(seconds * 1_000_000_000))
+
+    return timestamp
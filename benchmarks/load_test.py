@@ -0,0 +1,376 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""End-to-end load test of the sample workflows
+
+Runs, in a single process, a Temporal dev server (or the time-skipping test server, the in-process stand-in of
+``benchmarks.fake_temporal``, or connects to a given one), a local stand-in for the KuFlow REST API and the currency
+endpoint, and a worker with the real sample workflow and activities. The driver starts the workflows and plays the
+humans: it fills in every task the workflows wait for and signals them with ``KUFLOW_ENGINE_SIGNAL_PROCESS_ITEM``, as
+KuFlow does. It reports the throughput, the latency of the workflows and the size of their histories.
+
+    python -m benchmarks.load_test --sample loan --workflows 500 --concurrency 100 --kuflow-latency 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+import uuid
+from contextlib import AsyncExitStack
+from dataclasses import asdict, dataclass, field, replace
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from kuflow_temporal_workflow_kuflow import models as models_workflow
+from temporalio.client import Client, WorkflowHistory
+from temporalio.testing import WorkflowEnvironment
+
+from benchmarks.fake_kuflow import FakeKuFlowServer, KuFlowFault
+from benchmarks.samples import SAMPLES, Sample, create_worker, kuflow_data_converter
+
+
+# Worker options of the command line, as the temporal.worker properties of the samples tune them
+WORKER_OPTIONS = {
+    "max_concurrent_activities": "activities the worker runs at the same time",
+    "max_concurrent_local_activities": "local activities the worker runs at the same time",
+    "max_concurrent_workflow_tasks": "workflow tasks the worker runs at the same time",
+    "max_concurrent_activity_task_polls": "pollers of the activity task queue",
+    "max_concurrent_workflow_task_polls": "pollers of the workflow task queue",
+    "max_cached_workflows": "sticky cache size of the worker",
+}
+
+
+@dataclass
+class LoadTestReport:
+    sample: str
+    workflows: int
+    failed: int
+    elapsed: float
+    throughput: float
+    latency_p50: float
+    latency_p99: float
+    latency_max: float
+    history_events_mean: float
+    history_events_max: int
+    history_bytes_mean: float
+    history_bytes_max: int
+    # Tuning options of the worker, the ones not set keep the Temporal defaults
+    worker_options: Dict[str, int] = field(default_factory=dict)
+
+    def __str__(self) -> str:
+        return "\n".join(
+            [
+                f"sample              {self.sample}",
+                *[f"{option:<19} {value}" for option, value in self.worker_options.items()],
+                f"workflows           {self.workflows} ({self.failed} failed)",
+                f"elapsed             {self.elapsed:.2f} s",
+                f"throughput          {self.throughput:.2f} workflows/s",
+                f"latency p50         {self.latency_p50 * 1000:.1f} ms",
+                f"latency p99         {self.latency_p99 * 1000:.1f} ms",
+                f"latency max         {self.latency_max * 1000:.1f} ms",
+                f"history events      {self.history_events_mean:.1f} mean, {self.history_events_max} max",
+                f"history size        {self.history_bytes_mean:.0f} B mean, {self.history_bytes_max} B max",
+            ]
+        )
+
+
+class HumanTaskSimulator:
+    """Completes the tasks the workflows wait for, after ``think_time`` seconds, and signals their workflows"""
+
+    def __init__(self, client: Client, sample: Sample, server: FakeKuFlowServer, *, think_time: float = 0):
+        self._client = client
+        self._sample = sample
+        self._server = server
+        self._think_time = think_time
+        self._loop = asyncio.get_running_loop()
+        self._tasks: set = set()
+        # Tasks of each code already answered in each process
+        self._answered: Dict[Tuple[str, str], int] = {}
+
+    def on_process_item_created(self, process_item: Dict[str, Any]) -> None:
+        """Called from the thread of the fake server"""
+
+        self._loop.call_soon_threadsafe(self._schedule, process_item)
+
+    def _schedule(self, process_item: Dict[str, Any]) -> None:
+        task_code = process_item["processItemDefinitionRef"]["code"]
+        answers = self._sample.human_tasks.get(task_code)
+        if process_item["type"] != "TASK" or not answers:
+            return
+
+        answered = self._answered.get((process_item["processId"], task_code), 0)
+        self._answered[(process_item["processId"], task_code)] = answered + 1
+        data = answers[min(answered, len(answers) - 1)]
+
+        task = asyncio.create_task(self._complete(process_item["processId"], process_item["id"], task_code, data))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _complete(self, process_id: str, process_item_id: str, task_code: str, data: Dict[str, Any]) -> None:
+        if self._think_time:
+            await asyncio.sleep(self._think_time)
+
+        self._server.complete_task(process_item_id, data)
+
+        # The workflow id of the KuFlow processes is the process id
+        await self._client.get_workflow_handle(process_id).signal(
+            models_workflow.KUFLOW_ENGINE_SIGNAL_PROCESS_ITEM,
+            models_workflow.SignalProcessItem(
+                id=process_item_id,
+                type=models_workflow.SignalProcessItemType.TASK,
+                payload=models_workflow.SignalProcessItemPayload(
+                    task_definition_code=task_code, data_structure_data_definition_code=None
+                ),
+            ),
+        )
+
+
+async def fetch_run_histories(client: Client, workflow_id: str, run_id: Optional[str]) -> List[WorkflowHistory]:
+    """Histories of the run and of the runs it continued as new into, in order"""
+
+    histories: List[WorkflowHistory] = []
+    while run_id:
+        history = await client.get_workflow_handle(workflow_id, run_id=run_id).fetch_history()
+        histories.append(history)
+
+        last_event = history.events[-1]
+        run_id = None
+        if last_event.HasField("workflow_execution_continued_as_new_event_attributes"):
+            run_id = last_event.workflow_execution_continued_as_new_event_attributes.new_execution_run_id
+
+    return histories
+
+
+async def run_load_test(
+    client: Client,
+    sample: Sample,
+    server: FakeKuFlowServer,
+    *,
+    task_queue: str,
+    workflows: int,
+    concurrency: int,
+    histories: Optional[List[WorkflowHistory]] = None,
+) -> LoadTestReport:
+    """Start ``workflows`` processes, at most ``concurrency`` at a time, and wait for all of them to complete
+
+    The history of every run of the completed workflows is appended to ``histories``, if given. The history sizes
+    reported are the ones of the runs too.
+    """
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    history_events: List[int] = []
+    history_bytes: List[int] = []
+    failed = 0
+
+    async def run_process() -> None:
+        nonlocal failed
+        async with semaphore:
+            process_id = str(uuid.uuid4())
+            server.create_process(process_id)
+
+            started_at = time.perf_counter()
+            handle = await client.start_workflow(
+                sample.workflow.run,
+                models_workflow.WorkflowRequest(process_id=process_id),
+                id=process_id,
+                task_queue=task_queue,
+            )
+            try:
+                await handle.result()
+            except Exception:
+                failed += 1
+                return
+            latencies.append(time.perf_counter() - started_at)
+
+        for history in await fetch_run_histories(client, handle.id, handle.first_execution_run_id):
+            history_events.append(len(history.events))
+            history_bytes.append(sum(event.ByteSize() for event in history.events))
+            if histories is not None:
+                histories.append(history)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*[run_process() for _ in range(workflows)])
+    elapsed = time.perf_counter() - started_at
+
+    return LoadTestReport(
+        sample=sample.name,
+        workflows=workflows,
+        failed=failed,
+        elapsed=elapsed,
+        throughput=len(latencies) / elapsed,
+        latency_p50=_percentile(latencies, 50),
+        latency_p99=_percentile(latencies, 99),
+        latency_max=max(latencies, default=0),
+        history_events_mean=_mean(history_events),
+        history_events_max=max(history_events, default=0),
+        history_bytes_mean=_mean(history_bytes),
+        history_bytes_max=max(history_bytes, default=0),
+    )
+
+
+class _FakeTemporalEnvironment(WorkflowEnvironment):
+    """Environment of the in-process Temporal stand-in, stopped along with it"""
+
+    def __init__(self, client: Client, server: Any):
+        super().__init__(client)
+        self._server = server
+
+    async def shutdown(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self._server.stop)
+
+
+async def start_environment(server: str, *, time_scale: float = 1) -> WorkflowEnvironment:
+    """Temporal dev server (``local``), time-skipping test server (``time-skipping``), the in-process stand-in of
+    ``benchmarks.fake_temporal`` (``fake``), with its durations multiplied by ``time_scale``, or a running one
+    (host:port)"""
+
+    data_converter = kuflow_data_converter()
+
+    if server == "local":
+        return await WorkflowEnvironment.start_local(data_converter=data_converter)
+    if server == "time-skipping":
+        return await WorkflowEnvironment.start_time_skipping(data_converter=data_converter)
+    if server == "fake":
+        # Imported here, it needs grpcio, which the load test against the real servers does not
+        from benchmarks.fake_temporal import FakeTemporalServer
+
+        fake_server = FakeTemporalServer(time_scale=time_scale).start()
+        try:
+            client = await Client.connect(fake_server.target, data_converter=data_converter)
+        except BaseException:
+            fake_server.stop()
+            raise
+
+        return _FakeTemporalEnvironment(client, fake_server)
+
+    return WorkflowEnvironment.from_client(await Client.connect(server, data_converter=data_converter))
+
+
+async def run_in_process(
+    sample: Sample,
+    *,
+    server: str,
+    workflows: int,
+    concurrency: int,
+    kuflow_latency: float = 0,
+    think_time: float = 0,
+    histories: Optional[List[WorkflowHistory]] = None,
+    time_scale: float = 1,
+    kuflow_faults: Sequence[KuFlowFault] = (),
+    **worker_options: Any,
+) -> LoadTestReport:
+    """Run the load test against the Temporal ``server`` (see ``start_environment``) and a fresh KuFlow stand-in
+
+    The KuFlow stand-in injects the ``kuflow_faults``.
+    """
+
+    task_queue = f"load-test-{uuid.uuid4()}"
+
+    async with AsyncExitStack() as stack:
+        environment = await stack.enter_async_context(await start_environment(server, time_scale=time_scale))
+        client = environment.client
+
+        kuflow_server = stack.enter_context(FakeKuFlowServer(latency=kuflow_latency, faults=kuflow_faults))
+        kuflow_server.on_process_item_created = HumanTaskSimulator(
+            client, sample, kuflow_server, think_time=think_time
+        ).on_process_item_created
+
+        worker, close_worker = create_worker(
+            client,
+            sample,
+            task_queue=task_queue,
+            kuflow_endpoint=kuflow_server.endpoint,
+            currency_endpoint=kuflow_server.currency_endpoint,
+            **worker_options,
+        )
+        stack.callback(close_worker)
+        await stack.enter_async_context(worker)
+
+        report = await run_load_test(
+            client,
+            sample,
+            kuflow_server,
+            task_queue=task_queue,
+            workflows=workflows,
+            concurrency=concurrency,
+            histories=histories,
+        )
+
+        return replace(report, worker_options=worker_options)
+
+
+async def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load_test", description=__doc__.splitlines()[0])
+    parser.add_argument("--sample", choices=sorted(SAMPLES), default="loan")
+    parser.add_argument("--workflows", type=int, default=100, help="workflows to run")
+    parser.add_argument("--concurrency", type=int, default=50, help="workflows running at the same time")
+    parser.add_argument("--kuflow-latency", type=float, default=0.02, help="seconds added to every KuFlow API call")
+    parser.add_argument("--think-time", type=float, default=0, help="seconds the humans take to complete a task")
+    parser.add_argument(
+        "--server",
+        default="local",
+        help="local (dev server), time-skipping (test server), fake (in-process stand-in) or host:port of a server",
+    )
+    for option, help in WORKER_OPTIONS.items():
+        parser.add_argument(f"--{option.replace('_', '-')}", type=int, default=None, help=help)
+    parser.add_argument("--output", default=None, help="also write the report, as JSON, to this file")
+    args = parser.parse_args(arguments)
+
+    worker_options = {option: getattr(args, option) for option in WORKER_OPTIONS if getattr(args, option) is not None}
+
+    report = await run_in_process(
+        SAMPLES[args.sample],
+        server=args.server,
+        workflows=args.workflows,
+        concurrency=args.concurrency,
+        kuflow_latency=args.kuflow_latency,
+        think_time=args.think_time,
+        **worker_options,
+    )
+
+    print(report)
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(asdict(report), file, indent=2)
+
+    return 1 if report.failed else 0
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    if not values:
+        return 0
+
+    ordered = sorted(values)
+    return ordered[max(math.ceil(len(ordered) * percentile / 100) - 1, 0)]
+
+
+def _mean(values: List[int]) -> float:
+    return sum(values) / len(values) if values else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
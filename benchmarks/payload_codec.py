@@ -0,0 +1,98 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""Size and decode time of the workflow payloads, with and without the compression codec
+
+Uses the histories recorded by ``benchmarks.replay`` when there are any, otherwise the payloads of a run of each sample
+built from realistic process items.
+
+    python -m benchmarks.payload_codec --threshold 1024 --level 6 --comments-size 2000
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import List, Optional
+
+from temporalio.api.common.v1 import Payload
+
+from benchmarks.payloads import history_payloads, workflow_run_values
+from benchmarks.replay import load_histories
+from benchmarks.samples import SAMPLES, Sample, kuflow_data_converter
+from kuflow_samples_temporal_loan.codec import CompressionCodec
+
+
+def sample_payloads(sample: Sample, *, comments_size: int) -> List[Payload]:
+    histories = load_histories(sample)
+    if histories:
+        return [payload for history in histories for payload in history_payloads(history)]
+
+    return kuflow_data_converter().payload_converter.to_payloads(
+        workflow_run_values(sample, comments_size=comments_size)
+    )
+
+
+async def measure(codec: CompressionCodec, payloads: List[Payload], *, iterations: int):
+    """Bytes of the encoded payloads and seconds to decode them back to JSON values, per iteration"""
+
+    encoded = await codec.encode(payloads)
+
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        for payload in await codec.decode(encoded):
+            json.loads(payload.data)
+    elapsed = time.perf_counter() - started_at
+
+    return sum(payload.ByteSize() for payload in encoded), elapsed / iterations
+
+
+async def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.payload_codec", description=__doc__.splitlines()[0])
+    parser.add_argument("--threshold", type=int, default=1024, help="compression threshold in bytes")
+    parser.add_argument("--level", type=int, default=6, help="zlib level")
+    parser.add_argument("--comments-size", type=int, default=2000, help="characters of free text in the task data")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args(arguments)
+
+    print(f"{'sample':10} {'payloads':>8} {'bytes':>10} {'zlib bytes':>10} {'decode':>10} {'zlib decode':>11}")
+    for name, sample in sorted(SAMPLES.items()):
+        payloads = sample_payloads(sample, comments_size=args.comments_size)
+
+        plain_bytes, plain_decode = await measure(CompressionCodec(), payloads, iterations=args.iterations)
+        compressed_bytes, compressed_decode = await measure(
+            CompressionCodec(threshold=args.threshold, level=args.level), payloads, iterations=args.iterations
+        )
+
+        print(
+            f"{name:10} {len(payloads):>8} {plain_bytes:>10} {compressed_bytes:>10} "
+            f"{plain_decode * 1e6:>8.0f}us {compressed_decode * 1e6:>9.0f}us"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
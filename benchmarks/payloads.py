@@ -0,0 +1,117 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List
+
+from kuflow_rest import models as models_rest
+from kuflow_temporal_activity_kuflow import models as models_activity
+from kuflow_temporal_workflow_kuflow import models as models_workflow
+from temporalio.api.common.v1 import Payload
+from temporalio.client import WorkflowHistory
+
+from benchmarks.samples import Sample
+
+
+def process_item(
+    process_id: str, task_code: str, data: Dict[str, Any], *, comments_size: int = 0
+) -> models_rest.ProcessItem:
+    """Completed task as KuFlow returns it, its data padded with a ``COMMENTS`` text of ``comments_size`` characters"""
+
+    now = datetime.now(timezone.utc)
+    if comments_size:
+        data = {
+            **data,
+            "COMMENTS": ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * comments_size)[:comments_size],
+        }
+
+    return models_rest.ProcessItem(
+        id=str(uuid.uuid4()),
+        type=models_rest.ProcessItemType.TASK,
+        process_id=process_id,
+        owner_id=str(uuid.uuid4()),
+        tenant_id=str(uuid.uuid4()),
+        created_by=str(uuid.uuid4()),
+        created_at=now,
+        last_modified_by=str(uuid.uuid4()),
+        last_modified_at=now,
+        process_item_definition_ref=models_rest.ProcessItemDefinitionRef(
+            id=str(uuid.uuid4()), version=str(uuid.uuid4()), code=task_code
+        ),
+        task=models_rest.ProcessItemTask(
+            state=models_rest.ProcessItemTaskState.COMPLETED, data=models_rest.JsonValue(value=data)
+        ),
+    )
+
+
+def workflow_run_values(sample: Sample, *, comments_size: int = 0) -> List[Any]:
+    """Workflow input and output and activity requests and responses of a run of the sample, as they are recorded
+    in its history"""
+
+    process_id = str(uuid.uuid4())
+    values: List[Any] = [models_workflow.WorkflowRequest(process_id=process_id)]
+
+    for task_code, answers in sample.human_tasks.items():
+        item = process_item(process_id, task_code, answers[-1], comments_size=comments_size)
+        values += [
+            models_activity.ProcessItemCreateRequest(
+                id=item.id,
+                process_id=process_id,
+                type=models_rest.ProcessItemType.TASK,
+                process_item_definition_code=task_code,
+            ),
+            models_activity.ProcessItemCreateResponse(process_item=item),
+            models_activity.ProcessItemRetrieveRequest(process_item_id=item.id),
+            models_activity.ProcessItemRetrieveResponse(process_item=item),
+        ]
+
+    values.append(models_workflow.WorkflowResponse(f"Completed process {process_id}"))
+
+    return values
+
+
+def history_payloads(history: WorkflowHistory) -> List[Payload]:
+    """Every payload recorded in the events of the history"""
+
+    return [payload for event in history.events for payload in _payloads(event)]
+
+
+def _payloads(message) -> Iterator[Payload]:
+    for field, value in message.ListFields():
+        if field.type != field.TYPE_MESSAGE:
+            continue
+
+        if field.message_type.GetOptions().map_entry:
+            values = value.values()
+        elif field.label == field.LABEL_REPEATED:
+            values = value
+        else:
+            values = [value]
+
+        for item in values:
+            if isinstance(item, Payload):
+                yield item
+            elif hasattr(item, "ListFields"):
+                yield from _payloads(item)
@@ -0,0 +1,209 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""Replay benchmark and determinism check of the sample workflows
+
+``record`` runs the load test of a sample against a Temporal server and stores the history of every workflow as a
+fixture file in ``benchmarks/histories/<sample>``. With ``--revision`` the workflows run the code of the sample
+workflow as of that git revision, so the fixtures stand for the workflows a worker already has open when the new code
+is deployed. ``replay`` replays the stored histories with the current code of the workflows, reports the replays per
+second and the peak memory, and fails if any of them is no longer deterministic or a sample has no fixtures.
+
+    python -m benchmarks.replay record --sample loan --workflows 20 --server fake --revision <revision>
+    python -m benchmarks.replay replay --iterations 50
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import importlib
+import inspect
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Type
+
+from temporalio.client import WorkflowHistory
+from temporalio.worker import Replayer
+
+from benchmarks.load_test import run_in_process
+from benchmarks.samples import SAMPLES, Sample, kuflow_data_converter, sandboxed_workflow_runner
+
+
+HISTORIES_PATH = Path(__file__).parent / "histories"
+
+
+async def record(sample: Sample, *, workflows: int, server: str, path: Path = HISTORIES_PATH) -> List[Path]:
+    """Run ``workflows`` workflows of the sample and store their histories, replacing the stored ones"""
+
+    histories: List[WorkflowHistory] = []
+    report = await run_in_process(
+        sample, server=server, workflows=workflows, concurrency=workflows, histories=histories
+    )
+    if report.failed:
+        raise Exception(f"{report.failed} workflows of the {sample.name} sample failed, histories not recorded")
+
+    sample_path = path / sample.name
+    sample_path.mkdir(parents=True, exist_ok=True)
+    for stale in sample_path.glob("*.json"):
+        stale.unlink()
+
+    files = []
+    for index, history in enumerate(histories):
+        file = sample_path / f"{sample.name}-{index:03}.json"
+        file.write_text(history.to_json())
+        files.append(file)
+
+    return files
+
+
+def workflow_at_revision(sample: Sample, revision: str, path: Path) -> Type:
+    """Workflow class of the sample as of the git ``revision``, imported from a copy of its module written in ``path``
+
+    The copy is imported under its own module name, ``path`` is added to ``sys.path`` so the workflow sandbox imports
+    it too. The rest of the sample, as its activities, is the current one.
+    """
+
+    source_file = Path(inspect.getsourcefile(sample.workflow)).resolve()
+    repository = Path(_git(source_file.parent, "rev-parse", "--show-toplevel").strip())
+    source = _git(repository, "show", f"{revision}:{source_file.relative_to(repository).as_posix()}")
+
+    module_name = f"{sample.name}_workflow_" + re.sub(r"\W", "_", revision)
+    (path / f"{module_name}.py").write_text(source)
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+    return getattr(importlib.import_module(module_name), sample.workflow.__name__)
+
+
+def _git(cwd: Path, *arguments: str) -> str:
+    return subprocess.run(["git", *arguments], cwd=cwd, capture_output=True, text=True, check=True).stdout
+
+
+def load_histories(sample: Sample, path: Path = HISTORIES_PATH) -> List[WorkflowHistory]:
+    """Stored histories of the sample, the workflow id of each one being its file name"""
+
+    return [
+        WorkflowHistory.from_json(file.stem, file.read_text()) for file in sorted((path / sample.name).glob("*.json"))
+    ]
+
+
+async def replay(sample: Sample, histories: List[WorkflowHistory], *, iterations: int = 1) -> bool:
+    """Replay the histories ``iterations`` times, print the throughput and return whether all of them replayed"""
+
+    replayer = Replayer(
+        workflows=[sample.workflow],
+        data_converter=kuflow_data_converter(),
+        workflow_runner=sandboxed_workflow_runner(sample),
+    )
+
+    # A first pass, outside the measure, checks the determinism and warms up the sandbox
+    results = await replayer.replay_workflows(_iterate(histories), raise_on_replay_failure=False)
+    for run_id, failure in results.replay_failures.items():
+        print(f"{sample.name}: replay of run {run_id} failed: {failure}", file=sys.stderr)
+    if results.replay_failures:
+        return False
+
+    started_at = time.perf_counter()
+    await replayer.replay_workflows(_iterate(histories * iterations))
+    elapsed = time.perf_counter() - started_at
+
+    replays = len(histories) * iterations
+    events = sum(len(history.events) for history in histories) * iterations
+    print(
+        f"{sample.name}: {replays} replays in {elapsed:.2f} s, {replays / elapsed:.1f} replays/s, "
+        f"{events / elapsed:.0f} events/s"
+    )
+
+    return True
+
+
+async def _iterate(histories: List[WorkflowHistory]) -> AsyncIterator[WorkflowHistory]:
+    # The replayer takes the histories as an async iterator
+    for history in histories:
+        yield history
+
+
+def peak_memory() -> int:
+    """Peak resident memory of the process, in bytes"""
+
+    # Linux reports it in kilobytes, macOS in bytes
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+async def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.replay", description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="record the histories of a sample")
+    record_parser.add_argument("--sample", choices=sorted(SAMPLES), required=True)
+    record_parser.add_argument("--workflows", type=int, default=20, help="histories to record")
+    record_parser.add_argument(
+        "--server",
+        default="time-skipping",
+        help="local (dev server), time-skipping (test server), fake (in-process stand-in) or host:port",
+    )
+    record_parser.add_argument("--revision", help="git revision of the workflow code to record, default the current")
+
+    replay_parser = subparsers.add_parser("replay", help="replay the recorded histories")
+    replay_parser.add_argument("--sample", choices=sorted(SAMPLES), action="append", help="default all the samples")
+    replay_parser.add_argument("--iterations", type=int, default=10, help="times each history is replayed")
+
+    args = parser.parse_args(arguments)
+
+    if args.command == "record":
+        with tempfile.TemporaryDirectory() as path:
+            sample = SAMPLES[args.sample]
+            if args.revision:
+                sample = dataclasses.replace(sample, workflow=workflow_at_revision(sample, args.revision, Path(path)))
+            files = await record(sample, workflows=args.workflows, server=args.server)
+        print(f"{args.sample}: {len(files)} histories recorded in {HISTORIES_PATH / args.sample}")
+        return 0
+
+    deterministic = True
+    for name in args.sample or sorted(SAMPLES):
+        histories = load_histories(SAMPLES[name])
+        if not histories:
+            # Nothing replayed is no proof of determinism
+            print(
+                f"{name}: no histories recorded, run 'python -m benchmarks.replay record --sample {name}'",
+                file=sys.stderr,
+            )
+            deterministic = False
+            continue
+        deterministic = await replay(SAMPLES[name], histories, iterations=args.iterations) and deterministic
+
+    print(f"peak memory: {peak_memory() / (1024 * 1024):.1f} MiB")
+
+    return 0 if deterministic else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,177 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import dataclasses
+import functools
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Sequence, Tuple, Type
+
+import temporalio.converter
+from kuflow_rest import KuFlowRestClient
+from kuflow_temporal_activity_kuflow import KuFlowActivities
+from kuflow_temporal_common import CompositeEncodingPayloadConverter, KuFlowComposableEncodingPayloadConverter
+from temporalio.client import Client
+from temporalio.worker import Worker
+from temporalio.worker.workflow_sandbox import SandboxedWorkflowRunner, SandboxRestrictions
+
+from kuflow_samples_expense_reimbursement import converter as expense_converter
+from kuflow_samples_expense_reimbursement import heartbeat as expense_heartbeat
+from kuflow_samples_expense_reimbursement import worker as expense_worker
+from kuflow_samples_expense_reimbursement.workflow import SampleWorkflow as ExpenseWorkflow
+from kuflow_samples_temporal_loan import converter as loan_converter
+from kuflow_samples_temporal_loan import heartbeat as loan_heartbeat
+from kuflow_samples_temporal_loan import worker as loan_worker
+from kuflow_samples_temporal_loan.activities import CurrencyConversionActivities
+from kuflow_samples_temporal_loan.converter import TypedModelPayloadConverter, register_payload_converter
+from kuflow_samples_temporal_loan.workflow import SampleWorkflow as LoanWorkflow
+
+
+@dataclass(frozen=True)
+class Sample:
+    """A sample workflow, how its worker is assembled and how the humans complete its tasks"""
+
+    name: str
+    workflow: Type
+    sandbox_passthrough_modules: Sequence[str]
+    heartbeating_activities: Callable[[Sequence[Callable], Executor], List[Callable]]
+    # Task data submitted for each task code waiting for a human, the n-th task of a process with a code gets the n-th
+    # answer and the following ones the last answer. Tasks with other codes are left alone.
+    human_tasks: Dict[str, List[Dict[str, Any]]]
+    currency_conversion: bool = False
+
+
+SAMPLES = {
+    "loan": Sample(
+        name="loan",
+        workflow=LoanWorkflow,
+        sandbox_passthrough_modules=loan_worker.SANDBOX_PASSTHROUGH_MODULES,
+        heartbeating_activities=loan_heartbeat.heartbeating_activities,
+        # Above 5000 EUR, so the loan goes through the approval
+        human_tasks={
+            "LOAN_APPLICATION": [{"FIRST_NAME": "Jane", "LAST_NAME": "Doe", "AMOUNT": "10000", "CURRENCY": "USD"}],
+            "APPROVE_LOAN": [{"APPROVAL": "YES"}],
+            "NOTIFICATION_GRANTED": [{}],
+            "NOTIFICATION_REJECTION": [{}],
+        },
+        currency_conversion=True,
+    ),
+    "expense": Sample(
+        name="expense",
+        workflow=ExpenseWorkflow,
+        sandbox_passthrough_modules=expense_worker.SANDBOX_PASSTHROUGH_MODULES,
+        heartbeating_activities=expense_heartbeat.heartbeating_activities,
+        # Above 1000, so the claim goes through the approval, which sends it back for review once
+        human_tasks={
+            "FILL_INFO": [{"AMOUNT": "2000"}],
+            "APPROVAL": [{"DECISION": "REVIEW"}, {"DECISION": "ACCEPTED"}],
+        },
+    ),
+}
+
+
+# Typed converter of the models of both samples, the converters of the samples produce the same payloads
+TYPED_MODEL_PAYLOAD_CONVERTER = TypedModelPayloadConverter(
+    [*loan_converter.WORKFLOW_MODELS, *expense_converter.WORKFLOW_MODELS]
+)
+
+
+def kuflow_data_converter() -> temporalio.converter.DataConverter:
+    """Data converter of the KuFlow workers, for clients and workers created without ``KuFlowTemporalConnection``
+
+    Registers the KuFlow models converter ahead of the default JSON one, as ``KuFlowTemporalConnection.connect``
+    does, and the typed converter of the samples ahead of it, as ``SampleTemporalConnection`` does, so the KuFlow
+    models travel in the payloads exactly as in production.
+    """
+
+    converters = list(temporalio.converter.DefaultPayloadConverter.default_encoding_payload_converters)
+    if not any(isinstance(it, CompositeEncodingPayloadConverter) for it in converters):
+        kuflow_converter = KuFlowComposableEncodingPayloadConverter()
+        composite_converter = CompositeEncodingPayloadConverter(
+            encoding=kuflow_converter.encoding,
+            converters=[kuflow_converter, *[it for it in converters if it.encoding == kuflow_converter.encoding]],
+        )
+        converters = [it if it.encoding != kuflow_converter.encoding else composite_converter for it in converters]
+        temporalio.converter.DefaultPayloadConverter.default_encoding_payload_converters = tuple(converters)
+
+    register_payload_converter(TYPED_MODEL_PAYLOAD_CONVERTER)
+
+    return dataclasses.replace(temporalio.converter.DataConverter.default)
+
+
+def sandboxed_workflow_runner(sample: Sample) -> SandboxedWorkflowRunner:
+    """Workflow sandbox of the production profile of the sample worker"""
+
+    return SandboxedWorkflowRunner(
+        restrictions=SandboxRestrictions.default.with_passthrough_modules(*sample.sandbox_passthrough_modules)
+    )
+
+
+def create_worker(
+    client: Client,
+    sample: Sample,
+    *,
+    task_queue: str,
+    kuflow_endpoint: str,
+    currency_endpoint: str,
+    **worker_options: Any,
+) -> Tuple[Worker, Callable[[], None]]:
+    """Worker of the sample with its activities against the given endpoints, in the production sandbox unless given a
+    ``workflow_runner``
+
+    Returns the worker and the function releasing its resources once it has stopped.
+    """
+
+    kuflow_rest_client = KuFlowRestClient(
+        client_id="benchmark",
+        client_secret="benchmark",
+        endpoint=kuflow_endpoint,
+        allow_insecure_connection=True,
+    )
+    # Sized like the activity slots, as the sample workers do
+    kuflow_executor = ThreadPoolExecutor(
+        max_workers=worker_options.get("max_concurrent_activities") or 100, thread_name_prefix="activity"
+    )
+    activities = sample.heartbeating_activities(KuFlowActivities(kuflow_rest_client).activities, kuflow_executor)
+
+    # Without waiting for the calls left running by the cancelled activities, they hang until the KuFlow stand-in stops
+    closers = [functools.partial(kuflow_executor.shutdown, wait=False)]
+    if sample.currency_conversion:
+        currency_conversion_activities = CurrencyConversionActivities(endpoint=currency_endpoint)
+        activities = [*activities, *currency_conversion_activities.activities]
+        closers.append(currency_conversion_activities.close)
+
+    worker = Worker(
+        client,
+        task_queue=task_queue,
+        workflows=[sample.workflow],
+        activities=activities,
+        **{"workflow_runner": sandboxed_workflow_runner(sample), **worker_options},
+    )
+
+    def close() -> None:
+        for closer in closers:
+            closer()
+
+    return worker, close
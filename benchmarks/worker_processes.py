@@ -0,0 +1,182 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Throughput of the loan workflow with 1, 2, 4 and 8 worker processes started by the supervisor
+
+For every ``--processes`` count, the supervisor of the loan sample runs in a process of its own and starts the worker
+processes on one task queue, against the Temporal and KuFlow stand-ins of this process, which also starts the
+workflows and completes their tasks. The worker processes run the worker of ``benchmarks.samples``, as the sample
+worker needs the KuFlow authentication and TLS. The workflows are started once every worker process polls, so their
+startup is left out, and a line is printed per count:
+
+    python -m benchmarks.worker_processes --workflows 500 --concurrency 100 --processes 1 2 4 8
+
+The stand-ins share this process, so they can become the bottleneck before the workers do.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import signal
+import sys
+import time
+import uuid
+from typing import List, Optional
+
+from temporalio.client import Client
+
+from benchmarks.fake_kuflow import FakeKuFlowServer
+from benchmarks.fake_temporal import FakeTemporalServer
+from benchmarks.load_test import HumanTaskSimulator, LoadTestReport, run_load_test
+from benchmarks.samples import SAMPLES, create_worker, kuflow_data_converter
+from kuflow_samples_temporal_loan.configuration import SamplesConfiguration
+from kuflow_samples_temporal_loan.supervisor import WorkerSupervisor
+from kuflow_samples_temporal_loan.worker import temporal_worker_tuning
+
+
+# Seconds given to the worker processes to poll the task queue
+_STARTUP_TIMEOUT = 60
+
+
+def run_worker_process(configuration: SamplesConfiguration, slot: int, startup_profile: bool) -> None:
+    """Worker process of the supervisor, running the benchmark worker until SIGTERM or SIGINT"""
+
+    sys.exit(asyncio.run(_run_worker(configuration)))
+
+
+async def _run_worker(configuration: SamplesConfiguration) -> int:
+    client = await Client.connect(configuration.temporal_host, data_converter=kuflow_data_converter())
+    worker, close_worker = create_worker(
+        client,
+        SAMPLES["loan"],
+        task_queue=configuration.temporal_queue,
+        kuflow_endpoint=configuration.kuflow_api_endpoint,
+        currency_endpoint=f"{configuration.kuflow_api_endpoint}/currencies",
+        **temporal_worker_tuning(configuration),
+    )
+
+    loop = asyncio.get_running_loop()
+    stop_requested = asyncio.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop_requested.set)
+
+    try:
+        async with worker:
+            await stop_requested.wait()
+    finally:
+        close_worker()
+
+    return 0
+
+
+def _run_supervisor(configuration: SamplesConfiguration, processes: int) -> None:
+    WorkerSupervisor(configuration, processes, worker_process=run_worker_process).run()
+
+
+async def run_with_processes(
+    processes: int,
+    *,
+    workflows: int,
+    concurrency: int,
+    kuflow_latency: float = 0,
+    max_concurrent_activities: Optional[int] = None,
+) -> LoadTestReport:
+    """Run the load test of the loan sample with ``processes`` worker processes started by the supervisor"""
+
+    task_queue = f"worker-processes-{uuid.uuid4()}"
+
+    with FakeTemporalServer() as temporal_server, FakeKuFlowServer(latency=kuflow_latency) as kuflow_server:
+        client = await Client.connect(temporal_server.target, data_converter=kuflow_data_converter())
+        kuflow_server.on_process_item_created = HumanTaskSimulator(
+            client, SAMPLES["loan"], kuflow_server
+        ).on_process_item_created
+
+        configuration = SamplesConfiguration(
+            kuflow_api_client_id="benchmark",
+            kuflow_api_client_secret="benchmark",
+            temporal_queue=task_queue,
+            kuflow_api_endpoint=kuflow_server.endpoint,
+            temporal_host=temporal_server.target,
+            temporal_worker_max_concurrent_activities=max_concurrent_activities,
+            temporal_worker_graceful_shutdown_timeout=0,
+        )
+        supervisor = multiprocessing.get_context("spawn").Process(
+            target=_run_supervisor, args=(configuration, processes), name="supervisor"
+        )
+        supervisor.start()
+        try:
+            deadline = time.monotonic() + _STARTUP_TIMEOUT
+            while len(temporal_server.workflow_pollers(task_queue)) < processes:
+                if time.monotonic() > deadline or not supervisor.is_alive():
+                    raise Exception(f"The {processes} worker processes did not poll the task queue in time")
+                await asyncio.sleep(0.1)
+
+            return await run_load_test(
+                client,
+                SAMPLES["loan"],
+                kuflow_server,
+                task_queue=task_queue,
+                workflows=workflows,
+                concurrency=concurrency,
+            )
+        finally:
+            # As an orchestrator would, the supervisor drains the worker processes
+            supervisor.terminate()
+            await asyncio.get_running_loop().run_in_executor(None, supervisor.join)
+
+
+def _line(processes: int, report: LoadTestReport) -> str:
+    return (
+        f"{processes:>2} processes {report.throughput:8.2f} workflows/s   "
+        f"latency p50 {report.latency_p50 * 1000:8.1f} ms   p99 {report.latency_p99 * 1000:8.1f} ms   "
+        f"{report.failed} failed"
+    )
+
+
+async def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.worker_processes", description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8], help="counts to run")
+    parser.add_argument("--workflows", type=int, default=500, help="workflows to run per process count")
+    parser.add_argument("--concurrency", type=int, default=100, help="workflows running at the same time")
+    parser.add_argument("--kuflow-latency", type=float, default=0.02, help="seconds added to every KuFlow API call")
+    parser.add_argument("--max-concurrent-activities", type=int, default=None, help="activity slots of each process")
+    args = parser.parse_args(arguments)
+
+    print(f"{multiprocessing.cpu_count()} CPUs")
+    failed = False
+    for processes in args.processes:
+        report = await run_with_processes(
+            processes,
+            workflows=args.workflows,
+            concurrency=args.concurrency,
+            kuflow_latency=args.kuflow_latency,
+            max_concurrent_activities=args.max_concurrent_activities,
+        )
+        print(_line(processes, report))
+        failed = failed or report.failed > 0
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,154 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""Latency of the workflow tasks that miss the workflow cache, with the development and the production worker profile
+
+Runs the load test of each sample once per profile of its worker (``temporal_worker_profile``) against the in-process
+stand-ins, with ``max_cached_workflows=0``, so every workflow task rebuilds the workflow in a new sandbox and replays
+its history. The latency of a task is the time taken to create the workflow instance and run its activation, a line
+is printed per sample and profile:
+
+    python -m benchmarks.workflow_cache_miss --workflows 50 --concurrency 10
+
+The development profile runs the default sandbox, which imports the KuFlow modules again for every instance, and the
+loan worker adds the debug mode. The production profile passes ``SANDBOX_PASSTHROUGH_MODULES`` through the sandbox.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from typing import List, Optional
+
+from temporalio.bridge.proto.workflow_activation import WorkflowActivation
+from temporalio.bridge.proto.workflow_completion import WorkflowActivationCompletion
+from temporalio.worker import WorkflowInstance, WorkflowInstanceDetails, WorkflowRunner
+from temporalio.worker.workflow_sandbox import SandboxedWorkflowRunner
+from temporalio.workflow import _Definition
+
+from benchmarks.load_test import _mean, _percentile, run_in_process
+from benchmarks.samples import SAMPLES
+from kuflow_samples_expense_reimbursement import configuration as expense_configuration
+from kuflow_samples_expense_reimbursement import worker as expense_worker
+from kuflow_samples_temporal_loan import configuration as loan_configuration
+from kuflow_samples_temporal_loan import worker as loan_worker
+
+
+PROFILES = ("development", "production")
+
+_WORKERS = {
+    "loan": (loan_worker, loan_configuration.SamplesConfiguration),
+    "expense": (expense_worker, expense_configuration.SamplesConfiguration),
+}
+
+
+class TimedWorkflowRunner(WorkflowRunner):
+    """Runner recording the latency of the first activation of every workflow instance, including its creation"""
+
+    def __init__(self, runner: WorkflowRunner) -> None:
+        self._runner = runner
+        self.latencies: List[float] = []
+
+    def prepare_workflow(self, defn: _Definition) -> None:
+        self._runner.prepare_workflow(defn)
+
+    def create_instance(self, det: WorkflowInstanceDetails) -> WorkflowInstance:
+        started_at = time.perf_counter()
+        instance = self._runner.create_instance(det)
+
+        return _TimedWorkflowInstance(instance, time.perf_counter() - started_at, self.latencies)
+
+
+class _TimedWorkflowInstance(WorkflowInstance):
+    def __init__(self, instance: WorkflowInstance, creation: float, latencies: List[float]) -> None:
+        self._instance = instance
+        self._creation: Optional[float] = creation
+        self._latencies = latencies
+
+    def activate(self, act: WorkflowActivation) -> WorkflowActivationCompletion:
+        started_at = time.perf_counter()
+        completion = self._instance.activate(act)
+        # Without a cache the instance only runs the task that created it
+        if self._creation is not None:
+            self._latencies.append(self._creation + time.perf_counter() - started_at)
+            self._creation = None
+
+        return completion
+
+
+def profile_worker_options(sample: str, profile: str) -> dict:
+    """Worker options of the profile of the sample worker, the default sandbox unless the profile sets one"""
+
+    worker, configuration_class = _WORKERS[sample]
+    configuration = configuration_class(
+        kuflow_api_client_id="benchmark",
+        kuflow_api_client_secret="benchmark",
+        temporal_queue="benchmark",
+        temporal_worker_profile=profile,
+    )
+
+    return {"workflow_runner": SandboxedWorkflowRunner(), **worker.temporal_worker_profile(configuration)}
+
+
+async def measure(sample: str, profile: str, *, workflows: int, concurrency: int) -> str:
+    worker_options = profile_worker_options(sample, profile)
+    runner = TimedWorkflowRunner(worker_options["workflow_runner"])
+
+    report = await run_in_process(
+        SAMPLES[sample],
+        server="fake",
+        workflows=workflows,
+        concurrency=concurrency,
+        **{**worker_options, "workflow_runner": runner, "max_cached_workflows": 0},
+    )
+    if report.failed:
+        raise Exception(f"{report.failed} workflows of the {sample} sample failed with the {profile} profile")
+
+    latencies = runner.latencies
+    return (
+        f"{sample:<8} {profile:<12} {len(latencies):5} workflow tasks   "
+        f"latency mean {_mean(latencies) * 1000:7.2f} ms   p50 {_percentile(latencies, 50) * 1000:7.2f} ms   "
+        f"p99 {_percentile(latencies, 99) * 1000:7.2f} ms   "
+        f"{report.throughput:6.2f} workflows/s"
+    )
+
+
+async def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.workflow_cache_miss", description=__doc__.splitlines()[0]
+    )
+    parser.add_argument("--sample", choices=sorted(SAMPLES), action="append", help="default all the samples")
+    parser.add_argument("--profile", choices=PROFILES, action="append", help="default all the profiles")
+    parser.add_argument("--workflows", type=int, default=50, help="workflows to run per sample and profile")
+    parser.add_argument("--concurrency", type=int, default=10, help="workflows running at the same time")
+    args = parser.parse_args(arguments)
+
+    for sample in args.sample or sorted(SAMPLES):
+        for profile in args.profile or PROFILES:
+            print(await measure(sample, profile, workflows=args.workflows, concurrency=args.concurrency))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,113 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""Latency and history size of variants of the loan workflow
+
+Runs the load test of the loan sample once per ``--variant``, by default against the in-process Temporal stand-in of
+``benchmarks.fake_temporal``, and prints a line per variant:
+
+- ``sequential``: the workflow of ``benchmarks.sequential_loan_workflow``, which updates the process metadata and then
+  converts the currency
+- ``remote``: the metadata update and the currency conversion run at the same time, the conversion is an activity
+  scheduled on the task queue, the default
+- ``local``: as ``remote``, but the currency conversion is a local activity, ``currency.conversion.local-activity``
+
+    python -m benchmarks.workflow_variants --workflows 200 --concurrency 50 --kuflow-latency 0.02
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import sys
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from benchmarks.load_test import LoadTestReport, run_in_process
+from benchmarks.samples import SAMPLES
+from benchmarks.sequential_loan_workflow import SampleWorkflow as SequentialSampleWorkflow
+from kuflow_samples_temporal_loan.features import WorkflowFeatures, set_workflow_features
+
+
+async def _sequential(**load_test: float) -> LoadTestReport:
+    sample = dataclasses.replace(SAMPLES["loan"], workflow=SequentialSampleWorkflow)
+
+    return await run_in_process(sample, **load_test)
+
+
+async def _remote(**load_test: float) -> LoadTestReport:
+    set_workflow_features(WorkflowFeatures(currency_conversion_local_activity=False))
+
+    return await run_in_process(SAMPLES["loan"], **load_test)
+
+
+async def _local(**load_test: float) -> LoadTestReport:
+    set_workflow_features(WorkflowFeatures(currency_conversion_local_activity=True))
+    try:
+        return await run_in_process(SAMPLES["loan"], **load_test)
+    finally:
+        set_workflow_features(WorkflowFeatures())
+
+
+VARIANTS: Dict[str, Callable[..., Awaitable[LoadTestReport]]] = {
+    "sequential": _sequential,
+    "remote": _remote,
+    "local": _local,
+}
+
+
+def _line(variant: str, report: LoadTestReport) -> str:
+    return (
+        f"{variant:<10} {report.throughput:8.2f} workflows/s   latency p50 {report.latency_p50 * 1000:8.1f} ms   "
+        f"p99 {report.latency_p99 * 1000:8.1f} ms   history {report.history_events_mean:5.1f} events "
+        f"{report.history_bytes_mean:7.0f} B   {report.failed} failed"
+    )
+
+
+async def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.workflow_variants", description=__doc__.splitlines()[0])
+    parser.add_argument("--variant", choices=list(VARIANTS), action="append", help="default all the variants")
+    parser.add_argument("--workflows", type=int, default=200, help="workflows to run per variant")
+    parser.add_argument("--concurrency", type=int, default=50, help="workflows running at the same time")
+    parser.add_argument("--kuflow-latency", type=float, default=0.02, help="seconds added to every KuFlow API call")
+    parser.add_argument(
+        "--server", default="fake", help="fake (in-process stand-in), local (dev server) or host:port of a server"
+    )
+    args = parser.parse_args(arguments)
+
+    failed = False
+    for variant in args.variant or VARIANTS:
+        load_test = {
+            "server": args.server,
+            "workflows": args.workflows,
+            "concurrency": args.concurrency,
+            "kuflow_latency": args.kuflow_latency,
+        }
+        report = await VARIANTS[variant](**load_test)
+        print(_line(variant, report))
+        failed = failed or report.failed > 0
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
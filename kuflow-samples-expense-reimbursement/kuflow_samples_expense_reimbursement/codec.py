@@ -0,0 +1,77 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import zlib
+from typing import List, Optional, Sequence
+
+from temporalio.api.common.v1 import Payload
+from temporalio.converter import PayloadCodec
+
+
+class CompressionCodec(PayloadCodec):
+    """Payload codec compressing with zlib the payloads larger than ``threshold`` bytes
+
+    The retrieved process items carry their whole task data, so compressing them shrinks the workflow histories and
+    what every replay has to read. The payloads not worth compressing are left as they are, and payloads without the
+    compressed encoding are decoded untouched, so the histories written before compression was enabled still replay.
+    Without a ``threshold`` the codec only decodes, which keeps the compressed histories readable after compression
+    is disabled.
+    """
+
+    ENCODING = b"binary/zlib"
+
+    def __init__(self, *, threshold: Optional[int] = None, level: int = zlib.Z_DEFAULT_COMPRESSION):
+        if threshold is not None and threshold < 0:
+            raise Exception(f"Payload compression threshold {threshold} must not be negative")
+        if not -1 <= level <= 9:
+            raise Exception(f"Payload compression level {level} must be between 0 and 9, or -1 for the zlib default")
+
+        self._threshold = threshold
+        self._level = level
+
+    async def encode(self, payloads: Sequence[Payload]) -> List[Payload]:
+        if self._threshold is None:
+            return list(payloads)
+
+        return [self._compress(payload) for payload in payloads]
+
+    async def decode(self, payloads: Sequence[Payload]) -> List[Payload]:
+        return [self._decompress(payload) for payload in payloads]
+
+    def _compress(self, payload: Payload) -> Payload:
+        if payload.ByteSize() <= self._threshold:
+            return payload
+
+        data = zlib.compress(payload.SerializeToString(), self._level)
+        # Small or already compressed payloads, like files, may not shrink
+        if len(data) >= payload.ByteSize():
+            return payload
+
+        return Payload(metadata={"encoding": CompressionCodec.ENCODING}, data=data)
+
+    def _decompress(self, payload: Payload) -> Payload:
+        if payload.metadata.get("encoding") != CompressionCodec.ENCODING:
+            return payload
+
+        return Payload.FromString(zlib.decompress(payload.data))
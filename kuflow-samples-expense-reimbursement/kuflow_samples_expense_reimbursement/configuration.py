@@ -0,0 +1,270 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import functools
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+import yaml
+
+
+# Read in this order, the properties of a file override the ones of the files before it
+CONFIGURATION_FILES = ("application.yaml", "application-local.yaml")
+
+
+@dataclass(frozen=True)
+class ConfigurationProperty:
+    """Property of the configuration files, overridden by the environment variable ``environment_name``"""
+
+    name: str
+    environment_name: str
+    path: str
+    type: Callable[[str], Any] = str
+    required: bool = False
+    choices: Optional[Tuple[str, ...]] = None
+    minimum: Optional[float] = None
+    maximum: Optional[float] = None
+
+    def parse(self, value: Any) -> Any:
+        try:
+            return self.type(str(value))
+        except ValueError:
+            raise Exception(f"Property {self.path} must be {self.type.__name__}, not {value}") from None
+
+    def validate(self, value: Any) -> None:
+        if value is None:
+            if self.required:
+                raise Exception(f"Property {self.path} not found")
+            return
+
+        if self.choices is not None and value not in self.choices:
+            raise Exception(f"Property {self.path} must be one of {', '.join(self.choices)}, not {value}")
+        if self.minimum is not None and value < self.minimum:
+            raise Exception(f"Property {self.path} must be at least {self.minimum}, not {value}")
+        if self.maximum is not None and value > self.maximum:
+            raise Exception(f"Property {self.path} must be at most {self.maximum}, not {value}")
+
+
+PROPERTIES = (
+    ConfigurationProperty("kuflow_api_endpoint", "KUFLOW_API_ENDPOINT", "kuflow.api.endpoint"),
+    ConfigurationProperty("kuflow_api_client_id", "KUFLOW_API_CLIENTID", "kuflow.api.client-id", required=True),
+    ConfigurationProperty(
+        "kuflow_api_client_secret", "KUFLOW_API_CLIENTSECRET", "kuflow.api.client-secret", required=True
+    ),
+    ConfigurationProperty("temporal_host", "TEMPORAL_TARGET", "temporal.target"),
+    ConfigurationProperty("temporal_queue", "TEMPORAL_KUFLOWQUEUE", "temporal.kuflow-queue", required=True),
+    ConfigurationProperty(
+        "temporal_metrics_port", "TEMPORAL_METRICS_PORT", "temporal.metrics.port", int, minimum=1, maximum=65535
+    ),
+    ConfigurationProperty(
+        "temporal_payload_compression_threshold",
+        "TEMPORAL_PAYLOADCOMPRESSION_THRESHOLD",
+        "temporal.payload-compression.threshold",
+        int,
+        minimum=0,
+    ),
+    ConfigurationProperty(
+        "temporal_payload_compression_level",
+        "TEMPORAL_PAYLOADCOMPRESSION_LEVEL",
+        "temporal.payload-compression.level",
+        int,
+        minimum=-1,
+        maximum=9,
+    ),
+    ConfigurationProperty(
+        "temporal_worker_max_concurrent_activities",
+        "TEMPORAL_WORKER_MAX_CONCURRENT_ACTIVITIES",
+        "temporal.worker.max-concurrent-activities",
+        int,
+        minimum=1,
+    ),
+    ConfigurationProperty(
+        "temporal_worker_max_concurrent_local_activities",
+        "TEMPORAL_WORKER_MAX_CONCURRENT_LOCAL_ACTIVITIES",
+        "temporal.worker.max-concurrent-local-activities",
+        int,
+        minimum=1,
+    ),
+    ConfigurationProperty(
+        "temporal_worker_max_concurrent_workflow_tasks",
+        "TEMPORAL_WORKER_MAX_CONCURRENT_WORKFLOW_TASKS",
+        "temporal.worker.max-concurrent-workflow-tasks",
+        int,
+        minimum=1,
+    ),
+    ConfigurationProperty(
+        "temporal_worker_max_concurrent_activity_task_polls",
+        "TEMPORAL_WORKER_MAX_CONCURRENT_ACTIVITY_TASK_POLLS",
+        "temporal.worker.max-concurrent-activity-task-polls",
+        int,
+        minimum=1,
+    ),
+    ConfigurationProperty(
+        "temporal_worker_max_concurrent_workflow_task_polls",
+        "TEMPORAL_WORKER_MAX_CONCURRENT_WORKFLOW_TASK_POLLS",
+        "temporal.worker.max-concurrent-workflow-task-polls",
+        int,
+        minimum=1,
+    ),
+    ConfigurationProperty(
+        "temporal_worker_max_cached_workflows",
+        "TEMPORAL_WORKER_MAX_CACHED_WORKFLOWS",
+        "temporal.worker.max-cached-workflows",
+        int,
+        minimum=0,
+    ),
+    ConfigurationProperty(
+        "temporal_worker_graceful_shutdown_timeout",
+        "TEMPORAL_WORKER_GRACEFUL_SHUTDOWN_TIMEOUT",
+        "temporal.worker.graceful-shutdown-timeout",
+        float,
+        minimum=0,
+    ),
+    ConfigurationProperty(
+        "temporal_worker_profile",
+        "TEMPORAL_WORKER_PROFILE",
+        "temporal.worker.profile",
+        choices=("development", "production"),
+    ),
+    ConfigurationProperty("tracing_exporter", "TRACING_EXPORTER", "tracing.exporter", choices=("otlp", "file")),
+    ConfigurationProperty("tracing_otlp_endpoint", "TRACING_OTLPENDPOINT", "tracing.otlp-endpoint"),
+    ConfigurationProperty("tracing_file", "TRACING_FILE", "tracing.file"),
+    ConfigurationProperty(
+        "tracing_sampling_ratio", "TRACING_SAMPLINGRATIO", "tracing.sampling-ratio", float, minimum=0, maximum=1
+    ),
+    ConfigurationProperty(
+        "review_continue_as_new_iterations",
+        "REVIEW_CONTINUEASNEW_ITERATIONS",
+        "review.continue-as-new.iterations",
+        int,
+        minimum=1,
+    ),
+    ConfigurationProperty(
+        "review_continue_as_new_history_length",
+        "REVIEW_CONTINUEASNEW_HISTORYLENGTH",
+        "review.continue-as-new.history-length",
+        int,
+        minimum=1,
+    ),
+)
+
+
+@dataclass(frozen=True, slots=True)
+class SamplesConfiguration:
+    """Configuration of the sample workers, validated when created
+
+    Immutable, so a single instance is shared by everything in the process, use ``dataclasses.replace`` to derive a
+    different one.
+    """
+
+    kuflow_api_client_id: str
+    kuflow_api_client_secret: str = field(repr=False)
+    temporal_queue: str
+    kuflow_api_endpoint: Optional[str] = None
+
+    temporal_host: Optional[str] = None
+    temporal_metrics_port: Optional[int] = None
+    temporal_payload_compression_threshold: Optional[int] = None
+    temporal_payload_compression_level: Optional[int] = None
+
+    temporal_worker_max_concurrent_activities: Optional[int] = None
+    temporal_worker_max_concurrent_local_activities: Optional[int] = None
+    temporal_worker_max_concurrent_workflow_tasks: Optional[int] = None
+    temporal_worker_max_concurrent_activity_task_polls: Optional[int] = None
+    temporal_worker_max_concurrent_workflow_task_polls: Optional[int] = None
+    temporal_worker_max_cached_workflows: Optional[int] = None
+    temporal_worker_graceful_shutdown_timeout: Optional[float] = None
+    temporal_worker_profile: Optional[str] = None
+
+    tracing_exporter: Optional[str] = None
+    tracing_otlp_endpoint: Optional[str] = None
+    tracing_file: Optional[str] = None
+    tracing_sampling_ratio: Optional[float] = None
+
+    review_continue_as_new_iterations: Optional[int] = None
+    review_continue_as_new_history_length: Optional[int] = None
+
+    def __post_init__(self):
+        for configuration_property in PROPERTIES:
+            configuration_property.validate(getattr(self, configuration_property.name))
+
+        if self.tracing_exporter == "file" and self.tracing_file is None:
+            raise Exception("Property tracing.file not found, it is required by the file tracing exporter")
+
+
+@functools.lru_cache(maxsize=None)
+def load_configuration() -> SamplesConfiguration:
+    """Configuration of the configuration files and the environment, read once per process"""
+
+    properties: Dict[str, Any] = {}
+    for file in CONFIGURATION_FILES:
+        properties.update(flatten_configuration(read_configuration(file)))
+
+    return parse_configuration(properties, os.environ)
+
+
+def parse_configuration(properties: Mapping[str, Any], environment: Mapping[str, str]) -> SamplesConfiguration:
+    """Configuration of the given properties, by dotted path, overridden by the environment variables"""
+
+    values = {}
+    for configuration_property in PROPERTIES:
+        value = environment.get(configuration_property.environment_name)
+        if value is None:
+            value = properties.get(configuration_property.path)
+        if value is None:
+            if configuration_property.required:
+                raise Exception(f"Property {configuration_property.path} not found")
+            continue
+
+        values[configuration_property.name] = configuration_property.parse(value)
+
+    return SamplesConfiguration(**values)
+
+
+def flatten_configuration(configuration: Mapping[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Scalar values of the configuration by dotted path, e.g. ``temporal.worker.profile``"""
+
+    properties = {}
+    for key, value in configuration.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            properties.update(flatten_configuration(value, f"{path}."))
+        elif value is None or isinstance(value, (str, bool, int, float)):
+            properties[path] = value
+
+    return properties
+
+
+def read_configuration(file: str) -> dict:
+    configuration_path = Path(__file__).with_name(file)
+
+    if configuration_path.exists() is False:
+        return {}
+
+    with open(configuration_path) as file:
+        yaml_data = yaml.safe_load(file)
+
+        return dict(yaml_data) if yaml_data else {}
@@ -0,0 +1,65 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import dataclasses
+from typing import Optional
+
+import temporalio.converter
+from kuflow_temporal_worker import KuFlowConfig, KuFlowTemporalConnection, TemporalConfig
+from temporalio.converter import EncodingPayloadConverter, PayloadCodec
+
+from kuflow_samples_expense_reimbursement.converter import register_payload_converter
+
+
+class SampleTemporalConnection(KuFlowTemporalConnection):
+    """KuFlow Temporal connection whose client and worker use the given payload converter and codec
+
+    ``KuFlowTemporalConnection`` replaces the data converter of the client configuration when it connects, to register
+    the KuFlow models converter, so a converter or codec set in ``TemporalClientConfig`` would be lost. The payload
+    converter is registered ahead of the KuFlow one, for its encoding, and the codec is added to the data converter.
+    """
+
+    def __init__(
+        self,
+        *,
+        kuflow: KuFlowConfig,
+        temporal: TemporalConfig,
+        payload_converter: Optional[EncodingPayloadConverter] = None,
+        payload_codec: Optional[PayloadCodec] = None,
+    ):
+        super().__init__(kuflow=kuflow, temporal=temporal)
+
+        self._payload_converter = payload_converter
+        self._payload_codec = payload_codec
+
+    def _register_encoding_payload_converter(self):
+        super()._register_encoding_payload_converter()
+
+        if self._payload_converter is not None:
+            register_payload_converter(self._payload_converter)
+
+        # Built again, to include the converter registered above
+        self._temporal.client.data_converter = dataclasses.replace(
+            temporalio.converter.DataConverter.default, payload_codec=self._payload_codec
+        )
@@ -0,0 +1,67 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from temporalio.common import RetryPolicy
+
+
+@dataclass(frozen=True)
+class ActivityPolicy:
+    """Timeouts and retry policy of an activity, passed to ``workflow.execute_activity`` as ``**policy.options()``
+
+    The start to close timeout bounds a single attempt, so it is how long a hung call takes to be retried. Activities
+    that can legitimately run for long set a heartbeat timeout instead, the worker heartbeats while they run (see the
+    ``heartbeat`` module) and a lost worker is detected as soon as the heartbeats stop.
+    """
+
+    start_to_close_timeout: timedelta
+    schedule_to_close_timeout: timedelta = timedelta(days=365)
+    heartbeat_timeout: Optional[timedelta] = None
+    retry_policy: RetryPolicy = field(default_factory=RetryPolicy)
+
+    def options(self) -> Dict[str, Any]:
+        options = {
+            "start_to_close_timeout": self.start_to_close_timeout,
+            "schedule_to_close_timeout": self.schedule_to_close_timeout,
+            "retry_policy": self.retry_policy,
+        }
+        # Local activities do not heartbeat
+        if self.heartbeat_timeout is not None:
+            options["heartbeat_timeout"] = self.heartbeat_timeout
+
+        return options
+
+
+# Short KuFlow calls: retrieves, metadata and entity patches or updates, process item creation and task changes.
+KUFLOW_QUICK_ACTIVITY_POLICY = ActivityPolicy(start_to_close_timeout=timedelta(seconds=30))
+
+# KuFlow calls that carry large payloads, such as task data updates and document uploads.
+KUFLOW_UPLOAD_ACTIVITY_POLICY = ActivityPolicy(
+    start_to_close_timeout=timedelta(minutes=10),
+    heartbeat_timeout=timedelta(seconds=30),
+    retry_policy=RetryPolicy(maximum_interval=timedelta(seconds=30)),
+)
@@ -0,0 +1,115 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import asyncio
+from datetime import timedelta
+from typing import Dict, Optional, Set
+
+from temporalio import workflow
+
+from kuflow_samples_expense_reimbursement.policies import ActivityPolicy
+
+
+with workflow.unsafe.imports_passed_through():
+    from kuflow_rest import models as models_rest
+    from kuflow_temporal_activity_kuflow import KuFlowActivities
+    from kuflow_temporal_activity_kuflow import models as models_activity
+
+
+PROCESS_ITEM_WAIT_LATENCY_METRIC = "kuflow_process_item_wait_latency"
+
+
+class ProcessItemCompletionTracker:
+    """Completion of KuFlow process items, as notified by the KUFLOW_ENGINE_SIGNAL_PROCESS_ITEM signal
+
+    Every waiter gets its own future, so a signal only wakes up the code waiting for that process item, and ids are
+    forgotten as soon as their completion has been consumed. Every wake-up records how long the workflow waited in
+    the ``kuflow_process_item_wait_latency`` histogram.
+    """
+
+    def __init__(self) -> None:
+        self._completed_ids: Set[str] = set()
+        self._waiters: Dict[str, asyncio.Future] = {}
+
+    def complete(self, process_item_id: str) -> None:
+        waiter = self._waiters.pop(process_item_id, None)
+        if waiter is None:
+            # Nobody is waiting yet, keep it until it is waited for
+            self._completed_ids.add(process_item_id)
+        elif not waiter.done():
+            waiter.set_result(None)
+
+    async def wait_completion(self, process_item_id: str) -> None:
+        if process_item_id in self._completed_ids:
+            self._completed_ids.remove(process_item_id)
+            self._record_wake_up(timedelta())
+            return
+
+        started_at = workflow.now()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[process_item_id] = waiter
+        try:
+            await waiter
+        finally:
+            self._waiters.pop(process_item_id, None)
+
+        self._record_wake_up(workflow.now() - started_at)
+
+    def _record_wake_up(self, waited: timedelta) -> None:
+        # The workflow metric meter does not record during replay
+        workflow.metric_meter().create_histogram_timedelta(
+            PROCESS_ITEM_WAIT_LATENCY_METRIC, "Time waited for the completion of a process item", "duration"
+        ).record(waited)
+
+    async def create_and_wait_completion(
+        self,
+        request: models_activity.ProcessItemCreateRequest,
+        *,
+        retrieve: bool,
+        policy: ActivityPolicy,
+    ) -> Optional[models_rest.ProcessItem]:
+        """Create a process item in KuFlow and wait for its completion
+
+        The completion signal does not carry the process item data, so when ``retrieve`` is set the completed item is
+        read back with a single retrieve activity. Otherwise nothing is returned.
+        """
+
+        await workflow.execute_activity(
+            KuFlowActivities.create_process_item,
+            request,
+            **policy.options(),
+        )
+
+        await self.wait_completion(request.id)
+
+        if not retrieve:
+            return None
+
+        retrieve_response: models_activity.ProcessItemRetrieveResponse = await workflow.execute_activity(
+            KuFlowActivities.retrieve_process_item,
+            models_activity.ProcessItemRetrieveRequest(process_item_id=request.id),
+            **policy.options(),
+        )
+
+        return retrieve_response.process_item
@@ -0,0 +1,111 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import asyncio
+import logging
+import signal
+from typing import Any
+
+from kuflow_temporal_worker import KuFlowTemporalConnection
+from temporalio import activity
+from temporalio.exceptions import CancelledError
+from temporalio.worker import ActivityInboundInterceptor, ExecuteActivityInput, Interceptor
+
+
+logger = logging.getLogger(__name__)
+
+# Exit codes of the worker, so the orchestrator knows how it stopped. An error in the worker exits with 1, as any
+# uncaught Python exception does.
+EXIT_CODE_STOPPED = 0
+"""Stopped by SIGTERM or SIGINT once all the running activities finished"""
+
+EXIT_CODE_ACTIVITIES_CANCELLED = 3
+"""Stopped by SIGTERM or SIGINT, but some activities were still running after the grace period and were cancelled"""
+
+
+class GracefulShutdown(Interceptor):
+    """Stops a worker when the process receives SIGTERM or SIGINT
+
+    The worker stops polling, gives the running activities ``graceful_shutdown_timeout`` to finish and then cancels
+    the remaining ones. A cancelled activity fails right away and Temporal retries it in another worker, instead of
+    waiting for its start to close timeout. It must be registered as a worker interceptor to count those activities.
+    """
+
+    def __init__(self):
+        self.cancelled_activities = 0
+
+    def intercept_activity(self, next: ActivityInboundInterceptor) -> ActivityInboundInterceptor:
+        return _GracefulShutdownActivityInboundInterceptor(self, next)
+
+    async def run_worker(self, kuflow_temporal_connection: KuFlowTemporalConnection) -> int:
+        """Run the worker until it is stopped, returning the exit code of the process"""
+
+        worker = await kuflow_temporal_connection.create_worker()
+
+        loop = asyncio.get_running_loop()
+        stop_requested = asyncio.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop_requested.set)
+
+        run_task = asyncio.create_task(kuflow_temporal_connection.run_worker())
+        stop_task = asyncio.create_task(stop_requested.wait())
+        shutdown_task = None
+        try:
+            await asyncio.wait([run_task, stop_task], return_when=asyncio.FIRST_COMPLETED)
+            if not run_task.done():
+                logger.info("Stop requested, draining the worker")
+                shutdown_task = asyncio.create_task(worker.shutdown())
+
+            # Raises the worker error, if any
+            await run_task
+        finally:
+            stop_task.cancel()
+            if shutdown_task is not None:
+                shutdown_task.cancel()
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                loop.remove_signal_handler(signum)
+
+        if self.cancelled_activities > 0:
+            logger.warning(f"{self.cancelled_activities} activities cancelled by the worker shutdown")
+
+            return EXIT_CODE_ACTIVITIES_CANCELLED
+
+        logger.info("Worker stopped")
+
+        return EXIT_CODE_STOPPED
+
+
+class _GracefulShutdownActivityInboundInterceptor(ActivityInboundInterceptor):
+    def __init__(self, graceful_shutdown: GracefulShutdown, next: ActivityInboundInterceptor):
+        super().__init__(next)
+        self._graceful_shutdown = graceful_shutdown
+
+    async def execute_activity(self, input: ExecuteActivityInput) -> Any:
+        try:
+            return await super().execute_activity(input)
+        # Blocking activities are cancelled with a Temporal CancelledError, raised in their thread
+        except (asyncio.CancelledError, CancelledError):
+            if activity.is_worker_shutdown():
+                self._graceful_shutdown.cancelled_activities += 1
+            raise
@@ -0,0 +1,381 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Mapping, NoReturn, Optional, Sequence, Tuple, Type
+
+from kuflow_temporal_activity_kuflow import models as models_activity
+from temporalio import workflow
+from temporalio.api.common.v1 import Payload
+from temporalio.converter import PayloadConverter
+from temporalio.exceptions import FailureError
+from temporalio.worker import (
+    ActivityInboundInterceptor,
+    ContinueAsNewInput,
+    ExecuteActivityInput,
+    ExecuteWorkflowInput,
+    HandleSignalInput,
+    StartActivityInput,
+    StartLocalActivityInput,
+    WorkflowInboundInterceptor,
+    WorkflowInterceptorClassInput,
+    WorkflowOutboundInterceptor,
+)
+
+
+try:
+    from opentelemetry import context as otel_context
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SpanExporter
+    from opentelemetry.sdk.trace.id_generator import RandomIdGenerator
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    from opentelemetry.trace import NonRecordingSpan, Span, SpanContext, SpanKind, Status, StatusCode, TraceFlags
+    from temporalio.contrib.opentelemetry import TracingInterceptor
+except ImportError as err:
+    raise ImportError(
+        "Tracing requires the OpenTelemetry SDK. Install it with: poetry install --extras tracing"
+    ) from err
+
+
+logger = logging.getLogger(__name__)
+
+# Header of the propagated trace context, the one of ``TracingInterceptor``, so the activity spans join the trace
+_TRACING_HEADER_KEY = "_tracer-data"
+
+_WORKFLOW_SPAN_FUNCTION = "__kuflow_tracing_workflow_span"
+
+
+def create_tracing_interceptor(
+    *,
+    service_name: str,
+    exporter: str,
+    otlp_endpoint: Optional[str] = None,
+    file: Optional[str] = None,
+    sampling_ratio: float = 1.0,
+) -> "KuFlowTracingInterceptor":
+    """Configure OpenTelemetry and create the worker interceptor that traces workflows and activities
+
+    Only ``sampling_ratio`` of the workflows started without a trace context are recorded, with all their spans.
+    Workflows and activities started with a trace context follow the sampling decision of their parent. When
+    ``opentelemetry-instrumentation-requests`` is installed, the HTTP calls of the KuFlow REST client and of the
+    activities become spans as well.
+    """
+
+    tracer_provider = create_tracer_provider(service_name=service_name, sampling_ratio=sampling_ratio)
+    tracer_provider.add_span_processor(BatchSpanProcessor(_create_span_exporter(exporter, otlp_endpoint, file)))
+    trace.set_tracer_provider(tracer_provider)
+
+    try:
+        from opentelemetry.instrumentation.requests import RequestsInstrumentor
+
+        RequestsInstrumentor().instrument()
+    except ImportError:
+        logger.info("opentelemetry-instrumentation-requests is not installed, HTTP calls are not traced")
+
+    return KuFlowTracingInterceptor(tracer_provider)
+
+
+def create_tracer_provider(*, service_name: str, sampling_ratio: float = 1.0) -> TracerProvider:
+    """Tracer provider for ``KuFlowTracingInterceptor``, without span processors"""
+
+    return TracerProvider(
+        resource=Resource.create({SERVICE_NAME: service_name}),
+        sampler=ParentBased(TraceIdRatioBased(sampling_ratio)),
+        id_generator=WorkflowRootIdGenerator(),
+    )
+
+
+def _create_span_exporter(exporter: str, otlp_endpoint: Optional[str], file: Optional[str]) -> SpanExporter:
+    if exporter == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        except ImportError as err:
+            raise ImportError("The otlp exporter requires: poetry install --extras tracing") from err
+
+        return OTLPSpanExporter(endpoint=otlp_endpoint)
+
+    if exporter == "file":
+        if file is None:
+            raise Exception("Property tracing.file not found")
+
+        # Spans are written as JSON, one after the other. The file stays open for the life of the worker.
+        return ConsoleSpanExporter(out=open(file, "a"))
+
+    raise Exception(f"Tracing exporter {exporter} not supported, use otlp or file")
+
+
+def kuflow_span_attributes(values: Sequence[Any]) -> Dict[str, str]:
+    """KuFlow ids found in the workflow or activity arguments, to be set as span attributes"""
+
+    attributes = {}
+    for value in values:
+        process_id = getattr(value, "process_id", None)
+        if isinstance(process_id, str):
+            attributes["kuflow.process.id"] = process_id
+
+        # The process item to create has its id in ``id``, the requests about an existing one in ``process_item_id``
+        if isinstance(value, models_activity.ProcessItemCreateRequest):
+            process_item_id = value.id
+        else:
+            process_item_id = getattr(value, "process_item_id", None)
+        if isinstance(process_item_id, str):
+            attributes["kuflow.process_item.id"] = process_item_id
+
+    return attributes
+
+
+def workflow_root_ids(run_id: str) -> Tuple[int, int]:
+    """Trace id and span id of the root span of a workflow run started without a trace context"""
+
+    digest = hashlib.sha256(run_id.encode()).digest()
+
+    return int.from_bytes(digest[:16], "big") or 1, int.from_bytes(digest[16:24], "big") or 1
+
+
+class WorkflowRootIdGenerator(RandomIdGenerator):
+    """Random ids, except for the root spans of the workflow runs, whose ids are given by ``workflow_root_ids``"""
+
+    def __init__(self) -> None:
+        self._root_ids = threading.local()
+
+    @contextmanager
+    def root_ids(self, trace_id: int, span_id: int) -> Iterator[None]:
+        """Give these ids to the span started meanwhile in the current thread"""
+
+        self._root_ids.ids = (trace_id, span_id)
+        try:
+            yield
+        finally:
+            self._root_ids.ids = None
+
+    def generate_trace_id(self) -> int:
+        ids = getattr(self._root_ids, "ids", None)
+        return ids[0] if ids is not None else super().generate_trace_id()
+
+    def generate_span_id(self) -> int:
+        ids = getattr(self._root_ids, "ids", None)
+        return ids[1] if ids is not None else super().generate_span_id()
+
+
+@dataclass(frozen=True)
+class _WorkflowSpanParams:
+    name: str
+    kind: SpanKind
+    # Propagated context of the parent span, None for the root span of the workflow run
+    parent: Optional[Dict[str, str]]
+    run_id: str
+    attributes: Dict[str, str]
+    time_ns: int
+    # False when replaying, the span was recorded by the first execution of the workflow
+    record: bool
+    exception: Optional[BaseException] = None
+
+
+class KuFlowTracingInterceptor(TracingInterceptor):
+    """Temporal tracing interceptor that adds the KuFlow process and process item ids to the spans
+
+    KuFlow starts the workflows without a trace context, so each workflow run gets a root span, and every span of the
+    workflow and of its activities belongs to its trace, sampled or not as a whole. The activity spans are the ones of
+    ``TracingInterceptor``, the workflow spans are recorded by ``_KuFlowTracingWorkflowInboundInterceptor``.
+    """
+
+    def __init__(self, tracer_provider: TracerProvider) -> None:
+        if not isinstance(tracer_provider.id_generator, WorkflowRootIdGenerator):
+            raise Exception("The tracer provider must be created by create_tracer_provider")
+
+        super().__init__(tracer_provider.get_tracer(__name__))
+        # The workflow interceptor runs in the sandbox without access to this interceptor, so both use the same key
+        self.header_key = _TRACING_HEADER_KEY
+        self._sampler = tracer_provider.sampler
+        self._id_generator = tracer_provider.id_generator
+
+    def intercept_activity(self, next: ActivityInboundInterceptor) -> ActivityInboundInterceptor:
+        # The activity span is started first, so the attributes can be set on it
+        return super().intercept_activity(_KuFlowSpanAttributesActivityInboundInterceptor(next))
+
+    def workflow_interceptor_class(
+        self, input: WorkflowInterceptorClassInput
+    ) -> Type["_KuFlowTracingWorkflowInboundInterceptor"]:
+        input.unsafe_extern_functions[_WORKFLOW_SPAN_FUNCTION] = self._workflow_span
+
+        return _KuFlowTracingWorkflowInboundInterceptor
+
+    def _workflow_span(self, params: _WorkflowSpanParams) -> Dict[str, str]:
+        # Run outside the sandbox. The ids of the root span only depend on the run, so every execution and replay of
+        # the workflow, on any worker, continues the same trace, and the sampler takes the same decision for it.
+        if params.parent is not None:
+            span_context = self._record_workflow_span(params, self.text_map_propagator.extract(params.parent))
+        elif params.record:
+            with self._id_generator.root_ids(*workflow_root_ids(params.run_id)):
+                span_context = self._record_workflow_span(params, otel_context.Context())
+        else:
+            trace_id, span_id = workflow_root_ids(params.run_id)
+            sampling = self._sampler.should_sample(None, trace_id, params.name, params.kind, params.attributes)
+            span_context = SpanContext(
+                trace_id,
+                span_id,
+                is_remote=False,
+                trace_flags=TraceFlags(TraceFlags.SAMPLED if sampling.decision.is_sampled() else TraceFlags.DEFAULT),
+            )
+
+        carrier: Dict[str, str] = {}
+        self.text_map_propagator.inject(carrier, trace.set_span_in_context(NonRecordingSpan(span_context)))
+        return carrier
+
+    def _record_workflow_span(self, params: _WorkflowSpanParams, context: otel_context.Context) -> SpanContext:
+        span: Span = self.tracer.start_span(
+            params.name, context, kind=params.kind, attributes=params.attributes, start_time=params.time_ns
+        )
+        if params.exception is not None:
+            span.record_exception(params.exception)
+            span.set_status(Status(StatusCode.ERROR, f"{type(params.exception).__name__}: {params.exception}"))
+        span.end(end_time=params.time_ns)
+
+        return span.get_span_context()
+
+
+class _KuFlowSpanAttributesActivityInboundInterceptor(ActivityInboundInterceptor):
+    async def execute_activity(self, input: ExecuteActivityInput) -> Any:
+        attributes = kuflow_span_attributes(input.args)
+        if attributes:
+            trace.get_current_span().set_attributes(attributes)
+
+        return await super().execute_activity(input)
+
+
+class _KuFlowTracingWorkflowInboundInterceptor(WorkflowInboundInterceptor):
+    """Record the spans of a workflow run, children of its root span or of the trace context it was started with
+
+    The workflow runs in the sandbox and is replayed, so the spans are recorded outside, already completed, by the
+    extern function of ``KuFlowTracingInterceptor``, and only when the workflow is not replaying. The root span is
+    created by the first span of the run, and its context is passed to the activities and the continued runs in the
+    tracing header, so their spans join the trace and follow its sampling decision.
+    """
+
+    def __init__(self, next: WorkflowInboundInterceptor) -> None:
+        super().__init__(next)
+        self._attributes: Dict[str, str] = {}
+        self._context_carrier: Optional[Dict[str, str]] = None
+
+    def init(self, outbound: WorkflowOutboundInterceptor) -> None:
+        super().init(_KuFlowTracingWorkflowOutboundInterceptor(outbound, self))
+
+    async def execute_workflow(self, input: ExecuteWorkflowInput) -> Any:
+        info = workflow.info()
+        # Every span of the workflow (root, run, signals, activity starts) gets the ids of the workflow arguments
+        self._attributes = {
+            "temporalWorkflowID": info.workflow_id,
+            "temporalRunID": info.run_id,
+            **kuflow_span_attributes(input.args),
+        }
+
+        self.completed_span(f"RunWorkflow:{info.workflow_type}", SpanKind.SERVER)
+        try:
+            return await super().execute_workflow(input)
+        except FailureError as err:
+            # Only these errors fail the workflow, the rest fail the workflow task, which is retried
+            self.completed_span(f"CompleteWorkflow:{info.workflow_type}", SpanKind.INTERNAL, exception=err)
+            raise
+
+    async def handle_signal(self, input: HandleSignalInput) -> None:
+        self.completed_span(f"HandleSignal:{input.signal}", SpanKind.SERVER)
+
+        await super().handle_signal(input)
+
+    def context_carrier(self) -> Dict[str, str]:
+        """Propagated context of the root span of the run, or of the trace context the run was started with"""
+
+        if self._context_carrier is None:
+            header = workflow.info().headers.get(_TRACING_HEADER_KEY)
+            if header is not None:
+                self._context_carrier = PayloadConverter.default.from_payloads([header])[0]
+            else:
+                self._context_carrier = self._workflow_span(
+                    f"Workflow:{workflow.info().workflow_type}", SpanKind.INTERNAL, parent=None
+                )
+
+        return self._context_carrier
+
+    def completed_span(self, name: str, kind: SpanKind, *, exception: Optional[BaseException] = None) -> Dict[str, str]:
+        """Record a span of the run, returning its propagated context, or the one of the run when replaying"""
+
+        parent = self.context_carrier()
+        if workflow.unsafe.is_replaying():
+            return parent
+
+        return self._workflow_span(name, kind, parent=parent, exception=exception)
+
+    def headers_with_context(self, headers: Mapping[str, Payload], carrier: Dict[str, str]) -> Mapping[str, Payload]:
+        return {**headers, _TRACING_HEADER_KEY: PayloadConverter.default.to_payloads([carrier])[0]}
+
+    def _workflow_span(
+        self,
+        name: str,
+        kind: SpanKind,
+        *,
+        parent: Optional[Dict[str, str]],
+        exception: Optional[BaseException] = None,
+    ) -> Dict[str, str]:
+        return workflow.extern_functions()[_WORKFLOW_SPAN_FUNCTION](
+            _WorkflowSpanParams(
+                name=name,
+                kind=kind,
+                parent=parent,
+                run_id=workflow.info().run_id,
+                attributes=self._attributes,
+                time_ns=workflow.time_ns(),
+                record=not workflow.unsafe.is_replaying(),
+                exception=exception,
+            )
+        )
+
+
+class _KuFlowTracingWorkflowOutboundInterceptor(WorkflowOutboundInterceptor):
+    def __init__(self, next: WorkflowOutboundInterceptor, root: _KuFlowTracingWorkflowInboundInterceptor) -> None:
+        super().__init__(next)
+        self._root = root
+
+    def start_activity(self, input: StartActivityInput) -> workflow.ActivityHandle:
+        carrier = self._root.completed_span(f"StartActivity:{input.activity}", SpanKind.CLIENT)
+        input.headers = self._root.headers_with_context(input.headers, carrier)
+
+        return super().start_activity(input)
+
+    def start_local_activity(self, input: StartLocalActivityInput) -> workflow.ActivityHandle:
+        carrier = self._root.completed_span(f"StartActivity:{input.activity}", SpanKind.CLIENT)
+        input.headers = self._root.headers_with_context(input.headers, carrier)
+
+        return super().start_local_activity(input)
+
+    def continue_as_new(self, input: ContinueAsNewInput) -> NoReturn:
+        # The continued run belongs to the trace of this one
+        input.headers = self._root.headers_with_context(input.headers, self._root.context_carrier())
+
+        super().continue_as_new(input)
@@ -22,39 +22,82 @@
 # SOFTWARE.
 #
 
+import argparse
 import asyncio
+import dataclasses
+import importlib
 import logging
-import os
-from pathlib import Path
-from typing import Optional
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import TYPE_CHECKING, List, Optional
 
-import yaml
-from deepmerge import always_merger
-from kuflow_rest import KuFlowRestClient
-from kuflow_temporal_activity_kuflow import KuFlowActivities
-from kuflow_temporal_worker import (
-    KuFlowConfig,
-    KuFlowTemporalConnection,
-    TemporalClientConfig,
-    TemporalConfig,
-    TemporalWorkerConfig,
-)
+from kuflow_samples_expense_reimbursement.configuration import SamplesConfiguration, load_configuration
+from kuflow_samples_expense_reimbursement.startup import StartupProfile
 
-from kuflow_samples_expense_reimbursement.workflow import SampleWorkflow
 
+if TYPE_CHECKING:
+    from temporalio.runtime import Runtime
+    from temporalio.worker import Interceptor
+
+    from kuflow_samples_expense_reimbursement.codec import CompressionCodec
+    from kuflow_samples_expense_reimbursement.features import WorkflowFeatures
 
-logging.basicConfig(level=logging.INFO)
 
+logging.basicConfig(level=logging.INFO)
 
-async def run_worker():
+# Modules that are deterministic and free of side effects at import time. In the production profile they are imported
+# once, when the worker starts, and shared by all the workflow sandboxes instead of being re-imported by each of them,
+# which makes the workflow cache misses cheaper.
+SANDBOX_PASSTHROUGH_MODULES = [
+    "kuflow_rest",
+    "kuflow_temporal_activity_kuflow",
+    "kuflow_temporal_common",
+    "kuflow_temporal_workflow_kuflow",
+    "kuflow_samples_expense_reimbursement.features",
+    "kuflow_samples_expense_reimbursement.policies",
+    "kuflow_samples_expense_reimbursement.process_items",
+]
+
+
+async def run_worker(
+    configuration: Optional[SamplesConfiguration] = None, *, startup_profile: Optional[StartupProfile] = None
+) -> int:
     """Worker to run your workflow
 
     This example configures a Temporal.io worker with the necessary authentication
     mechanisms for KuFlow (mTLS and token authorization). It also acts as activity
     worker for the set of activities that interact with the KuFlow Api rest.
+
+    The worker runs until SIGTERM or SIGINT, returning the exit code of the process.
     """
 
-    configuration = load_configuration()
+    if configuration is None:
+        configuration = load_configuration()
+
+    # The SDKs and the worker modules are imported here, not by this module, so --help and configuration errors do not
+    # pay for them
+    from kuflow_rest import KuFlowRestClient
+    from kuflow_temporal_activity_kuflow import KuFlowActivities
+    from kuflow_temporal_worker import (
+        KuFlowConfig,
+        TemporalClientConfig,
+        TemporalConfig,
+        TemporalWorkerConfig,
+    )
+
+    from kuflow_samples_expense_reimbursement.connection import SampleTemporalConnection
+    from kuflow_samples_expense_reimbursement.converter import TypedModelPayloadConverter
+    from kuflow_samples_expense_reimbursement.features import set_workflow_features
+    from kuflow_samples_expense_reimbursement.heartbeat import heartbeating_activities
+    from kuflow_samples_expense_reimbursement.shutdown import GracefulShutdown
+    from kuflow_samples_expense_reimbursement.workflow import SampleWorkflow
+
+    if startup_profile is not None:
+        startup_profile.phase("imports")
+
+    # Read by the workflows of the process
+    set_workflow_features(workflow_features(configuration))
 
     # Rest client for the KuFlow API
     # Necessary for the activities that connect to KuFlow, as well as for the
@@ -66,124 +109,200 @@ async def run_worker():
         # allow_insecure_connection=True,  # only for local development
     )
 
-    # Initializing KuFlow Temporal.io activities
+    # Initializing KuFlow Temporal.io activities. They call the blocking KuFlow REST client, so they are wrapped to run
+    # those calls out of the event loop and heartbeat meanwhile. The thread pool is sized like the activity slots, so
+    # no call waits for a thread.
+    kuflow_executor = ThreadPoolExecutor(
+        max_workers=configuration.temporal_worker_max_concurrent_activities or 100, thread_name_prefix="activity"
+    )
     kuflow_activities = KuFlowActivities(kuflow_rest_client)
+    kuflow_activities_heartbeating = heartbeating_activities(kuflow_activities.activities, kuflow_executor)
+
+    # Stops the worker on SIGTERM or SIGINT, letting the running activities finish
+    graceful_shutdown = GracefulShutdown()
 
     # KuFlow Temporal connection
-    kuflow_temporal_connection = KuFlowTemporalConnection(
+    kuflow_temporal_connection = SampleTemporalConnection(
         kuflow=KuFlowConfig(rest_client=kuflow_rest_client),
         temporal=TemporalConfig(
             client=TemporalClientConfig(
                 target_host=configuration.temporal_host,
+                runtime=create_runtime(configuration),
             ),
             worker=TemporalWorkerConfig(
                 task_queue=configuration.temporal_queue,
                 workflows=[SampleWorkflow],
-                activities=kuflow_activities.activities,
+                activities=kuflow_activities_heartbeating,
+                interceptors=[graceful_shutdown, *create_tracing_interceptors(configuration)],
+                **temporal_worker_profile(configuration),
+                **temporal_worker_tuning(configuration),
             ),
         ),
+        payload_converter=TypedModelPayloadConverter(),
+        payload_codec=create_payload_codec(configuration),
     )
 
+    startup_report = None
+    if startup_profile is not None:
+        startup_profile.phase("worker setup")
+        worker = await kuflow_temporal_connection.create_worker()
+        startup_profile.phase("connection")
+        startup_report = asyncio.create_task(startup_profile.report_first_poll(worker))
+
     # Start temporal worker
-    await kuflow_temporal_connection.run_worker()
+    try:
+        return await graceful_shutdown.run_worker(kuflow_temporal_connection)
+    finally:
+        if startup_report is not None:
+            startup_report.cancel()
+        kuflow_executor.shutdown()
 
 
-class SamplesConfiguration:
-    kuflow_api_client_id: str
-    kuflow_api_client_secret: str
-    kuflow_api_endpoint: Optional[str]
+def workflow_features(configuration: SamplesConfiguration) -> "WorkflowFeatures":
+    """Features of the workflow, the options left unset keep their defaults"""
 
-    temporal_host: str
-    temporal_queue: str
+    from kuflow_samples_expense_reimbursement.features import WorkflowFeatures
 
-    def __init__(
-        self,
-        *,
-        kuflow_api_client_id: str,
-        kuflow_api_client_secret: str,
-        kuflow_api_endpoint: Optional[str] = None,
-        temporal_host: Optional[str] = None,
-        temporal_queue: str,
-    ):
-        self.kuflow_api_client_id = kuflow_api_client_id
-        self.kuflow_api_client_secret = kuflow_api_client_secret
-        self.kuflow_api_endpoint = kuflow_api_endpoint
+    features = {
+        "review_continue_as_new_iterations": configuration.review_continue_as_new_iterations,
+        "review_continue_as_new_history_length": configuration.review_continue_as_new_history_length,
+    }
 
-        self.temporal_host = temporal_host
-        self.temporal_queue = temporal_queue
+    return WorkflowFeatures(**{name: value for name, value in features.items() if value is not None})
 
 
-def load_configuration() -> SamplesConfiguration:
-    configuration_base = read_configuration("application.yaml")
-    configuration_local = read_configuration("application-local.yaml")
-    configuration = always_merger.merge(configuration_base, configuration_local)
+def create_runtime(configuration: SamplesConfiguration) -> Optional["Runtime"]:
+    """Temporal runtime exporting the SDK and sample metrics to Prometheus, if ``temporal.metrics.port`` is set"""
 
-    return parse_configuration(configuration)
+    if configuration.temporal_metrics_port is None:
+        return None
 
+    from temporalio.runtime import PrometheusConfig, Runtime, TelemetryConfig
 
-def parse_configuration(configuration) -> SamplesConfiguration:
-    kuflow_api_endpoint = find_configuration_property(configuration, "KUFLOW_API_ENDPOINT", "kuflow.api.endpoint")
-    kuflow_api_client_id = retrieve_configuration_property(configuration, "KUFLOW_API_CLIENTID", "kuflow.api.client-id")
-    kuflow_api_client_secret = retrieve_configuration_property(
-        configuration, "KUFLOW_API_CLIENTSECRET", "kuflow.api.client-secret"
-    )
-    temporal_host = find_configuration_property(configuration, "TEMPORAL_TARGET", "temporal.target")
-    temporal_queue = retrieve_configuration_property(configuration, "TEMPORAL_KUFLOWQUEUE", "temporal.kuflow-queue")
-
-    return SamplesConfiguration(
-        kuflow_api_endpoint=kuflow_api_endpoint,
-        kuflow_api_client_id=kuflow_api_client_id,
-        kuflow_api_client_secret=kuflow_api_client_secret,
-        temporal_host=temporal_host,
-        temporal_queue=temporal_queue,
+    return Runtime(
+        telemetry=TelemetryConfig(
+            metrics=PrometheusConfig(bind_address=f"0.0.0.0:{configuration.temporal_metrics_port}"),
+        )
     )
 
 
-def retrieve_configuration_property(configuration: dict, property_environment_name: str, property_path: str) -> str:
-    value = find_configuration_property(configuration, property_environment_name, property_path)
-    if value is None:
-        raise Exception(f"Property {property_path} not found")
+def create_payload_codec(configuration: SamplesConfiguration) -> "CompressionCodec":
+    """Codec compressing the payloads above ``temporal.payload-compression.threshold`` bytes
 
-    return find_configuration_property_from_conf(configuration, property_path)
+    Without a threshold nothing is compressed, but the payloads compressed while it was set are still decoded.
+    """
 
+    from kuflow_samples_expense_reimbursement.codec import CompressionCodec
 
-def find_configuration_property(
-    configuration: dict, property_environment_name: str, property_path: str
-) -> Optional[str]:
-    if os.environ.get(property_environment_name) is not None:
-        return os.environ[property_environment_name]
+    if configuration.temporal_payload_compression_level is None:
+        return CompressionCodec(threshold=configuration.temporal_payload_compression_threshold)
 
-    return find_configuration_property_from_conf(configuration, property_path)
+    return CompressionCodec(
+        threshold=configuration.temporal_payload_compression_threshold,
+        level=configuration.temporal_payload_compression_level,
+    )
 
 
-def find_configuration_property_from_conf(configuration: dict, property_path: str) -> Optional[str]:
-    property_parts = property_path.split(".", 1)
-    property_name = property_parts[0] if len(property_parts) >= 1 else ""
-    property_path_rest = property_parts[1] if len(property_parts) == 2 else ""
-    value = configuration.get(property_name)
-    if value is None:
-        return None
+def create_tracing_interceptors(configuration: SamplesConfiguration) -> List["Interceptor"]:
+    """OpenTelemetry tracing of the workflows, activities and HTTP calls, if ``tracing.exporter`` is set"""
+
+    if configuration.tracing_exporter is None:
+        return []
 
-    if isinstance(value, dict):
-        return find_configuration_property_from_conf(value, property_path_rest)
+    # OpenTelemetry is an optional dependency, only imported when tracing is enabled
+    from kuflow_samples_expense_reimbursement.tracing import create_tracing_interceptor
 
-    if isinstance(value, str) or isinstance(value, bool) or isinstance(value, int) or isinstance(value, float):
-        return str(value)
+    return [
+        create_tracing_interceptor(
+            service_name="kuflow-samples-expense-reimbursement",
+            exporter=configuration.tracing_exporter,
+            otlp_endpoint=configuration.tracing_otlp_endpoint,
+            file=configuration.tracing_file,
+            sampling_ratio=configuration.tracing_sampling_ratio
+            if configuration.tracing_sampling_ratio is not None
+            else 1.0,
+        )
+    ]
 
-    return None
 
+def temporal_worker_profile(configuration: SamplesConfiguration) -> dict:
+    """Worker options of the profile selected with ``--profile`` or ``temporal.worker.profile``
 
-def read_configuration(file: str) -> dict:
-    configuration_path = Path(__file__).with_name(file)
+    ``development`` (the default) keeps the Temporal defaults. ``production`` disables the debug mode and passes the
+    ``SANDBOX_PASSTHROUGH_MODULES`` through the sandbox, preloading them.
+    """
 
-    if configuration_path.exists() is False:
+    profile = configuration.temporal_worker_profile or "development"
+    if profile == "development":
         return {}
 
-    with open(Path(__file__).with_name(file)) as file:
-        yaml_data = yaml.safe_load(file)
+    if profile == "production":
+        from temporalio.worker.workflow_sandbox import SandboxedWorkflowRunner, SandboxRestrictions
 
-        return dict(yaml_data)
+        for module in SANDBOX_PASSTHROUGH_MODULES:
+            importlib.import_module(module)
+
+        return {
+            "debug_mode": False,
+            "workflow_runner": SandboxedWorkflowRunner(
+                restrictions=SandboxRestrictions.default.with_passthrough_modules(*SANDBOX_PASSTHROUGH_MODULES)
+            ),
+        }
+
+    raise Exception(f"Worker profile {profile} not supported, use development or production")
+
+
+def temporal_worker_tuning(configuration: SamplesConfiguration) -> dict:
+    """Worker options configured by the user, the ones not configured keep the Temporal defaults"""
+
+    tuning = {
+        "max_concurrent_activities": configuration.temporal_worker_max_concurrent_activities,
+        "max_concurrent_local_activities": configuration.temporal_worker_max_concurrent_local_activities,
+        "max_concurrent_workflow_tasks": configuration.temporal_worker_max_concurrent_workflow_tasks,
+        "max_concurrent_activity_task_polls": configuration.temporal_worker_max_concurrent_activity_task_polls,
+        "max_concurrent_workflow_task_polls": configuration.temporal_worker_max_concurrent_workflow_task_polls,
+        "max_cached_workflows": configuration.temporal_worker_max_cached_workflows,
+        "graceful_shutdown_timeout": (
+            timedelta(seconds=configuration.temporal_worker_graceful_shutdown_timeout)
+            if configuration.temporal_worker_graceful_shutdown_timeout is not None
+            else None
+        ),
+    }
+
+    return {option: value for option, value in tuning.items() if value is not None}
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="KuFlow sample worker")
+    parser.add_argument(
+        "--profile",
+        choices=["development", "production"],
+        help="worker profile, overrides temporal.worker.profile",
+    )
+    parser.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="print the time of each startup phase and of the imports once the worker polls for the first time",
+    )
+
+    return parser.parse_args()
+
+
+def apply_arguments(configuration: SamplesConfiguration, arguments: argparse.Namespace) -> SamplesConfiguration:
+    """Configuration overridden by the command line arguments"""
+
+    if arguments.profile is not None:
+        return dataclasses.replace(configuration, temporal_worker_profile=arguments.profile)
+
+    return configuration
 
 
 if __name__ == "__main__":
-    asyncio.run(run_worker())
+    arguments = parse_arguments()
+    startup_profile = StartupProfile().start() if arguments.startup_profile else None
+
+    configuration = apply_arguments(load_configuration(), arguments)
+    if startup_profile is not None:
+        startup_profile.phase("configuration")
+
+    sys.exit(asyncio.run(run_worker(configuration, startup_profile=startup_profile)))
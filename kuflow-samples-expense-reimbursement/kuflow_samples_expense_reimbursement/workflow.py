@@ -22,12 +22,14 @@
 # SOFTWARE.
 #
 
-from datetime import timedelta
-from typing import List
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
 
 from kuflow_temporal_workflow_kuflow import uuid7
 from temporalio import workflow
-from temporalio.common import RetryPolicy
+
+from kuflow_samples_expense_reimbursement.policies import KUFLOW_QUICK_ACTIVITY_POLICY, KUFLOW_UPLOAD_ACTIVITY_POLICY
+from kuflow_samples_expense_reimbursement.process_items import ProcessItemCompletionTracker
 
 
 with workflow.unsafe.imports_passed_through():
@@ -36,6 +38,16 @@ with workflow.unsafe.imports_passed_through():
     from kuflow_temporal_activity_kuflow import models as models_activity
     from kuflow_temporal_workflow_kuflow import models as models_workflow
 
+    from kuflow_samples_expense_reimbursement.features import workflow_features
+
+
+@dataclass
+class ExpenseClaimReview:
+    """State of the REVIEW loop carried across a continue-as-new"""
+
+    previous_task_data: Optional[Dict[str, Any]] = None
+    owner_id: Optional[str] = None
+
 
 @workflow.defn(name="TEST")
 class SampleWorkflow:
@@ -45,29 +57,40 @@ class SampleWorkflow:
     TASK_CODE_APPROVE_CLAIM = "APPROVAL"
     TASK_CODE_PROCESS_REIMBURSEMENT = "PROCESS"
 
-    _KUFLOW_ACTIVITY_RETRY_POLICY = RetryPolicy()
-    _KUFLOW_ACTIVITY_START_TO_CLOSE_TIMEOUT = timedelta(minutes=10)
-    _KUFLOW_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT = timedelta(days=365)
+    # Every REVIEW round trip adds the submit and approve tasks to the history, so once a run reaches the thresholds of
+    # the WorkflowFeatures the loop continues in a new run, carrying its state in the memo of the new run.
+    _MEMO_REVIEW = "review"
+    # Recorded, with the iteration, by the runs that continue as new
+    _PATCH_REVIEW_CONTINUE_AS_NEW = "review-continue-as-new"
+    # Workflows that retrieve the process initiator only once
+    _PATCH_PROCESS_INITIATOR_RETRIEVED_ONCE = "process-initiator-retrieved-once"
 
     def __init__(self) -> None:
-        self._kuflow_completed_task_ids: List[str] = []
+        self._kuflow_process_items = ProcessItemCompletionTracker()
+        self._process_initiator_id: Optional[str] = None
 
     @workflow.signal(name=models_workflow.KUFLOW_ENGINE_SIGNAL_PROCESS_ITEM)
     async def kuflow_engine_signal_process_item(self, signal: models_workflow.SignalProcessItem) -> None:
         if signal.type == models_workflow.SignalProcessItemType.TASK:
-            self._kuflow_completed_task_ids.append(signal.id)
+            self._kuflow_process_items.complete(signal.id)
 
     @workflow.run
     async def run(self, request: models_workflow.WorkflowRequest) -> models_workflow.WorkflowResponse:
         workflow.logger.info(f"Process {request.process_id} started")
 
         # ADAPTATION FROM TEMPLATE
-        process_item_workflow = None
+        review = workflow.memo_value(SampleWorkflow._MEMO_REVIEW, None, type_hint=ExpenseClaimReview)
+        if review is None:
+            review = ExpenseClaimReview()
+        self._process_initiator_id = review.owner_id
+        previous_task_data = review.previous_task_data
+        review_iterations = 0
         needToRegister = False
         while True:
             process_item_workflow = await self.create_process_item_submit__expense__claim(
-                request.process_id, process_item_workflow
+                request.process_id, previous_task_data
             )
+            previous_task_data = process_item_workflow.task.data.value
 
             amount = str(process_item_workflow.task.data.value["AMOUNT"])
 
@@ -83,9 +106,18 @@ class SampleWorkflow:
                 if decision == "REJECTED":
                     needToRegister = False
                     break
-                # Unnecesary, but we keep it for more legibility
-                # if decision == "REVIEW":
-                # continue
+                # decision == "REVIEW", the claim goes back to the submitter
+                review_iterations = review_iterations + 1
+                if self._should_continue_as_new(review_iterations):
+                    workflow.continue_as_new(
+                        request,
+                        memo={
+                            SampleWorkflow._MEMO_REVIEW: ExpenseClaimReview(
+                                previous_task_data=previous_task_data,
+                                owner_id=self._process_initiator_id,
+                            ),
+                        },
+                    )
 
         if needToRegister:
             await self.create_process_item_process__reimbursement(request.process_id)
@@ -93,27 +125,59 @@ class SampleWorkflow:
 
         return models_workflow.WorkflowResponse(f"Completed process {request.process_id}")
 
-    async def create_process_item_submit__expense__claim(self, process_id: str, previous_task):
+    def _should_continue_as_new(self, review_iterations: int) -> bool:
+        patch_id = f"{SampleWorkflow._PATCH_REVIEW_CONTINUE_AS_NEW}-{review_iterations}"
+
+        # The thresholds may have changed since the run was recorded, what it did is in its history
+        if workflow.unsafe.is_replaying():
+            return workflow.patched(patch_id)
+
+        features = workflow_features()
+        workflow_info = workflow.info()
+        continue_as_new = (
+            review_iterations >= features.review_continue_as_new_iterations
+            or workflow_info.get_current_history_length() >= features.review_continue_as_new_history_length
+            or workflow_info.is_continue_as_new_suggested()
+        )
+        if continue_as_new:
+            workflow.patched(patch_id)
+
+        return continue_as_new
+
+    async def _retrieve_process_initiator_id(self, process_id: str) -> str:
+        """Process initiator id, retrieved from KuFlow only once because it does not change during the process
+
+        The workflows started before retrieve it on every submission, and keep doing so when they are replayed.
+        """
+
+        if self._process_initiator_id is None or not workflow.patched(
+            SampleWorkflow._PATCH_PROCESS_INITIATOR_RETRIEVED_ONCE
+        ):
+            process_retrieve_request = models_activity.ProcessRetrieveRequest(process_id=process_id)
+            process_retrieve_response: models_activity.ProcessRetrieveResponse = await workflow.execute_activity(
+                KuFlowActivities.retrieve_process,
+                process_retrieve_request,
+                **KUFLOW_QUICK_ACTIVITY_POLICY.options(),
+            )
+            self._process_initiator_id = process_retrieve_response.process.initiator_id
+
+        return self._process_initiator_id
+
+    async def create_process_item_submit__expense__claim(
+        self, process_id: str, previous_task_data: Optional[Dict[str, Any]]
+    ):
         """Create process item "Submit Expense Claim" in KuFlow and wait for its completion"""
 
         process_item_id = str(uuid7())
 
         # ADAPTATION FROM TEMPLATE
         # We get the process initiator id
-        process_retrieve_request = models_activity.ProcessRetrieveRequest(process_id=process_id)
-        process_retrieve_response: models_activity.ProcessRetrieveResponse = await workflow.execute_activity(
-            KuFlowActivities.retrieve_process,
-            process_retrieve_request,
-            start_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_START_TO_CLOSE_TIMEOUT,
-            schedule_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT,
-            retry_policy=SampleWorkflow._KUFLOW_ACTIVITY_RETRY_POLICY,
-        )
-        owner_id = process_retrieve_response.process.initiator_id
+        owner_id = await self._retrieve_process_initiator_id(process_id)
 
         # We get data from previous task execution
         task = None
-        if previous_task is not None:
-            task = models_rest.ProcessItemTaskCreateParams(data=previous_task.task.data)
+        if previous_task_data is not None:
+            task = models_rest.ProcessItemTaskCreateParams(data=models_rest.JsonValue(value=previous_task_data))
         # END OF ADAPTATION
 
         request = models_activity.ProcessItemCreateRequest(
@@ -125,36 +189,16 @@ class SampleWorkflow:
             task=task,  # ADAPTION FROM TEMPLATE
         )
 
-        # Create process item
-        await workflow.execute_activity(
-            KuFlowActivities.create_process_item,
+        # Create process item and wait for its external completion (outside this workflow, usually in the KuFlow APP
+        # or via Rest Api). Waiting is useful if you are orchestrating asynchronous tasks, e.g. those performed by
+        # humans. In the case of synchronous tasks, i.e. tasks that are completed by this Workflow itself, you should
+        # only create the process item and do not forget to add code to complete the task programmatically.
+        return await self._kuflow_process_items.create_and_wait_completion(
             request,
-            start_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_START_TO_CLOSE_TIMEOUT,
-            schedule_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT,
-            retry_policy=SampleWorkflow._KUFLOW_ACTIVITY_RETRY_POLICY,
+            retrieve=True,  # ADAPTATION FROM TEMPLATE: We need the process item
+            policy=KUFLOW_QUICK_ACTIVITY_POLICY,
         )
 
-        # Wait for its external completion (outside this workflow, usually in the KuFlow APP or via Rest Api)
-        # This line is useful if you are orchestrating asynchronous tasks, e.g. those performed by humans.
-        # In the case of synchronous tasks, i.e. tasks that are completed by this Workflow itself,
-        # you should remove this line and do not forget to add code to complete the task programmatically.
-        await workflow.wait_condition(lambda: process_item_id in self._kuflow_completed_task_ids)
-
-        # ADAPTATION FROM TEMPLATE
-        # We need the process item
-        retrieve_request = models_activity.ProcessItemRetrieveRequest(
-            process_item_id=process_item_id,
-        )
-        retrieve_response: models_activity.ProcessItemRetrieveResponse = await workflow.execute_activity(
-            KuFlowActivities.retrieve_process_item,
-            retrieve_request,
-            start_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_START_TO_CLOSE_TIMEOUT,
-            schedule_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT,
-            retry_policy=SampleWorkflow._KUFLOW_ACTIVITY_RETRY_POLICY,
-        )
-        return retrieve_response.process_item
-        # END OF ADAPTATION
-
     async def create_process_item_approve__claim(self, process_id: str):
         """Create process item "Approve Claim" in KuFlow and wait for its completion"""
 
@@ -167,36 +211,16 @@ class SampleWorkflow:
             process_item_definition_code=SampleWorkflow.TASK_CODE_APPROVE_CLAIM,
         )
 
-        # Create process item
-        await workflow.execute_activity(
-            KuFlowActivities.create_process_item,
+        # Create process item and wait for its external completion (outside this workflow, usually in the KuFlow APP
+        # or via Rest Api). Waiting is useful if you are orchestrating asynchronous tasks, e.g. those performed by
+        # humans. In the case of synchronous tasks, i.e. tasks that are completed by this Workflow itself, you should
+        # only create the process item and do not forget to add code to complete the task programmatically.
+        return await self._kuflow_process_items.create_and_wait_completion(
             request,
-            start_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_START_TO_CLOSE_TIMEOUT,
-            schedule_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT,
-            retry_policy=SampleWorkflow._KUFLOW_ACTIVITY_RETRY_POLICY,
+            retrieve=True,  # ADAPTATION FROM TEMPLATE: We need the process item
+            policy=KUFLOW_QUICK_ACTIVITY_POLICY,
         )
 
-        # Wait for its external completion (outside this workflow, usually in the KuFlow APP or via Rest Api)
-        # This line is useful if you are orchestrating asynchronous tasks, e.g. those performed by humans.
-        # In the case of synchronous tasks, i.e. tasks that are completed by this Workflow itself,
-        # you should remove this line and do not forget to add code to complete the task programmatically.
-        await workflow.wait_condition(lambda: process_item_id in self._kuflow_completed_task_ids)
-
-        # ADAPTATION FROM TEMPLATE
-        # We need the process item
-        retrieve_request = models_activity.ProcessItemRetrieveRequest(
-            process_item_id=process_item_id,
-        )
-        retrieve_response: models_activity.ProcessItemRetrieveResponse = await workflow.execute_activity(
-            KuFlowActivities.retrieve_process_item,
-            retrieve_request,
-            start_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_START_TO_CLOSE_TIMEOUT,
-            schedule_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT,
-            retry_policy=SampleWorkflow._KUFLOW_ACTIVITY_RETRY_POLICY,
-        )
-        return retrieve_response.process_item
-        # END OF ADAPTATION
-
     async def create_process_item_process__reimbursement(self, process_id: str):
         """Create process item "Process Reimbursement" in KuFlow and wait for its completion"""
 
@@ -214,14 +238,11 @@ class SampleWorkflow:
         await workflow.execute_activity(
             KuFlowActivities.create_process_item,
             request,
-            start_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_START_TO_CLOSE_TIMEOUT,
-            schedule_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT,
-            retry_policy=SampleWorkflow._KUFLOW_ACTIVITY_RETRY_POLICY,
+            **KUFLOW_QUICK_ACTIVITY_POLICY.options(),
         )
 
         # ADAPTATION FROM TEMPLATE
-        # This is a task that is completed by this Workflow itself, so no need of this line
-        # await workflow.wait_condition(lambda: process_item_id in self._kuflow_completed_task_ids)
+        # This is a task that is completed by this Workflow itself, so there is no need to wait for its completion,
         # instead we do whatever we need
 
         # We update the task information
@@ -232,9 +253,7 @@ class SampleWorkflow:
         request: models_activity.ProcessItemTaskDataUpdateResponse = await workflow.execute_activity(
             KuFlowActivities.update_process_item_task_data,
             request,
-            start_to_close_timeout=timedelta(days=1),
-            schedule_to_close_timeout=timedelta(days=365),
-            retry_policy=RetryPolicy(maximum_interval=timedelta(seconds=30)),
+            **KUFLOW_UPLOAD_ACTIVITY_POLICY.options(),
         )
 
         # We complete the task
@@ -242,9 +261,7 @@ class SampleWorkflow:
         await workflow.execute_activity(
             KuFlowActivities.complete_process_item_task,
             request,
-            start_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_START_TO_CLOSE_TIMEOUT,
-            schedule_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT,
-            retry_policy=SampleWorkflow._KUFLOW_ACTIVITY_RETRY_POLICY,
+            **KUFLOW_QUICK_ACTIVITY_POLICY.options(),
         )
         # END OF ADAPTATION
 
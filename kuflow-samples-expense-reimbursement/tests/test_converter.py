@@ -0,0 +1,163 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, List
+
+import pytest
+import temporalio.converter
+from kuflow_rest import Model
+from kuflow_rest import models as models_rest
+from kuflow_temporal_activity_kuflow import models as models_activity
+from kuflow_temporal_common import CompositeEncodingPayloadConverter, KuFlowComposableEncodingPayloadConverter
+from kuflow_temporal_workflow_kuflow import models as models_workflow
+
+from kuflow_samples_expense_reimbursement.converter import TypedModelPayloadConverter
+
+
+@dataclass
+class ExpenseClaim:
+    first_name: str
+    amount: float
+    accepted: bool
+
+
+PROCESS_ID = str(uuid.uuid4())
+PROCESS_ITEM_ID = str(uuid.uuid4())
+NOW = datetime(2024, 5, 17, 9, 30, 12, 345000, tzinfo=timezone.utc)
+
+PROCESS_ITEM = models_rest.ProcessItem(
+    id=PROCESS_ITEM_ID,
+    type=models_rest.ProcessItemType.TASK,
+    process_id=PROCESS_ID,
+    owner_id=str(uuid.uuid4()),
+    tenant_id=str(uuid.uuid4()),
+    created_by=str(uuid.uuid4()),
+    created_at=NOW,
+    last_modified_by=str(uuid.uuid4()),
+    last_modified_at=NOW,
+    process_item_definition_ref=models_rest.ProcessItemDefinitionRef(
+        id=str(uuid.uuid4()), version=str(uuid.uuid4()), code="FILL_INFO"
+    ),
+    task=models_rest.ProcessItemTask(
+        state=models_rest.ProcessItemTaskState.COMPLETED,
+        data=models_rest.JsonValue(
+            value={"FIRST_NAME": "Jane", "AMOUNT": "2000", "EXPENSE_TYPE": "TRAVEL", "RECEIPTS": [1, 2.5, None, True]}
+        ),
+    ),
+)
+
+VALUES: List[Any] = [
+    models_workflow.WorkflowRequest(process_id=PROCESS_ID),
+    models_workflow.WorkflowResponse(message=f"Completed process {PROCESS_ID}"),
+    models_workflow.SignalProcessItem(
+        id=PROCESS_ITEM_ID,
+        type=models_workflow.SignalProcessItemType.TASK,
+        payload=models_workflow.SignalProcessItemPayload(
+            task_definition_code="FILL_INFO", data_structure_data_definition_code=None
+        ),
+    ),
+    models_activity.ProcessItemCreateRequest(
+        id=PROCESS_ITEM_ID,
+        type=models_rest.ProcessItemType.TASK,
+        process_id=PROCESS_ID,
+        process_item_definition_code="FILL_INFO",
+    ),
+    models_activity.ProcessItemCreateResponse(process_item=PROCESS_ITEM),
+    models_activity.ProcessItemRetrieveRequest(process_item_id=PROCESS_ITEM_ID),
+    models_activity.ProcessItemRetrieveResponse(process_item=PROCESS_ITEM),
+    models_activity.ProcessRetrieveRequest(process_id=PROCESS_ID),
+    models_activity.ProcessRetrieveResponse(
+        process=models_rest.Process(
+            id=PROCESS_ID,
+            state=models_rest.ProcessState.RUNNING,
+            tenant_id=str(uuid.uuid4()),
+            created_at=NOW,
+            metadata=models_rest.JsonValue(value={"FIRST_NAME": "Jane"}),
+        )
+    ),
+    models_activity.ProcessItemTaskDataUpdateRequest(
+        process_item_id=PROCESS_ITEM_ID, data=models_rest.JsonValue(value={"DECISION": "REVIEW", "COMMENTS": None})
+    ),
+    models_activity.ProcessItemTaskDataUpdateResponse(process_item=PROCESS_ITEM),
+    models_activity.ProcessItemTaskCompleteRequest(process_item_id=PROCESS_ITEM_ID),
+    models_activity.ProcessItemTaskCompleteResponse(process_item=PROCESS_ITEM),
+    ExpenseClaim(first_name="Jane", amount=2000.5, accepted=True),
+    None,
+    b"\x00\x01binary\xff",
+    {"FIRST_NAME": "Jane", "AMOUNT": 2000, "TAGS": ["a", "b"], "APPROVED": False, "NOTES": None},
+    ["TRAVEL", 2000.5, 3, True, None],
+    "Jane",
+    2000,
+    2000.5,
+    True,
+]
+
+
+def payload_converter(*json_converters: temporalio.converter.EncodingPayloadConverter):
+    """Default payload converter of Temporal with these converters tried first for JSON, as the workers register them"""
+
+    return temporalio.converter.CompositePayloadConverter(
+        temporalio.converter.BinaryNullPayloadConverter(),
+        temporalio.converter.BinaryPlainPayloadConverter(),
+        temporalio.converter.JSONProtoPayloadConverter(),
+        temporalio.converter.BinaryProtoPayloadConverter(),
+        CompositeEncodingPayloadConverter(
+            encoding="json/plain", converters=[*json_converters, temporalio.converter.JSONPlainPayloadConverter()]
+        ),
+    )
+
+
+KUFLOW_PAYLOAD_CONVERTER = payload_converter(KuFlowComposableEncodingPayloadConverter())
+TYPED_PAYLOAD_CONVERTER = payload_converter(TypedModelPayloadConverter(), KuFlowComposableEncodingPayloadConverter())
+
+
+@pytest.mark.parametrize("value", VALUES, ids=lambda value: type(value).__name__)
+def test_typed_converter_matches_the_kuflow_converter(value):
+    (kuflow_payload,) = KUFLOW_PAYLOAD_CONVERTER.to_payloads([value])
+    (typed_payload,) = TYPED_PAYLOAD_CONVERTER.to_payloads([value])
+
+    assert typed_payload.SerializeToString(deterministic=True) == kuflow_payload.SerializeToString(deterministic=True)
+
+    # Each converter reads the payloads of the other
+    for payload in (kuflow_payload, typed_payload):
+        (kuflow_value,) = KUFLOW_PAYLOAD_CONVERTER.from_payloads([payload], [type(value)])
+        (typed_value,) = TYPED_PAYLOAD_CONVERTER.from_payloads([payload], [type(value)])
+
+        assert type(typed_value) is type(kuflow_value)
+        assert typed_value == kuflow_value == value
+
+
+@pytest.mark.parametrize(
+    "value", [it for it in VALUES if isinstance(it, Model)], ids=lambda value: type(value).__name__
+)
+def test_the_kuflow_models_are_converted_by_the_typed_converter(value):
+    # Otherwise the comparison above would only compare the KuFlow converter with itself
+    typed_model_payload_converter = TypedModelPayloadConverter()
+
+    payload = typed_model_payload_converter.to_payload(value)
+    assert payload is not None
+    assert typed_model_payload_converter.from_payload(payload, type(value)) == value
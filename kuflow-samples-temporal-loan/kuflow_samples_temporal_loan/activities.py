@@ -22,11 +22,30 @@
 # SOFTWARE.
 #
 
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from datetime import timedelta
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, Tuple
 
-import requests
 from temporalio import activity
 
+from kuflow_samples_temporal_loan.snapshot import RateSnapshot, write_snapshot
+
+
+if TYPE_CHECKING:
+    import requests
+
+
+logger = logging.getLogger(__name__)
+
+CURRENCY_CONVERT_LATENCY_METRIC = "kuflow_currency_convert_latency"
+CONVERSION_TABLE_CACHE_METRIC = "kuflow_currency_conversion_table_cache"
 
 CONVERT_ENDPOINT = "https://cdn.jsdelivr.net/npm/@fawazahmed0/currency-api@latest/v1/currencies"
 
@@ -43,23 +62,259 @@ class ConvertResponse:
     amount: float
 
 
+@dataclass
+class ConversionTableCacheStats:
+    hits: int = 0
+    misses: int = 0
+    # Misses that waited for the fetch already started by another one, instead of starting their own
+    coalesced: int = 0
+    stale_serves: int = 0
+
+
+class ConversionTableCache:
+    """In-process cache of conversion tables keyed by base currency
+
+    Tables expire after ``ttl`` seconds and the least recently used one is evicted once ``max_size`` tables are
+    cached, so a ``max_size`` of 0 disables the cache. Concurrent misses for the same base currency share a single
+    fetch, and if refreshing an expired table fails the stale one is served instead.
+
+    Every lookup is counted in ``stats`` and, when made from an activity, by ``outcome`` in the
+    ``kuflow_currency_conversion_table_cache`` counter of the worker metrics.
+    """
+
+    def __init__(self, *, ttl: Optional[float] = None, max_size: Optional[int] = None):
+        self._ttl = ttl if ttl is not None else 60 * 60
+        self._max_size = max_size if max_size is not None else 32
+        self._entries: OrderedDict[str, Tuple[float, dict]] = OrderedDict()
+        self._fetches: Dict[str, asyncio.Future] = {}
+        self.stats = ConversionTableCacheStats()
+
+    async def get(self, base_currency: str, fetch: Callable[[str], Awaitable[dict]]) -> dict:
+        entry = self._entries.get(base_currency)
+        if entry is not None and time.monotonic() < entry[0]:
+            self._entries.move_to_end(base_currency)
+            self._count("hits")
+            return entry[1]
+
+        fetch_future = self._fetches.get(base_currency)
+        if fetch_future is None:
+            self._count("misses")
+            fetch_future = asyncio.ensure_future(self._refresh(base_currency, fetch))
+            fetch_future.add_done_callback(lambda _: self._fetches.pop(base_currency, None))
+            self._fetches[base_currency] = fetch_future
+        else:
+            self._count("coalesced")
+
+        try:
+            # Shielded, so a cancelled waiter does not cancel the fetch shared with the others
+            return await asyncio.shield(fetch_future)
+        except Exception:
+            if entry is None:
+                raise
+
+            self._count("stale_serves")
+            return entry[1]
+
+    def _count(self, outcome: str) -> None:
+        setattr(self.stats, outcome, getattr(self.stats, outcome) + 1)
+
+        if activity.in_activity():
+            activity.metric_meter().create_counter(
+                CONVERSION_TABLE_CACHE_METRIC, "Lookups of the conversion table cache by outcome"
+            ).add(1, {"outcome": outcome})
+
+    async def _refresh(self, base_currency: str, fetch: Callable[[str], Awaitable[dict]]) -> dict:
+        table = await fetch(base_currency)
+
+        self._entries[base_currency] = (time.monotonic() + self._ttl, table)
+        self._entries.move_to_end(base_currency)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+        return table
+
+
 class CurrencyConversionActivities:
-    def __init__(self):
-        self.activities = [self.convert]
+    """Currency conversion activities, answered from the rate snapshot, the conversion table cache or the endpoint
+
+    The endpoint is called with requests, through a pooled session keeping the connections alive. requests is
+    blocking, so the calls run in a thread pool owned by the activities, with a thread for each of the
+    ``max_concurrent_requests`` calls allowed at a time: they neither block the event loop of the worker nor wait for,
+    or hold, a thread of the default executor of the loop, which other activities and libraries share.
+    """
+
+    def __init__(
+        self,
+        *,
+        endpoint: Optional[str] = None,
+        max_connections: int = 10,
+        max_concurrent_requests: int = 10,
+        connect_timeout: float = 5,
+        read_timeout: float = 10,
+        cache_ttl: Optional[float] = None,
+        cache_max_size: Optional[int] = None,
+        pivot_currency: Optional[str] = None,
+        snapshot_path: Optional[str] = None,
+        snapshot_refresh_interval: Optional[float] = None,
+        snapshot_retry_interval: float = 30,
+    ):
+        self._max_connections = max_connections
+        self._session: Optional["requests.Session"] = None
+        self._session_lock = threading.Lock()
+        self._endpoint = endpoint if endpoint else CONVERT_ENDPOINT
+        self._semaphore = asyncio.Semaphore(max_concurrent_requests)
+        # Its threads are only started by the first calls to the endpoint
+        self._executor = ThreadPoolExecutor(max_concurrent_requests, thread_name_prefix="currency-conversion")
+        self._timeout = (connect_timeout, read_timeout)
+        self._cache = ConversionTableCache(ttl=cache_ttl, max_size=cache_max_size)
+        self._pivot_currency = pivot_currency.lower() if pivot_currency else None
+        self._snapshot_path = snapshot_path
+        self._snapshot_refresh_interval = snapshot_refresh_interval if snapshot_refresh_interval else 24 * 60 * 60
+        self._snapshot_retry_interval = snapshot_retry_interval
+        self._snapshot: Optional[RateSnapshot] = None
+        if snapshot_path is not None and os.path.exists(snapshot_path):
+            self._snapshot = RateSnapshot(snapshot_path)
+
+        self.activities = [self.convert, self.convert_many]
+
+    def close(self) -> None:
+        """Release the HTTP threads, the pooled connections and the rate snapshot"""
+
+        logger.info("Conversion table cache: %s", self._cache.stats)
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._session is not None:
+            self._session.close()
+        if self._snapshot is not None:
+            self._snapshot.close()
+
+    @property
+    def cache_stats(self) -> ConversionTableCacheStats:
+        """Hit, miss, coalesced and stale-serve counters of the conversion table cache"""
+
+        return self._cache.stats
+
+    async def refresh_snapshot(self) -> None:
+        """Download the pivot conversion table and rewrite the rate snapshot with it"""
+
+        pivot_currency = self._pivot_currency or "eur"
+        pivot_table = await self._retrieve_conversion_table(pivot_currency)
+        await asyncio.get_running_loop().run_in_executor(
+            self._executor, write_snapshot, self._snapshot_path, pivot_currency, pivot_table
+        )
+
+        previous_snapshot = self._snapshot
+        self._snapshot = RateSnapshot(self._snapshot_path)
+        if previous_snapshot is not None:
+            previous_snapshot.close()
+
+    async def run_snapshot_refresh(self) -> None:
+        """Keep the rate snapshot up to date in the background, until cancelled
+
+        A failed refresh is retried after ``snapshot_retry_interval`` seconds, doubled on every consecutive failure up
+        to the refresh interval, instead of waiting for the next refresh.
+        """
+
+        retry_interval = self._snapshot_retry_interval
+        while True:
+            snapshot_age = time.time() - self._snapshot.created_at if self._snapshot is not None else None
+            if snapshot_age is None or snapshot_age >= self._snapshot_refresh_interval:
+                try:
+                    await self.refresh_snapshot()
+                except Exception:
+                    logger.exception("Rate snapshot refresh failed, retrying in %.0f s", retry_interval)
+                    await asyncio.sleep(retry_interval)
+                    retry_interval = min(retry_interval * 2, self._snapshot_refresh_interval)
+                    continue
+
+                retry_interval = self._snapshot_retry_interval
+                snapshot_age = 0
+
+            await asyncio.sleep(self._snapshot_refresh_interval - snapshot_age)
 
     @activity.defn(name="Currency_convert")
     async def convert(self, request: ConvertRequest) -> ConvertResponse:
-        # Make a GET request to the API
-        response = requests.get(f"{CONVERT_ENDPOINT}/{request.base_currency}.json")
-
-        # Parse the response JSON
-        data = response.json()
+        started_at = time.perf_counter()
 
         # Get the exchange rate
-        conversion_table = data[request.base_currency]
-        exchange_rate = conversion_table[request.target_currency]
+        try:
+            exchange_rate = await self._retrieve_exchange_rate(request.base_currency, request.target_currency)
+        finally:
+            activity.metric_meter().create_histogram_timedelta(
+                CURRENCY_CONVERT_LATENCY_METRIC, "Latency of the Currency_convert activity", "duration"
+            ).record(timedelta(seconds=time.perf_counter() - started_at))
 
         # Convert
         result = exchange_rate * request.amount
 
         return ConvertResponse(amount=result)
+
+    @activity.defn(name="Currency_convertMany")
+    async def convert_many(self, convert_requests: List[ConvertRequest]) -> List[ConvertResponse]:
+        # Each distinct currency pair is resolved once, so every table involved is fetched at most once
+        currency_pairs = list(dict.fromkeys((it.base_currency, it.target_currency) for it in convert_requests))
+        exchange_rates = await asyncio.gather(*(self._retrieve_exchange_rate(*it) for it in currency_pairs))
+        exchange_rate_by_pair = dict(zip(currency_pairs, exchange_rates))
+
+        # Convert, keeping the order of the requests
+        return [
+            ConvertResponse(amount=exchange_rate_by_pair[(it.base_currency, it.target_currency)] * it.amount)
+            for it in convert_requests
+        ]
+
+    async def _retrieve_exchange_rate(self, base_currency: str, target_currency: str) -> float:
+        if self._snapshot is not None:
+            exchange_rate = self._snapshot.exchange_rate(base_currency, target_currency)
+            if exchange_rate is not None:
+                return exchange_rate
+
+        if self._pivot_currency is None:
+            conversion_table = await self._cache.get(base_currency, self._retrieve_conversion_table)
+            return conversion_table[target_currency]
+
+        # Cross rate derived from the single pivot table: (pivot -> target) / (pivot -> base)
+        pivot_table = await self._cache.get(self._pivot_currency, self._retrieve_conversion_table)
+        return self._pivot_rate(pivot_table, target_currency) / self._pivot_rate(pivot_table, base_currency)
+
+    def _pivot_rate(self, pivot_table: dict, currency: str) -> float:
+        if currency == self._pivot_currency:
+            return 1.0
+
+        return pivot_table[currency]
+
+    async def _retrieve_conversion_table(self, base_currency: str) -> dict:
+        async with self._semaphore:
+            # requests is blocking, so the GET runs in the HTTP threads to keep the worker's event loop free
+            response = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._http_get, f"{self._endpoint}/{base_currency}.json"
+            )
+
+        response.raise_for_status()
+
+        # Parse the response JSON
+        data = response.json()
+
+        return data[base_currency]
+
+    def _http_get(self, url: str) -> "requests.Response":
+        return self._http_session().get(url, timeout=self._timeout)
+
+    def _http_session(self) -> "requests.Session":
+        """Shared HTTP session, so connections to the endpoint are kept alive and reused between conversions
+
+        It is created by the first conversion that calls the endpoint, in its thread, so the worker does not import
+        requests when it starts, nor at all when every conversion is served from the cache or the rate snapshot.
+        """
+
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._max_connections)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+
+            return self._session
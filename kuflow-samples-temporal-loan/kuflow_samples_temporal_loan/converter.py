@@ -0,0 +1,281 @@
+#
+# MIT License
+#
+# Copyright (c) 2022 KuFlow
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import json
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, Optional, Type
+
+import temporalio.converter
+from kuflow_rest import Deserializer, Model, Serializer
+from kuflow_rest import models as models_rest
+from kuflow_temporal_activity_kuflow import models as models_activity
+from kuflow_temporal_common import CompositeEncodingPayloadConverter
+from kuflow_temporal_workflow_kuflow import models as models_workflow
+from temporalio.api.common.v1 import Payload
+
+
+# KuFlow models exchanged by the workflow, with its activities and in its signals
+WORKFLOW_MODELS = [
+    models_workflow.WorkflowRequest,
+    models_workflow.WorkflowResponse,
+    models_workflow.SignalProcessItem,
+    models_activity.ProcessItemCreateRequest,
+    models_activity.ProcessItemCreateResponse,
+    models_activity.ProcessItemRetrieveRequest,
+    models_activity.ProcessItemRetrieveResponse,
+    models_activity.ProcessMetadataPatchRequest,
+    models_activity.ProcessMetadataPatchResponse,
+]
+
+_ENCODING = "json/plain"
+
+Encoder = Callable[[Any], Any]
+Decoder = Callable[[Any], Any]
+
+
+class TypedModelPayloadConverter(temporalio.converter.EncodingPayloadConverter):
+    """JSON payload converter with an encoder and a decoder compiled for each of the given KuFlow models
+
+    The KuFlow converter goes through the generic REST serializer, which looks up every attribute type by name and,
+    before serializing, rebuilds the whole model. The compiled functions convert the attributes directly, and produce
+    the same JSON and the same objects. Other values, and models with attributes of types not compiled, return
+    ``None`` so the next converter of the encoding handles them.
+    """
+
+    def __init__(self, models: Iterable[Type[Model]] = WORKFLOW_MODELS):
+        self._serializer = Serializer(_kuflow_models())
+        self._deserializer = Deserializer(_kuflow_models())
+        self._encoders: Dict[type, Encoder] = {}
+        self._decoders: Dict[type, Decoder] = {}
+
+        for model in models:
+            self._compile(model)
+
+    @property
+    def encoding(self) -> str:
+        return _ENCODING
+
+    def to_payload(self, value: Any) -> Optional[Payload]:
+        encoder = self._encoders.get(type(value))
+        if encoder is None:
+            return None
+
+        return Payload(
+            metadata={"encoding": _ENCODING.encode()},
+            data=json.dumps(encoder(value), separators=(",", ":"), sort_keys=True).encode(),
+        )
+
+    def from_payload(self, payload: Payload, type_hint: Optional[Type] = None) -> Any:
+        decoder = self._decoders.get(type_hint)
+        if decoder is None:
+            return None
+
+        return decoder(json.loads(payload.data))
+
+    def _compile(self, model: Type[Model]) -> bool:
+        """Compile the encoder and decoder of the model and of the models it contains, if all its types are known"""
+
+        if model in self._encoders:
+            return True
+        if getattr(model, "_subtype_map", None):
+            return False
+
+        readonly = {name for name, rules in model._validation.items() if rules.get("readonly")}
+        fields = []
+        for name, description in model._attribute_map.items():
+            # Flattened and additional properties keys need the generic serializer
+            if not description["key"] or "." in description["key"]:
+                return False
+
+            encoder, decoder = self._compile_type(description["type"])
+            if encoder is None:
+                return False
+            fields.append((name, description["key"], name in readonly, encoder, decoder))
+
+        self._encoders[model] = _model_encoder(model, fields, self._serializer)
+        self._decoders[model] = _model_decoder(model, fields)
+
+        return True
+
+    def _compile_type(self, data_type: str):
+        if data_type in _BASIC_TYPES:
+            python_type = _BASIC_TYPES[data_type]
+            return _basic_encoder(python_type, self._serializer, data_type), _basic_decoder(
+                python_type, self._deserializer, data_type
+            )
+        if data_type == "object" or data_type == "{object}":
+            return self._encode_object, _identity
+        if data_type == "iso-8601":
+            return Serializer.serialize_iso, Deserializer.deserialize_iso
+
+        if data_type.startswith("[") and data_type.endswith("]"):
+            item_encoder, item_decoder = self._compile_type(data_type[1:-1])
+            if item_encoder is None:
+                return None, None
+            return _list_encoder(item_encoder), _list_decoder(item_decoder)
+        if data_type.startswith("{") and data_type.endswith("}"):
+            item_encoder, item_decoder = self._compile_type(data_type[1:-1])
+            if item_encoder is None:
+                return None, None
+            return _dict_encoder(item_encoder), _dict_decoder(item_decoder)
+
+        dependency = self._serializer.dependencies.get(data_type)
+        if isinstance(dependency, type) and issubclass(dependency, Enum):
+            return (
+                lambda value: Serializer.serialize_enum(value, enum_obj=dependency),
+                lambda value: Deserializer.deserialize_enum(value, dependency),
+            )
+        if isinstance(dependency, type) and issubclass(dependency, Model) and self._compile(dependency):
+            # Bound lazily, the encoders of recursive models are not compiled yet
+            return (
+                lambda value: self._encoders[dependency](value),
+                lambda value: self._decoders[dependency](value),
+            )
+
+        return None, None
+
+    def _encode_object(self, value: Any) -> Any:
+        # Task data is plain JSON nearly always, anything else gets the conversions of the generic serializer
+        value_type = type(value)
+        if value_type is str or value_type is int or value_type is float or value_type is bool or value is None:
+            return value
+        if value_type is dict:
+            return {str(key): self._encode_object(item) for key, item in value.items()}
+        if value_type is list:
+            return [self._encode_object(item) for item in value]
+
+        return self._serializer.serialize_object(value)
+
+
+def register_payload_converter(converter: temporalio.converter.EncodingPayloadConverter) -> None:
+    """Put the converter first for its encoding in the default payload converters
+
+    Done once ``KuFlowTemporalConnection`` has registered its own converter, in the same way, so the data converters
+    created afterwards try this one before the KuFlow one.
+    """
+
+    converters = temporalio.converter.DefaultPayloadConverter.default_encoding_payload_converters
+    # Already first, each KuFlow connection puts its converter first when it connects
+    if any(isinstance(it, CompositeEncodingPayloadConverter) and it.converters[0] is converter for it in converters):
+        return
+
+    temporalio.converter.DefaultPayloadConverter.default_encoding_payload_converters = tuple(
+        CompositeEncodingPayloadConverter(encoding=it.encoding, converters=[converter, it])
+        if it.encoding == converter.encoding
+        else it
+        for it in converters
+    )
+
+
+_BASIC_TYPES = {"str": str, "int": int, "float": float, "bool": bool}
+
+
+def _kuflow_models() -> Dict[str, type]:
+    return {
+        name: value
+        for module in (models_rest, models_activity, models_workflow)
+        for name, value in module.__dict__.items()
+        if isinstance(value, type)
+    }
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _basic_encoder(python_type: type, serializer: Serializer, data_type: str) -> Encoder:
+    def encode(value: Any) -> Any:
+        if type(value) is python_type:
+            return value
+        return serializer.serialize_data(value, data_type)
+
+    return encode
+
+
+def _basic_decoder(python_type: type, deserializer: Deserializer, data_type: str) -> Decoder:
+    def decode(value: Any) -> Any:
+        if type(value) is python_type:
+            return value
+        return deserializer.deserialize_data(value, data_type)
+
+    return decode
+
+
+def _list_encoder(item_encoder: Encoder) -> Encoder:
+    return lambda value: [None if item is None else item_encoder(item) for item in value]
+
+
+def _list_decoder(item_decoder: Decoder) -> Decoder:
+    return lambda value: [None if item is None else item_decoder(item) for item in value]
+
+
+def _dict_encoder(item_encoder: Encoder) -> Encoder:
+    return lambda value: {key: None if item is None else item_encoder(item) for key, item in value.items()}
+
+
+def _dict_decoder(item_decoder: Decoder) -> Decoder:
+    return lambda value: {key: None if item is None else item_decoder(item) for key, item in value.items()}
+
+
+def _model_encoder(model: Type[Model], fields, serializer: Serializer) -> Encoder:
+    # Read-only attributes are not serialized
+    encoded_fields = [(name, key, encoder) for name, key, readonly, encoder, _ in fields if not readonly]
+
+    def encode(value: Any) -> Dict[str, Any]:
+        # A dict given where a model was expected is converted by the generic serializer, as the KuFlow converter does
+        if type(value) is not model:
+            return serializer.body(value, model.__name__)
+
+        attributes = value.__dict__
+        encoded = {}
+        for name, key, encoder in encoded_fields:
+            attribute = attributes.get(name)
+            if attribute is not None:
+                encoded[key] = encoder(attribute)
+
+        return encoded
+
+    return encode
+
+
+def _model_decoder(model: Type[Model], fields) -> Decoder:
+    decoded_fields = [(name, key, decoder) for name, key, _, _, decoder in fields]
+    known_keys = {key for _, key, _ in decoded_fields}
+
+    def decode(data: Dict[str, Any]) -> Model:
+        # Same attributes the generic deserializer sets through the model constructor, without running it
+        attributes: Dict[str, Any] = {"additional_properties": {}}
+        for name, key, decoder in decoded_fields:
+            raw = data.get(key)
+            attributes[name] = None if raw is None else decoder(raw)
+
+        if len(data) > len(known_keys) or not known_keys.issuperset(data):
+            attributes["additional_properties"] = {key: data[key] for key in data.keys() - known_keys}
+
+        instance = model.__new__(model)
+        instance.__dict__.update(attributes)
+
+        return instance
+
+    return decode
@@ -0,0 +1,50 @@
+#
+# MIT License
+#
+# Copyright (c) 2022 KuFlow
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class WorkflowFeatures:
+    """Optional behaviours of the sample workflow, set by the worker from its configuration
+
+    The workflow imports this module passed through the sandbox, so every workflow run of the process sees the
+    features the worker set. A feature that changes the commands of the workflow is gated with ``workflow.patched``,
+    so the workflows keep replaying when it is switched on or off.
+    """
+
+    # Convert the currency with a local activity instead of scheduling it on the task queue
+    currency_conversion_local_activity: bool = False
+
+
+_workflow_features = WorkflowFeatures()
+
+
+def set_workflow_features(features: WorkflowFeatures) -> None:
+    global _workflow_features
+    _workflow_features = features
+
+
+def workflow_features() -> WorkflowFeatures:
+    return _workflow_features
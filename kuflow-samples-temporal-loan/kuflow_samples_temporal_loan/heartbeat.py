@@ -0,0 +1,85 @@
+#
+# MIT License
+#
+# Copyright (c) 2022 KuFlow
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import Executor
+from datetime import timedelta
+from typing import Any, Callable, List, Sequence
+
+import temporalio.activity
+from kuflow_temporal_common import auto_heartbeater
+from temporalio import activity
+
+
+KUFLOW_REST_CALL_LATENCY_METRIC = "kuflow_rest_call_latency"
+
+
+# Event loop of each thread of the executors running the KuFlow activities, created by its first call
+_thread_event_loops = threading.local()
+
+
+def heartbeating_activities(activities: Sequence[Callable], executor: Executor) -> List[Callable]:
+    """Wrap the KuFlow activities so they heartbeat while their REST call runs
+
+    The KuFlow activities are coroutines that call the blocking KuFlow REST client, so while a call is in flight the
+    event loop of the worker can neither heartbeat nor run any other task. The wrappers, registered with the same
+    activity names, run each call in a thread of ``executor`` and, when the workflow sets a heartbeat timeout (see
+    ``policies``), heartbeat meanwhile. Give the executor a thread per activity slot, so no call waits for a thread.
+    When the activity is cancelled the wrapper returns at once, leaving the call to finish in its thread. The latency
+    of the calls is recorded in the ``kuflow_rest_call_latency`` histogram.
+    """
+
+    return [_heartbeating_activity(fn, executor) for fn in activities]
+
+
+def _heartbeating_activity(fn: Callable, executor: Executor) -> Callable:
+    name = temporalio.activity._Definition.must_from_callable(fn).name
+
+    # The activity definition of the wrapped function must not be copied to the wrapper
+    @functools.wraps(fn, updated=())
+    async def run_in_thread(*args: Any) -> Any:
+        started_at = time.perf_counter()
+        try:
+            # In the activity context, so the call can still read the activity info
+            context = contextvars.copy_context()
+            return await asyncio.get_running_loop().run_in_executor(executor, context.run, _run_in_thread, fn, args)
+        finally:
+            activity.metric_meter().create_histogram_timedelta(
+                KUFLOW_REST_CALL_LATENCY_METRIC, "Latency of the KuFlow REST calls", "duration"
+            ).record(timedelta(seconds=time.perf_counter() - started_at))
+
+    return activity.defn(name=name)(auto_heartbeater(run_in_thread))
+
+
+def _run_in_thread(fn: Callable, args: Sequence[Any]) -> Any:
+    # Reused by the next calls of the thread, instead of creating and closing an event loop per call
+    event_loop = getattr(_thread_event_loops, "event_loop", None)
+    if event_loop is None:
+        event_loop = _thread_event_loops.event_loop = asyncio.new_event_loop()
+
+    return event_loop.run_until_complete(fn(*args))
@@ -0,0 +1,137 @@
+#
+# MIT License
+#
+# Copyright (c) 2022 KuFlow
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import argparse
+import asyncio
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Optional
+
+
+# Layout: header, sorted currency codes (fixed width, NUL padded) and a dense row-major matrix where the cell
+# (base, target) holds the rate to convert from base to target.
+_MAGIC = b"KFRATES1"
+_HEADER = struct.Struct("<8sId")
+_CODE_SIZE = 16
+_RATE = struct.Struct("<d")
+
+
+class RateSnapshot:
+    """Read-only, memory-mapped view of a rate snapshot file"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, size, created_at = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC:
+            self._mmap.close()
+            raise ValueError(f"File {path} is not a rate snapshot")
+
+        codes_offset = _HEADER.size
+        self._codes = [
+            self._mmap[codes_offset + index * _CODE_SIZE : codes_offset + (index + 1) * _CODE_SIZE]
+            .rstrip(b"\0")
+            .decode("ascii")
+            for index in range(size)
+        ]
+        self._rates_offset = codes_offset + size * _CODE_SIZE
+        self.created_at = created_at
+
+    def exchange_rate(self, base_currency: str, target_currency: str) -> Optional[float]:
+        base_index = self._index(base_currency)
+        target_index = self._index(target_currency)
+        if base_index is None or target_index is None:
+            return None
+
+        offset = self._rates_offset + (base_index * len(self._codes) + target_index) * _RATE.size
+        return _RATE.unpack_from(self._mmap, offset)[0]
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def _index(self, currency: str) -> Optional[int]:
+        index = bisect_left(self._codes, currency)
+        if index < len(self._codes) and self._codes[index] == currency:
+            return index
+
+        return None
+
+
+def write_snapshot(path: str, pivot_currency: str, pivot_table: Dict[str, float]) -> None:
+    """Write a rate snapshot derived from the conversion table of the pivot currency"""
+
+    pivot_rates = {
+        currency: float(rate)
+        for currency, rate in pivot_table.items()
+        if rate and currency.isascii() and len(currency) <= _CODE_SIZE
+    }
+    pivot_rates[pivot_currency] = 1.0
+
+    codes = sorted(pivot_rates)
+    rates = array("d", (pivot_rates[target] / pivot_rates[base] for base in codes for target in codes))
+
+    # Written next to the destination and moved over it, so readers never see a partial file. The temporary name is
+    # unique per process, because several worker processes may refresh the same snapshot.
+    temporary_path = Path(f"{path}.{os.getpid()}.tmp")
+    with open(temporary_path, "wb") as file:
+        file.write(_HEADER.pack(_MAGIC, len(codes), time.time()))
+        for code in codes:
+            file.write(code.encode("ascii").ljust(_CODE_SIZE, b"\0"))
+        if sys.byteorder != "little":
+            rates.byteswap()
+        file.write(rates.tobytes())
+
+    os.replace(temporary_path, path)
+
+
+def main():
+    """Build the rate snapshot used by the loan worker when it runs without access to the currency endpoint"""
+
+    parser = argparse.ArgumentParser(description="Build the currency rate snapshot of the loan worker")
+    parser.add_argument("--output", required=True, help="Path of the snapshot file to write")
+    parser.add_argument("--pivot", default="eur", help="Currency whose conversion table is downloaded")
+    arguments = parser.parse_args()
+
+    # Imported here because the activities module itself depends on this one
+    from kuflow_samples_temporal_loan.activities import CurrencyConversionActivities
+
+    currency_conversion_activities = CurrencyConversionActivities(
+        pivot_currency=arguments.pivot,
+        snapshot_path=arguments.output,
+    )
+    try:
+        asyncio.run(currency_conversion_activities.refresh_snapshot())
+    finally:
+        currency_conversion_activities.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#
+# MIT License
+#
+# Copyright (c) 2022 KuFlow
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import asyncio
+import builtins
+import importlib.util
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Any, List, Optional, TextIO, Tuple
+
+
+if TYPE_CHECKING:
+    from temporalio.worker import Worker
+
+
+class StartupProfile:
+    """Startup time of a worker process, printed once the worker polls its task queue for the first time
+
+    The report has the time of each startup phase and, like ``python -X importtime``, the self and cumulative time of
+    the modules imported meanwhile by the main thread. Only the imports taking at least ``min_import_time`` seconds are
+    listed, the time of the others is part of the module importing them.
+    """
+
+    def __init__(self, *, min_import_time: float = 0.002):
+        self._min_import_time = min_import_time
+        self._started = time.perf_counter()
+        self._phases: List[Tuple[str, float]] = []
+        # Module name, self time, cumulative time and nesting level of each import, in the order they finished
+        self._imports: List[Tuple[str, float, float, int]] = []
+        self._import_stack: List[float] = []
+        self._import: Optional[Any] = None
+
+    def start(self) -> "StartupProfile":
+        """Time the imports from now on"""
+
+        self._started = time.perf_counter()
+        self._import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+        return self
+
+    def stop(self) -> None:
+        """Stop timing the imports"""
+
+        if self._import is not None and builtins.__import__ == self._timed_import:
+            builtins.__import__ = self._import
+
+    def phase(self, name: str) -> None:
+        """End the startup phase ``name``, which began when the previous one ended"""
+
+        self._phases.append((name, time.perf_counter()))
+
+    async def report_first_poll(self, worker: "Worker", file: TextIO = sys.stderr) -> None:
+        """Wait for the worker to start polling and print the report"""
+
+        while not worker.is_running:
+            await asyncio.sleep(0.001)
+
+        # The pollers are started by the worker and send their first poll on the next iteration of the event loop
+        await asyncio.sleep(0)
+
+        self.phase("first poll")
+        self.stop()
+        self.report(file)
+
+    def report(self, file: TextIO = sys.stderr) -> None:
+        print("import time: self [us] | cumulative | imported package", file=file)
+        for module, self_time, cumulative_time, level in self._imports:
+            if cumulative_time >= self._min_import_time:
+                print(
+                    f"import time: {self_time * 1_000_000:9.0f} | {cumulative_time * 1_000_000:10.0f} | "
+                    f"{'  ' * level}{module}",
+                    file=file,
+                )
+
+        import_time = sum(cumulative_time for _, _, cumulative_time, level in self._imports if level == 0)
+        print(f"startup: {len(self._imports)} modules imported in {import_time * 1000:.0f} ms", file=file)
+
+        phase_started = self._started
+        for name, phase_ended in self._phases:
+            print(
+                f"startup: {name} {(phase_ended - phase_started) * 1000:.0f} ms, "
+                f"{(phase_ended - self._started) * 1000:.0f} ms since start",
+                file=file,
+            )
+            phase_started = phase_ended
+
+    def _timed_import(self, name: str, globals=None, locals=None, fromlist=(), level=0):
+        module = name
+        if level > 0:
+            package = globals.get("__package__") if globals else None
+            try:
+                module = importlib.util.resolve_name("." * level + name, package)
+            except (ImportError, ValueError):
+                return self._import(name, globals, locals, fromlist, level)
+
+        if module in sys.modules or threading.current_thread() is not threading.main_thread():
+            return self._import(name, globals, locals, fromlist, level)
+
+        self._import_stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            cumulative_time = time.perf_counter() - started
+            children_time = self._import_stack.pop()
+            if self._import_stack:
+                self._import_stack[-1] += cumulative_time
+            self._imports.append((module, cumulative_time - children_time, cumulative_time, len(self._import_stack)))
@@ -0,0 +1,178 @@
+#
+# MIT License
+#
+# Copyright (c) 2022 KuFlow
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import asyncio
+import dataclasses
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from multiprocessing.connection import wait
+from typing import Callable, List, Optional
+
+from kuflow_samples_temporal_loan.configuration import SamplesConfiguration, load_configuration
+from kuflow_samples_temporal_loan.startup import StartupProfile
+from kuflow_samples_temporal_loan.worker import apply_arguments, parse_arguments, run_worker
+
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerSupervisor:
+    """Runs several worker processes on the same task queue
+
+    Workflow tasks are CPU bound (sandboxing and payload conversion), so a single asyncio process only uses one core.
+    The supervisor starts ``processes`` workers sharing the configuration loaded once by the parent, restarts the ones
+    that crash with an exponential backoff and, on SIGTERM or SIGINT, forwards SIGTERM to all of them and waits for
+    them to drain. The workers still running a few seconds after their graceful shutdown timeout are killed. With
+    ``startup_profile`` every worker process prints its startup profile once it polls.
+
+    Every worker process calls ``worker_process`` with the configuration, its slot and ``startup_profile``, by default
+    the one running ``run_worker``. The processes are spawned, so it must be a function defined at module level.
+    """
+
+    _RESTART_BACKOFF_SLEEP = 1
+    _RESTART_BACKOFF_MAX_SLEEP = 60
+    _RESTART_BACKOFF_EXPONENTIAL_RATE = 2
+    # A process running longer than this is considered healthy again, resetting its backoff
+    _HEALTHY_UPTIME = 60
+    # Seconds a worker process is given, on top of its graceful shutdown timeout, to exit before it is killed
+    _STOP_GRACE = 10
+
+    def __init__(
+        self,
+        configuration: SamplesConfiguration,
+        processes: Optional[int] = None,
+        *,
+        startup_profile: bool = False,
+        worker_process: Optional[Callable[[SamplesConfiguration, int, bool], None]] = None,
+    ):
+        self._configuration = configuration
+        self._startup_profile = startup_profile
+        self._worker_process = worker_process or _run_worker_process
+        self._processes_count = processes if processes else os.cpu_count() or 1
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * self._processes_count
+        self._started_at: List[float] = [0.0] * self._processes_count
+        self._restart_at: List[float] = [0.0] * self._processes_count
+        self._consecutive_failures: List[int] = [0] * self._processes_count
+        self._stopping = False
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        logger.info(f"Starting {self._processes_count} worker processes")
+
+        while not self._stopping:
+            self._supervise()
+
+            sentinels = [process.sentinel for process in self._processes if process is not None]
+            wait(sentinels, timeout=1)
+
+        self._stop()
+
+    def _supervise(self) -> None:
+        now = time.monotonic()
+        for slot, process in enumerate(self._processes):
+            if process is not None and process.is_alive():
+                continue
+
+            if process is not None:
+                self._processes[slot] = None
+                self._schedule_restart(slot, process.exitcode, now)
+
+            if now >= self._restart_at[slot]:
+                self._start(slot)
+
+    def _schedule_restart(self, slot: int, exitcode: Optional[int], now: float) -> None:
+        if now - self._started_at[slot] >= WorkerSupervisor._HEALTHY_UPTIME:
+            self._consecutive_failures[slot] = 0
+
+        self._consecutive_failures[slot] = self._consecutive_failures[slot] + 1
+        restart_in_seconds = min(
+            WorkerSupervisor._RESTART_BACKOFF_SLEEP
+            * WorkerSupervisor._RESTART_BACKOFF_EXPONENTIAL_RATE ** (self._consecutive_failures[slot] - 1),
+            WorkerSupervisor._RESTART_BACKOFF_MAX_SLEEP,
+        )
+        self._restart_at[slot] = now + restart_in_seconds
+
+        logger.warning(f"Worker process {slot} exited with code {exitcode}. Restarting in {restart_in_seconds} seconds")
+
+    def _start(self, slot: int) -> None:
+        process = self._context.Process(
+            target=self._worker_process,
+            args=(self._configuration, slot, self._startup_profile),
+            name=f"worker-{slot}",
+            daemon=False,
+        )
+        process.start()
+
+        self._processes[slot] = process
+        self._started_at[slot] = time.monotonic()
+
+    def _request_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    def _stop(self) -> None:
+        processes = [process for process in self._processes if process is not None and process.is_alive()]
+
+        logger.info(f"Stopping {len(processes)} worker processes")
+
+        for process in processes:
+            process.terminate()
+
+        graceful_shutdown_timeout = self._configuration.temporal_worker_graceful_shutdown_timeout or 0
+        deadline = time.monotonic() + graceful_shutdown_timeout + WorkerSupervisor._STOP_GRACE
+        for process in processes:
+            process.join(max(deadline - time.monotonic(), 0))
+
+        for process in processes:
+            if process.is_alive():
+                logger.warning(f"Worker process {process.name} did not stop in time, killing it")
+                process.kill()
+                process.join()
+
+
+def _run_worker_process(configuration: SamplesConfiguration, slot: int, startup_profile: bool) -> None:
+    # Every process exports its metrics on its own port, counting from the configured one
+    if configuration.temporal_metrics_port is not None:
+        configuration = dataclasses.replace(
+            configuration, temporal_metrics_port=configuration.temporal_metrics_port + slot
+        )
+
+    # The worker drains itself on SIGTERM, sent by the supervisor, or on SIGINT, sent by a Ctrl+C to the whole group
+    worker_startup_profile = StartupProfile().start() if startup_profile else None
+    sys.exit(asyncio.run(run_worker(configuration, startup_profile=worker_startup_profile)))
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    configuration = apply_arguments(load_configuration(), arguments)
+
+    WorkerSupervisor(
+        configuration, configuration.temporal_worker_processes, startup_profile=arguments.startup_profile
+    ).run()
@@ -22,40 +22,81 @@
 # SOFTWARE.
 #
 
+import argparse
 import asyncio
+import dataclasses
+import importlib
 import logging
-import os
-from pathlib import Path
-from typing import Optional
-
-import yaml
-from deepmerge import always_merger
-from kuflow_rest import KuFlowRestClient
-from kuflow_temporal_activity_kuflow import KuFlowActivities
-from kuflow_temporal_worker import (
-    KuFlowConfig,
-    KuFlowTemporalConnection,
-    TemporalClientConfig,
-    TemporalConfig,
-    TemporalWorkerConfig,
-)
-
-from kuflow_samples_temporal_loan.activities import CurrencyConversionActivities
-from kuflow_samples_temporal_loan.workflow import SampleWorkflow
+import sys
+from concurrent.futures import Executor, ThreadPoolExecutor
+from datetime import timedelta
+from typing import TYPE_CHECKING, List, Optional
 
+from kuflow_samples_temporal_loan.configuration import SamplesConfiguration, load_configuration
+from kuflow_samples_temporal_loan.startup import StartupProfile
 
-logging.basicConfig(level=logging.INFO)
 
+if TYPE_CHECKING:
+    from temporalio.runtime import Runtime
+    from temporalio.worker import Interceptor
+
+    from kuflow_samples_temporal_loan.codec import CompressionCodec
 
-async def run_worker():
+
+logging.basicConfig(level=logging.INFO)
+
+# Modules that are deterministic and free of side effects at import time. In the production profile they are imported
+# once, when the worker starts, and shared by all the workflow sandboxes instead of being re-imported by each of them,
+# which makes the workflow cache misses cheaper.
+SANDBOX_PASSTHROUGH_MODULES = [
+    "kuflow_rest",
+    "kuflow_temporal_activity_kuflow",
+    "kuflow_temporal_common",
+    "kuflow_temporal_workflow_kuflow",
+    "kuflow_samples_temporal_loan.activities",
+    "kuflow_samples_temporal_loan.features",
+    "kuflow_samples_temporal_loan.orchestration",
+    "kuflow_samples_temporal_loan.policies",
+    "kuflow_samples_temporal_loan.process_items",
+]
+
+
+async def run_worker(
+    configuration: Optional[SamplesConfiguration] = None, *, startup_profile: Optional[StartupProfile] = None
+) -> int:
     """Worker to run your workflow
 
     This example configures a Temporal.io worker with the necessary authentication
     mechanisms for KuFlow (mTLS and token authorization). It also acts as activity
     worker for the set of activities that interact with the KuFlow Api rest.
+
+    The worker runs until SIGTERM or SIGINT, returning the exit code of the process.
     """
 
-    configuration = load_configuration()
+    if configuration is None:
+        configuration = load_configuration()
+
+    # The SDKs and the worker modules are imported here, not by this module, so the supervisor process, --help and
+    # configuration errors do not pay for them
+    from kuflow_rest import KuFlowRestClient
+    from kuflow_temporal_activity_kuflow import KuFlowActivities
+    from kuflow_temporal_worker import (
+        KuFlowConfig,
+        TemporalClientConfig,
+        TemporalConfig,
+        TemporalWorkerConfig,
+    )
+
+    from kuflow_samples_temporal_loan.activities import CurrencyConversionActivities
+    from kuflow_samples_temporal_loan.connection import SampleTemporalConnection
+    from kuflow_samples_temporal_loan.converter import TypedModelPayloadConverter
+    from kuflow_samples_temporal_loan.features import WorkflowFeatures, set_workflow_features
+    from kuflow_samples_temporal_loan.heartbeat import heartbeating_activities
+    from kuflow_samples_temporal_loan.shutdown import GracefulShutdown
+    from kuflow_samples_temporal_loan.workflow import SampleWorkflow
+
+    if startup_profile is not None:
+        startup_profile.phase("imports")
 
     # Rest client for the KuFlow API
     # Necessary for the activities that connect to KuFlow, as well as for the
@@ -67,124 +108,264 @@ async def run_worker():
         allow_insecure_connection=True,
     )
 
-    # Initializing KuFlow Temporal.io activities
+    # Executor for blocking activities, those defined with "def" instead of "async def". Temporal runs them in it,
+    # outside the event loop.
+    activity_executor = create_activity_executor(configuration)
+    # The KuFlow REST calls need threads, so a process pool gets a thread pool alongside for them
+    kuflow_executor = (
+        activity_executor
+        if isinstance(activity_executor, ThreadPoolExecutor)
+        else create_activity_thread_pool(configuration)
+    )
+
+    # Initializing KuFlow Temporal.io activities. They call the blocking KuFlow REST client, so they are wrapped to run
+    # those calls out of the event loop and heartbeat meanwhile.
     kuflow_activities = KuFlowActivities(kuflow_rest_client)
+    kuflow_activities_heartbeating = heartbeating_activities(kuflow_activities.activities, kuflow_executor)
 
     # Initializing custom activities
-    currency_conversion_activities = CurrencyConversionActivities()
+    currency_conversion_activities = CurrencyConversionActivities(
+        cache_ttl=configuration.currency_cache_ttl,
+        cache_max_size=configuration.currency_cache_max_size,
+        pivot_currency=configuration.currency_pivot,
+        snapshot_path=configuration.currency_snapshot_path,
+        snapshot_refresh_interval=configuration.currency_snapshot_refresh_interval,
+    )
+
+    # Optional behaviours of the workflow
+    set_workflow_features(
+        WorkflowFeatures(
+            currency_conversion_local_activity=bool(configuration.currency_conversion_local_activity),
+        )
+    )
 
     # Activities for the worker
-    activities = kuflow_activities.activities + currency_conversion_activities.activities
+    activities = kuflow_activities_heartbeating + currency_conversion_activities.activities
+
+    shared_state_manager = None
+    if configuration.temporal_worker_activity_executor == "process":
+        import multiprocessing
+
+        from temporalio.worker import SharedStateManager
+
+        shared_state_manager = SharedStateManager.create_from_multiprocessing(multiprocessing.Manager())
+
+    # Stops the worker on SIGTERM or SIGINT, letting the running activities finish
+    graceful_shutdown = GracefulShutdown()
 
     # KuFlow Temporal connection
-    kuflow_temporal_connection = KuFlowTemporalConnection(
+    kuflow_temporal_connection = SampleTemporalConnection(
         kuflow=KuFlowConfig(rest_client=kuflow_rest_client),
         temporal=TemporalConfig(
             client=TemporalClientConfig(
                 target_host=configuration.temporal_host,
+                runtime=create_runtime(configuration),
             ),
             worker=TemporalWorkerConfig(
                 task_queue=configuration.temporal_queue,
                 workflows=[SampleWorkflow],
                 activities=activities,
-                debug_mode=True,
+                activity_executor=activity_executor,
+                shared_state_manager=shared_state_manager,
+                interceptors=[graceful_shutdown, *create_tracing_interceptors(configuration)],
+                **temporal_worker_profile(configuration),
+                **temporal_worker_tuning(configuration),
             ),
         ),
+        payload_converter=TypedModelPayloadConverter(),
+        payload_codec=create_payload_codec(configuration),
     )
 
+    # Keep the offline rate snapshot fresh while the worker runs
+    snapshot_refresh = None
+    if configuration.currency_snapshot_path is not None:
+        snapshot_refresh = asyncio.create_task(currency_conversion_activities.run_snapshot_refresh())
+
+    startup_report = None
+    if startup_profile is not None:
+        startup_profile.phase("worker setup")
+        worker = await kuflow_temporal_connection.create_worker()
+        startup_profile.phase("connection")
+        startup_report = asyncio.create_task(startup_profile.report_first_poll(worker))
+
     # Start temporal worker
-    await kuflow_temporal_connection.run_worker()
+    try:
+        return await graceful_shutdown.run_worker(kuflow_temporal_connection)
+    finally:
+        if startup_report is not None:
+            startup_report.cancel()
+        if snapshot_refresh is not None:
+            snapshot_refresh.cancel()
+        currency_conversion_activities.close()
+        activity_executor.shutdown()
+        if kuflow_executor is not activity_executor:
+            kuflow_executor.shutdown()
+
+
+def create_runtime(configuration: SamplesConfiguration) -> Optional["Runtime"]:
+    """Temporal runtime exporting the SDK and sample metrics to Prometheus, if ``temporal.metrics.port`` is set"""
+
+    if configuration.temporal_metrics_port is None:
+        return None
 
+    from temporalio.runtime import PrometheusConfig, Runtime, TelemetryConfig
 
-class SamplesConfiguration:
-    def __init__(
-        self,
-        *,
-        kuflow_api_endpoint: Optional[str] = None,
-        kuflow_api_client_id: str,
-        kuflow_api_client_secret: str,
-        temporal_host: Optional[str] = None,
-        temporal_queue: str,
-    ):
-        self.kuflow_api_endpoint = kuflow_api_endpoint
-        self.kuflow_api_client_id = kuflow_api_client_id
-        self.kuflow_api_client_secret = kuflow_api_client_secret
+    return Runtime(
+        telemetry=TelemetryConfig(
+            metrics=PrometheusConfig(bind_address=f"0.0.0.0:{configuration.temporal_metrics_port}"),
+        )
+    )
 
-        self.temporal_host = temporal_host
-        self.temporal_queue = temporal_queue
 
+def create_payload_codec(configuration: SamplesConfiguration) -> "CompressionCodec":
+    """Codec compressing the payloads above ``temporal.payload-compression.threshold`` bytes
 
-def load_configuration() -> SamplesConfiguration:
-    configuration_base = read_configuration("application.yaml")
-    configuration_local = read_configuration("application-local.yaml")
-    configuration = always_merger.merge(configuration_base, configuration_local)
+    Without a threshold nothing is compressed, but the payloads compressed while it was set are still decoded.
+    """
 
-    return parse_configuration(configuration)
+    from kuflow_samples_temporal_loan.codec import CompressionCodec
 
+    if configuration.temporal_payload_compression_level is None:
+        return CompressionCodec(threshold=configuration.temporal_payload_compression_threshold)
 
-def parse_configuration(configuration) -> SamplesConfiguration:
-    kuflow_api_endpoint = find_configuration_property(configuration, "KUFLOW_API_ENDPOINT", "kuflow.api.endpoint")
-    kuflow_api_client_id = retrieve_configuration_property(configuration, "KUFLOW_API_CLIENTID", "kuflow.api.client-id")
-    kuflow_api_client_secret = retrieve_configuration_property(
-        configuration, "KUFLOW_API_CLIENTSECRET", "kuflow.api.client-secret"
-    )
-    temporal_host = find_configuration_property(configuration, "TEMPORAL_TARGET", "temporal.target")
-    temporal_queue = retrieve_configuration_property(configuration, "TEMPORAL_KUFLOWQUEUE", "temporal.kuflow-queue")
-
-    return SamplesConfiguration(
-        kuflow_api_endpoint=kuflow_api_endpoint,
-        kuflow_api_client_id=kuflow_api_client_id,
-        kuflow_api_client_secret=kuflow_api_client_secret,
-        temporal_host=temporal_host,
-        temporal_queue=temporal_queue,
+    return CompressionCodec(
+        threshold=configuration.temporal_payload_compression_threshold,
+        level=configuration.temporal_payload_compression_level,
     )
 
 
-def retrieve_configuration_property(configuration: dict, property_environment_name: str, property_path: str) -> str:
-    value = find_configuration_property(configuration, property_environment_name, property_path)
-    if value is None:
-        raise Exception(f"Property {property_path} not found")
+def create_tracing_interceptors(configuration: SamplesConfiguration) -> List["Interceptor"]:
+    """OpenTelemetry tracing of the workflows, activities and HTTP calls, if ``tracing.exporter`` is set"""
 
-    return find_configuration_property_from_conf(configuration, property_path)
+    if configuration.tracing_exporter is None:
+        return []
 
+    # OpenTelemetry is an optional dependency, only imported when tracing is enabled
+    from kuflow_samples_temporal_loan.tracing import create_tracing_interceptor
 
-def find_configuration_property(
-    configuration: dict, property_environment_name: str, property_path: str
-) -> Optional[str]:
-    if os.environ.get(property_environment_name) is not None:
-        return os.environ[property_environment_name]
+    return [
+        create_tracing_interceptor(
+            service_name="kuflow-samples-temporal-loan",
+            exporter=configuration.tracing_exporter,
+            otlp_endpoint=configuration.tracing_otlp_endpoint,
+            file=configuration.tracing_file,
+            sampling_ratio=configuration.tracing_sampling_ratio
+            if configuration.tracing_sampling_ratio is not None
+            else 1.0,
+        )
+    ]
 
-    return find_configuration_property_from_conf(configuration, property_path)
 
+def temporal_worker_profile(configuration: SamplesConfiguration) -> dict:
+    """Worker options of the profile selected with ``--profile`` or ``temporal.worker.profile``
 
-def find_configuration_property_from_conf(configuration: dict, property_path: str) -> Optional[str]:
-    property_parts = property_path.split(".", 1)
-    property_name = property_parts[0] if len(property_parts) >= 1 else ""
-    property_path_rest = property_parts[1] if len(property_parts) == 2 else ""
-    value = configuration.get(property_name)
-    if value is None:
-        return None
+    ``development`` (the default) runs the workflows in debug mode, without deadlock detection, and with the
+    default sandbox. ``production`` disables the debug mode and passes the
+    ``SANDBOX_PASSTHROUGH_MODULES`` through the sandbox, preloading them.
+    """
+
+    profile = configuration.temporal_worker_profile or "development"
+    if profile == "development":
+        return {"debug_mode": True}
 
-    if isinstance(value, dict):
-        return find_configuration_property_from_conf(value, property_path_rest)
+    if profile == "production":
+        from temporalio.worker.workflow_sandbox import SandboxedWorkflowRunner, SandboxRestrictions
 
-    if isinstance(value, str) or isinstance(value, bool) or isinstance(value, int) or isinstance(value, float):
-        return str(value)
+        for module in SANDBOX_PASSTHROUGH_MODULES:
+            importlib.import_module(module)
 
-    return None
+        return {
+            "debug_mode": False,
+            "workflow_runner": SandboxedWorkflowRunner(
+                restrictions=SandboxRestrictions.default.with_passthrough_modules(*SANDBOX_PASSTHROUGH_MODULES)
+            ),
+        }
+
+    raise Exception(f"Worker profile {profile} not supported, use development or production")
+
+
+def temporal_worker_tuning(configuration: SamplesConfiguration) -> dict:
+    """Worker options configured by the user, the ones not configured keep the Temporal defaults"""
+
+    tuning = {
+        "max_concurrent_activities": configuration.temporal_worker_max_concurrent_activities,
+        "max_concurrent_local_activities": configuration.temporal_worker_max_concurrent_local_activities,
+        "max_concurrent_workflow_tasks": configuration.temporal_worker_max_concurrent_workflow_tasks,
+        "max_concurrent_activity_task_polls": configuration.temporal_worker_max_concurrent_activity_task_polls,
+        "max_concurrent_workflow_task_polls": configuration.temporal_worker_max_concurrent_workflow_task_polls,
+        "max_cached_workflows": configuration.temporal_worker_max_cached_workflows,
+        "graceful_shutdown_timeout": (
+            timedelta(seconds=configuration.temporal_worker_graceful_shutdown_timeout)
+            if configuration.temporal_worker_graceful_shutdown_timeout is not None
+            else None
+        ),
+    }
+
+    return {option: value for option, value in tuning.items() if value is not None}
 
 
-def read_configuration(file: str) -> dict:
-    configuration_path = Path(__file__).with_name(file)
+def create_activity_executor(configuration: SamplesConfiguration) -> Executor:
+    """Executor for the non-async activities, a thread pool unless ``temporal.worker.activity-executor`` is process
 
-    if configuration_path.exists() is False:
-        return {}
+    A process pool requires the blocking activities to be picklable, i.e. module level functions.
+    """
+
+    executor_type = configuration.temporal_worker_activity_executor or "thread"
+
+    if executor_type == "thread":
+        return create_activity_thread_pool(configuration)
+
+    if executor_type == "process":
+        from concurrent.futures import ProcessPoolExecutor
 
-    with open(Path(__file__).with_name(file)) as file:
-        yaml_data = yaml.safe_load(file)
+        return ProcessPoolExecutor(max_workers=configuration.temporal_worker_activity_executor_max_workers)
 
-        return dict(yaml_data)
+    raise Exception(f"Activity executor {executor_type} not supported, use thread or process")
+
+
+def create_activity_thread_pool(configuration: SamplesConfiguration) -> ThreadPoolExecutor:
+    """Thread pool sized like the activity slots, so no activity task waits for a thread"""
+
+    max_workers = (
+        configuration.temporal_worker_activity_executor_max_workers
+        or configuration.temporal_worker_max_concurrent_activities
+        or 100
+    )
+
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="activity")
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="KuFlow sample worker")
+    parser.add_argument(
+        "--profile",
+        choices=["development", "production"],
+        help="worker profile, overrides temporal.worker.profile",
+    )
+    parser.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="print the time of each startup phase and of the imports once the worker polls for the first time",
+    )
+
+    return parser.parse_args()
+
+
+def apply_arguments(configuration: SamplesConfiguration, arguments: argparse.Namespace) -> SamplesConfiguration:
+    """Configuration overridden by the command line arguments"""
+
+    if arguments.profile is not None:
+        return dataclasses.replace(configuration, temporal_worker_profile=arguments.profile)
+
+    return configuration
 
 
 if __name__ == "__main__":
-    asyncio.run(run_worker())
+    arguments = parse_arguments()
+    startup_profile = StartupProfile().start() if arguments.startup_profile else None
+
+    configuration = apply_arguments(load_configuration(), arguments)
+    if startup_profile is not None:
+        startup_profile.phase("configuration")
+
+    sys.exit(asyncio.run(run_worker(configuration, startup_profile=startup_profile)))
@@ -22,12 +22,14 @@
 # SOFTWARE.
 #
 
-from datetime import timedelta
-from typing import List
+from typing import Optional
 
 from kuflow_temporal_workflow_kuflow import uuid7
 from temporalio import workflow
-from temporalio.common import RetryPolicy
+
+from kuflow_samples_temporal_loan.orchestration import run_concurrently
+from kuflow_samples_temporal_loan.policies import CURRENCY_CONVERSION_ACTIVITY_POLICY, KUFLOW_QUICK_ACTIVITY_POLICY
+from kuflow_samples_temporal_loan.process_items import ProcessItemCompletionTracker
 
 
 with workflow.unsafe.imports_passed_through():
@@ -41,6 +43,7 @@ with workflow.unsafe.imports_passed_through():
         ConvertResponse,
         CurrencyConversionActivities,
     )
+    from kuflow_samples_temporal_loan.features import workflow_features
 
 
 @workflow.defn(name="SampleEngineWorkerLoanWorkflow")
@@ -50,17 +53,18 @@ class SampleWorkflow:
     _TASK_CODE_NOTIFICATION_OF_LOAN_GRANTED = "NOTIFICATION_GRANTED"
     _TASK_CODE_NOTIFICATION_OF_LOAN_REJECTION = "NOTIFICATION_REJECTION"
 
-    _KUFLOW_ACTIVITY_RETRY_POLICY = RetryPolicy()
-    _KUFLOW_ACTIVITY_START_TO_CLOSE_TIMEOUT = timedelta(minutes=10)
-    _KUFLOW_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT = timedelta(days=365)
+    # Workflows that updated the process metadata and converted the currency at the same time
+    _PATCH_CONCURRENT_METADATA_AND_CONVERSION = "concurrent-metadata-and-conversion"
+    # Workflows that converted the currency with a local activity, see WorkflowFeatures
+    _PATCH_CURRENCY_CONVERSION_LOCAL_ACTIVITY = "currency-conversion-local-activity"
 
     def __init__(self) -> None:
-        self._kuflow_completed_task_ids: List[str] = []
+        self._kuflow_process_items = ProcessItemCompletionTracker()
 
     @workflow.signal(name=models_workflow.KUFLOW_ENGINE_SIGNAL_PROCESS_ITEM)
     async def kuflow_engine_signal_process_item(self, signal: models_workflow.SignalProcessItem) -> None:
         if signal.type == models_workflow.SignalProcessItemType.TASK:
-            self._kuflow_completed_task_ids.append(signal.id)
+            self._kuflow_process_items.complete(signal.id)
 
     @workflow.run
     async def run(self, request: models_workflow.WorkflowRequest) -> models_workflow.WorkflowResponse:
@@ -68,13 +72,19 @@ class SampleWorkflow:
 
         process_item_loan_application = await self._create_process_item_loan_application(request.process_id)
 
-        await self._update_process_metadata(process_item_loan_application)
-
         currency = str(process_item_loan_application.task.data.value.get("CURRENCY"))
         amount = str(process_item_loan_application.task.data.value.get("AMOUNT"))
 
-        # Convert to euros
-        amount_eur = await self._convert_to_euros(currency, amount)
+        if workflow.patched(SampleWorkflow._PATCH_CONCURRENT_METADATA_AND_CONVERSION):
+            # Update the process metadata and convert to euros, they do not depend on each other
+            _, amount_eur = await run_concurrently(
+                self._update_process_metadata(process_item_loan_application),
+                self._convert_to_euros(currency, amount),
+            )
+        else:
+            # Workflows that reached this step before, one after the other
+            await self._update_process_metadata(process_item_loan_application)
+            amount_eur = await self._convert_to_euros(currency, amount)
 
         loan_authorized = True
         if float(amount_eur) > 5000:
@@ -116,22 +126,9 @@ class SampleWorkflow:
             ),
         )
 
-        await self._create_process_item_and_wait_completion(create_request)
+        return await self._create_process_item_and_wait_completion(create_request, retrieve=True)
 
-        retrieve_request = models_activity.ProcessItemRetrieveRequest(
-            process_item_id=process_item_id,
-        )
-        retrieve_response: models_activity.ProcessItemRetrieveResponse = await workflow.execute_activity(
-            KuFlowActivities.retrieve_process_item,
-            retrieve_request,
-            start_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_START_TO_CLOSE_TIMEOUT,
-            schedule_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT,
-            retry_policy=SampleWorkflow._KUFLOW_ACTIVITY_RETRY_POLICY,
-        )
-
-        return retrieve_response.process_item
-
-    async def _create_process_item_loan_application(self, process_id: str):
+    async def _create_process_item_loan_application(self, process_id: str) -> models_rest.ProcessItem:
         """Create process item "Loan Application" in KuFlow and wait for its completion"""
 
         process_item_id = str(uuid7())
@@ -143,17 +140,7 @@ class SampleWorkflow:
             process_item_definition_code=SampleWorkflow._TASK_CODE_LOAN_APPLICATION_FORM,
         )
 
-        await self._create_process_item_and_wait_completion(create_request)
-
-        retrieve_response: models_activity.ProcessItemRetrieveResponse = await workflow.execute_activity(
-            KuFlowActivities.retrieve_process_item,
-            models_activity.ProcessItemRetrieveRequest(process_item_id=process_item_id),
-            start_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_START_TO_CLOSE_TIMEOUT,
-            schedule_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT,
-            retry_policy=SampleWorkflow._KUFLOW_ACTIVITY_RETRY_POLICY,
-        )
-
-        return retrieve_response.process_item
+        return await self._create_process_item_and_wait_completion(create_request, retrieve=True)
 
     async def _create_process_item_notification_of_loan_granted(self, process_id: str):
         """Create process item "Notification of loan granted" in KuFlow and wait for its completion"""
@@ -202,31 +189,47 @@ class SampleWorkflow:
         await workflow.execute_activity(
             KuFlowActivities.patch_process_metadata,
             request,
-            start_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_START_TO_CLOSE_TIMEOUT,
-            schedule_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT,
-            retry_policy=SampleWorkflow._KUFLOW_ACTIVITY_RETRY_POLICY,
+            **KUFLOW_QUICK_ACTIVITY_POLICY.options(),
         )
 
     async def _convert_to_euros(self, currency: str, amount: str):
         if currency == "EUR":
             return amount
 
-        create_task_response: ConvertResponse = await workflow.execute_activity(
-            CurrencyConversionActivities.convert,
-            ConvertRequest(amount=float(amount), base_currency=currency.lower(), target_currency="eur"),
-            start_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_START_TO_CLOSE_TIMEOUT,
-            schedule_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT,
-            retry_policy=SampleWorkflow._KUFLOW_ACTIVITY_RETRY_POLICY,
-        )
+        convert_request = ConvertRequest(amount=float(amount), base_currency=currency.lower(), target_currency="eur")
+        if self._currency_conversion_local_activity():
+            convert_response: ConvertResponse = await workflow.execute_local_activity(
+                CurrencyConversionActivities.convert,
+                convert_request,
+                **CURRENCY_CONVERSION_ACTIVITY_POLICY.options(),
+            )
+        else:
+            convert_response: ConvertResponse = await workflow.execute_activity(
+                CurrencyConversionActivities.convert,
+                convert_request,
+                **CURRENCY_CONVERSION_ACTIVITY_POLICY.options(),
+            )
 
-        return str(create_task_response.amount)
+        return str(convert_response.amount)
 
-    async def _create_process_item_and_wait_completion(self, request: models_activity.ProcessItemCreateRequest) -> None:
-        await workflow.execute_activity(
-            KuFlowActivities.create_process_item,
+    @staticmethod
+    def _currency_conversion_local_activity() -> bool:
+        """Whether to convert with a local activity, as the workflow did when it first ran
+
+        The patch marker is only recorded when the feature is enabled. A replay follows the history whatever the
+        feature, local if the marker is there and remote otherwise.
+        """
+
+        if workflow_features().currency_conversion_local_activity or workflow.unsafe.is_replaying():
+            return workflow.patched(SampleWorkflow._PATCH_CURRENCY_CONVERSION_LOCAL_ACTIVITY)
+
+        return False
+
+    async def _create_process_item_and_wait_completion(
+        self, request: models_activity.ProcessItemCreateRequest, *, retrieve: bool = False
+    ) -> Optional[models_rest.ProcessItem]:
+        return await self._kuflow_process_items.create_and_wait_completion(
             request,
-            start_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_START_TO_CLOSE_TIMEOUT,
-            schedule_to_close_timeout=SampleWorkflow._KUFLOW_ACTIVITY_SCHEDULE_TO_CLOSE_TIMEOUT,
-            retry_policy=SampleWorkflow._KUFLOW_ACTIVITY_RETRY_POLICY,
+            retrieve=retrieve,
+            policy=KUFLOW_QUICK_ACTIVITY_POLICY,
         )
-        await workflow.wait_condition(lambda: request.id in self._kuflow_completed_task_ids)
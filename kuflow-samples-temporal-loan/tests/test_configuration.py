@@ -0,0 +1,168 @@
+#
+# MIT License
+#
+# Copyright (c) 2022 KuFlow
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import asyncio
+
+import pytest
+
+from kuflow_samples_temporal_loan import configuration
+from kuflow_samples_temporal_loan.activities import ConversionTableCache
+from kuflow_samples_temporal_loan.configuration import load_configuration, parse_configuration
+
+
+APPLICATION_YAML = {
+    "kuflow": {"api": {"endpoint": "https://api.kuflow.com/v2022-10-08", "client-id": "id", "client-secret": "secret"}},
+    "temporal": {"kuflow-queue": "queue", "worker": {"max-concurrent-activities": 100, "profile": "development"}},
+}
+
+REQUIRED_ENVIRONMENT_NAMES = ("KUFLOW_API_CLIENTID", "KUFLOW_API_CLIENTSECRET", "TEMPORAL_KUFLOWQUEUE")
+
+
+@pytest.fixture
+def configuration_files(monkeypatch):
+    """Contents of the configuration files by file name, instead of the files next to the module"""
+
+    files = {"application.yaml": APPLICATION_YAML}
+    monkeypatch.setattr(configuration, "read_configuration", lambda file: files.get(file, {}))
+    for configuration_property in configuration.PROPERTIES:
+        monkeypatch.delenv(configuration_property.environment_name, raising=False)
+
+    load_configuration.cache_clear()
+    yield files
+    load_configuration.cache_clear()
+
+
+def test_application_yaml(configuration_files):
+    loaded = load_configuration()
+
+    assert loaded.kuflow_api_endpoint == "https://api.kuflow.com/v2022-10-08"
+    assert loaded.temporal_queue == "queue"
+    assert loaded.temporal_worker_max_concurrent_activities == 100
+    assert loaded.temporal_worker_max_concurrent_workflow_tasks is None
+
+
+def test_local_file_overrides_application_yaml(configuration_files):
+    configuration_files["application-local.yaml"] = {"temporal": {"worker": {"max-concurrent-activities": 10}}}
+
+    loaded = load_configuration()
+
+    assert loaded.temporal_worker_max_concurrent_activities == 10
+    # The properties not in the local file keep the value of application.yaml
+    assert loaded.temporal_worker_profile == "development"
+    assert loaded.temporal_queue == "queue"
+
+
+def test_environment_overrides_the_files(configuration_files, monkeypatch):
+    configuration_files["application-local.yaml"] = {"temporal": {"worker": {"max-concurrent-activities": 10}}}
+    monkeypatch.setenv("TEMPORAL_WORKER_MAX_CONCURRENT_ACTIVITIES", "20")
+    monkeypatch.setenv("TEMPORAL_WORKER_PROFILE", "production")
+
+    loaded = load_configuration()
+
+    assert loaded.temporal_worker_max_concurrent_activities == 20
+    assert loaded.temporal_worker_profile == "production"
+
+
+def test_environment_alone_is_enough():
+    environment = {name: "value" for name in REQUIRED_ENVIRONMENT_NAMES}
+
+    loaded = parse_configuration({}, environment)
+
+    assert (loaded.kuflow_api_client_id, loaded.kuflow_api_client_secret, loaded.temporal_queue) == ("value",) * 3
+
+
+def test_zero_cache_ttl_is_kept(configuration_files, monkeypatch):
+    monkeypatch.setenv("CURRENCY_CACHE_TTL", "0")
+
+    assert load_configuration().currency_cache_ttl == 0
+
+
+def test_zero_cache_max_size_disables_the_cache(configuration_files, monkeypatch):
+    monkeypatch.setenv("CURRENCY_CACHE_MAXSIZE", "0")
+    fetches = []
+
+    async def fetch(base_currency: str) -> dict:
+        fetches.append(base_currency)
+        return {base_currency: 1.0}
+
+    async def lookups(cache: ConversionTableCache):
+        await cache.get("eur", fetch)
+        await cache.get("eur", fetch)
+
+    max_size = load_configuration().currency_cache_max_size
+    asyncio.run(lookups(ConversionTableCache(max_size=max_size)))
+
+    assert max_size == 0
+    assert fetches == ["eur", "eur"]
+
+
+def test_boolean_property(configuration_files, monkeypatch):
+    configuration_files["application.yaml"]["currency"] = {"conversion": {"local-activity": True}}
+    assert load_configuration().currency_conversion_local_activity is True
+
+    load_configuration.cache_clear()
+    monkeypatch.setenv("CURRENCY_CONVERSION_LOCALACTIVITY", "false")
+    assert load_configuration().currency_conversion_local_activity is False
+
+
+def test_configuration_is_loaded_once(configuration_files, monkeypatch):
+    loaded = load_configuration()
+    monkeypatch.setenv("TEMPORAL_WORKER_MAX_CONCURRENT_ACTIVITIES", "20")
+
+    assert load_configuration() is loaded
+
+
+def test_missing_required_property(configuration_files):
+    del configuration_files["application.yaml"]
+
+    with pytest.raises(Exception, match="Property kuflow.api.client-id not found"):
+        load_configuration()
+
+
+@pytest.mark.parametrize(
+    "environment_name, value, error",
+    [
+        ("TEMPORAL_WORKER_MAX_CONCURRENT_ACTIVITIES", "many", "must be int, not many"),
+        ("TEMPORAL_WORKER_MAX_CONCURRENT_ACTIVITIES", "0", "must be at least 1, not 0"),
+        ("TEMPORAL_METRICS_PORT", "70000", "must be at most 65535, not 70000"),
+        ("TEMPORAL_WORKER_PROFILE", "fast", "must be one of development, production, not fast"),
+        ("TRACING_EXPORTER", "file", "tracing.file not found"),
+        ("TEMPORAL_WORKER_ACTIVITY_EXECUTOR", "fiber", "must be one of thread, process, not fiber"),
+        ("CURRENCY_CACHE_TTL", "-1", "must be at least 0, not -1.0"),
+        ("CURRENCY_CACHE_MAXSIZE", "-1", "must be at least 0, not -1"),
+        ("CURRENCY_CONVERSION_LOCALACTIVITY", "maybe", "must be boolean, not maybe"),
+    ],
+)
+def test_invalid_environment_value(configuration_files, monkeypatch, environment_name, value, error):
+    monkeypatch.setenv(environment_name, value)
+
+    with pytest.raises(Exception, match=error):
+        load_configuration()
+
+
+def test_configuration_is_immutable(configuration_files):
+    loaded = load_configuration()
+
+    with pytest.raises(AttributeError):
+        loaded.temporal_queue = "other"
@@ -0,0 +1,114 @@
+#
+# MIT License
+#
+# Copyright (c) 2022 KuFlow
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import asyncio
+
+import pytest
+
+from kuflow_samples_temporal_loan.activities import ConversionTableCache, ConversionTableCacheStats
+
+
+def test_concurrent_misses_share_one_fetch_and_are_counted_as_coalesced():
+    fetches = []
+
+    async def fetch(base_currency: str) -> dict:
+        fetches.append(base_currency)
+        await asyncio.sleep(0.01)
+        return {"usd": 1.08}
+
+    async def lookups():
+        cache = ConversionTableCache()
+        tables = await asyncio.gather(*(cache.get("eur", fetch) for _ in range(5)))
+        await cache.get("eur", fetch)
+        return cache, tables
+
+    cache, tables = asyncio.run(lookups())
+
+    assert fetches == ["eur"]
+    assert tables == [{"usd": 1.08}] * 5
+    assert cache.stats == ConversionTableCacheStats(hits=1, misses=1, coalesced=4)
+
+
+def test_zero_ttl_is_not_replaced_by_the_default():
+    fetches = []
+
+    async def fetch(base_currency: str) -> dict:
+        fetches.append(base_currency)
+        return {"usd": 1.08}
+
+    async def lookups():
+        cache = ConversionTableCache(ttl=0)
+        await cache.get("eur", fetch)
+        await cache.get("eur", fetch)
+        return cache
+
+    cache = asyncio.run(lookups())
+
+    assert fetches == ["eur", "eur"]
+    assert cache.stats == ConversionTableCacheStats(misses=2)
+
+
+def test_zero_max_size_caches_nothing():
+    fetches = []
+
+    async def fetch(base_currency: str) -> dict:
+        fetches.append(base_currency)
+        return {base_currency: 1.0}
+
+    async def lookups():
+        cache = ConversionTableCache(max_size=0)
+        await cache.get("eur", fetch)
+        await cache.get("eur", fetch)
+
+    asyncio.run(lookups())
+
+    assert fetches == ["eur", "eur"]
+
+
+def test_stale_table_is_served_when_the_refresh_fails():
+    responses = [{"usd": 1.08}]
+
+    async def fetch(base_currency: str) -> dict:
+        if not responses:
+            raise Exception("Currency endpoint unavailable")
+        return responses.pop()
+
+    async def lookups():
+        cache = ConversionTableCache(ttl=0)
+        await cache.get("eur", fetch)
+        table = await cache.get("eur", fetch)
+        return cache, table
+
+    cache, table = asyncio.run(lookups())
+
+    assert table == {"usd": 1.08}
+    assert cache.stats == ConversionTableCacheStats(misses=2, stale_serves=1)
+
+
+def test_failed_fetch_without_stale_table_is_raised():
+    async def fetch(base_currency: str) -> dict:
+        raise Exception("Currency endpoint unavailable")
+
+    with pytest.raises(Exception, match="Currency endpoint unavailable"):
+        asyncio.run(ConversionTableCache().get("eur", fetch))
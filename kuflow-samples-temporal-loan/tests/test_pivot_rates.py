@@ -0,0 +1,148 @@
+#
+# MIT License
+#
+# Copyright (c) 2022 KuFlow
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import asyncio
+import itertools
+import math
+
+import pytest
+from temporalio.testing import ActivityEnvironment
+
+from kuflow_samples_temporal_loan.activities import ConvertRequest, CurrencyConversionActivities
+
+
+# Rates of one euro, from which the conversion tables are built as the currency endpoint publishes them: one table
+# per base currency, each rate rounded to 6 significant digits, so the derived rates differ from the direct ones
+EURO_RATES = {"eur": 1.0, "usd": 1.0812, "gbp": 0.85463, "jpy": 161.873, "chf": 0.97312}
+
+CURRENCIES = sorted(EURO_RATES)
+
+
+def conversion_table(base_currency: str) -> dict:
+    return {
+        currency: float(f"{rate / EURO_RATES[base_currency]:.6g}")
+        for currency, rate in EURO_RATES.items()
+        if currency != base_currency
+    }
+
+
+async def convert(activities: CurrencyConversionActivities, base_currency: str, target_currency: str) -> float:
+    response = await ActivityEnvironment().run(
+        activities.convert, ConvertRequest(amount=1000, base_currency=base_currency, target_currency=target_currency)
+    )
+
+    return response.amount
+
+
+def create_activities(currency_endpoint, **options) -> CurrencyConversionActivities:
+    activities = CurrencyConversionActivities(endpoint=currency_endpoint, **options)
+    if currency_endpoint is None:
+
+        async def retrieve_conversion_table(base_currency: str) -> dict:
+            return conversion_table(base_currency)
+
+        activities._retrieve_conversion_table = retrieve_conversion_table
+
+    return activities
+
+
+@pytest.mark.parametrize("pivot_currency", ["eur", "usd"])
+def test_derived_rates_match_the_direct_ones(pivot_currency, rate_tolerance, currency_endpoint):
+    pairs = list(itertools.permutations(CURRENCIES, 2))
+
+    async def convert_all():
+        direct = create_activities(currency_endpoint)
+        derived = create_activities(currency_endpoint, pivot_currency=pivot_currency)
+        try:
+            return [(await convert(direct, *pair), await convert(derived, *pair)) for pair in pairs]
+        finally:
+            direct.close()
+            derived.close()
+
+    mismatches = [
+        f"{base_currency}->{target_currency}: direct {direct_amount}, derived {derived_amount}"
+        for (base_currency, target_currency), (direct_amount, derived_amount) in zip(pairs, asyncio.run(convert_all()))
+        if not math.isclose(direct_amount, derived_amount, rel_tol=rate_tolerance)
+    ]
+
+    assert not mismatches, f"{len(mismatches)} rates out of the {rate_tolerance} tolerance: {mismatches}"
+
+
+def convert_many(activities: CurrencyConversionActivities, convert_requests: list) -> tuple:
+    fetches = []
+
+    async def retrieve_conversion_table(base_currency: str) -> dict:
+        fetches.append(base_currency)
+        return conversion_table(base_currency)
+
+    activities._retrieve_conversion_table = retrieve_conversion_table
+    try:
+        responses = asyncio.run(ActivityEnvironment().run(activities.convert_many, convert_requests))
+    finally:
+        activities.close()
+
+    return [it.amount for it in responses], fetches
+
+
+def test_convert_many_resolves_each_currency_pair_once():
+    convert_requests = [
+        ConvertRequest(amount=100, base_currency="usd", target_currency="eur"),
+        ConvertRequest(amount=200, base_currency="gbp", target_currency="eur"),
+        ConvertRequest(amount=300, base_currency="usd", target_currency="eur"),
+        ConvertRequest(amount=400, base_currency="usd", target_currency="jpy"),
+        ConvertRequest(amount=500, base_currency="gbp", target_currency="eur"),
+    ]
+    activities = CurrencyConversionActivities()
+    resolved_pairs = []
+    retrieve_exchange_rate = activities._retrieve_exchange_rate
+
+    async def record_exchange_rate(base_currency: str, target_currency: str) -> float:
+        resolved_pairs.append((base_currency, target_currency))
+        return await retrieve_exchange_rate(base_currency, target_currency)
+
+    activities._retrieve_exchange_rate = record_exchange_rate
+
+    amounts, fetches = convert_many(activities, convert_requests)
+
+    assert resolved_pairs == [("usd", "eur"), ("gbp", "eur"), ("usd", "jpy")]
+    assert sorted(fetches) == ["gbp", "usd"]
+    # In the order of the requests
+    assert amounts == [it.amount * conversion_table(it.base_currency)[it.target_currency] for it in convert_requests]
+
+
+def test_convert_many_derives_the_cross_rates_from_the_pivot_table():
+    convert_requests = [
+        ConvertRequest(amount=100, base_currency="usd", target_currency="gbp"),
+        ConvertRequest(amount=200, base_currency="jpy", target_currency="eur"),
+        ConvertRequest(amount=300, base_currency="eur", target_currency="chf"),
+        ConvertRequest(amount=400, base_currency="usd", target_currency="gbp"),
+    ]
+    pivot_table = {**conversion_table("eur"), "eur": 1.0}
+
+    amounts, fetches = convert_many(CurrencyConversionActivities(pivot_currency="eur"), convert_requests)
+
+    assert fetches == ["eur"]
+    assert amounts == [
+        it.amount * (pivot_table[it.target_currency] / pivot_table[it.base_currency]) for it in convert_requests
+    ]
@@ -0,0 +1,66 @@
+#
+# MIT License
+#
+# Copyright (c) 2022 KuFlow
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import asyncio
+import time
+
+from kuflow_samples_temporal_loan.activities import CurrencyConversionActivities
+
+
+def test_failed_refresh_is_retried_with_backoff(tmp_path):
+    attempts = []
+
+    async def retrieve_conversion_table(base_currency: str) -> dict:
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise Exception("Currency endpoint unavailable")
+        return {"usd": 1.08, "gbp": 0.85}
+
+    async def refresh_until_snapshot() -> CurrencyConversionActivities:
+        activities = CurrencyConversionActivities(
+            snapshot_path=str(tmp_path / "rates.snapshot"),
+            snapshot_refresh_interval=60,
+            snapshot_retry_interval=0.05,
+        )
+        activities._retrieve_conversion_table = retrieve_conversion_table
+
+        refresh = asyncio.create_task(activities.run_snapshot_refresh())
+        try:
+            while activities._snapshot is None:
+                await asyncio.sleep(0.01)
+        finally:
+            refresh.cancel()
+
+        return activities
+
+    activities = asyncio.run(asyncio.wait_for(refresh_until_snapshot(), timeout=5))
+    try:
+        assert activities._snapshot.exchange_rate("usd", "gbp") == 0.85 / 1.08
+    finally:
+        activities.close()
+
+    # Retried after the retry interval, doubled after the second failure, not after the refresh interval
+    assert len(attempts) == 3
+    assert 0.05 <= attempts[1] - attempts[0] < 1
+    assert 0.1 <= attempts[2] - attempts[1] < 1
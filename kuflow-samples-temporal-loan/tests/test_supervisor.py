@@ -0,0 +1,61 @@
+#
+# MIT License
+#
+# Copyright (c) 2022 KuFlow
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import multiprocessing
+import signal
+import time
+
+from kuflow_samples_temporal_loan.configuration import SamplesConfiguration
+from kuflow_samples_temporal_loan.supervisor import WorkerSupervisor
+
+
+def _ignore_sigterm(ready) -> None:
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    ready.set()
+    while True:
+        time.sleep(1)
+
+
+def test_stop_kills_the_workers_still_running_after_the_graceful_shutdown_timeout(monkeypatch):
+    monkeypatch.setattr(WorkerSupervisor, "_STOP_GRACE", 0.5)
+    configuration = SamplesConfiguration(
+        kuflow_api_client_id="client",
+        kuflow_api_client_secret="secret",
+        temporal_queue="queue",
+        temporal_worker_graceful_shutdown_timeout=0.5,
+    )
+    supervisor = WorkerSupervisor(configuration, 1)
+    context = multiprocessing.get_context("spawn")
+    ready = context.Event()
+    process = context.Process(target=_ignore_sigterm, args=(ready,))
+    process.start()
+    assert ready.wait(10)
+    supervisor._processes[0] = process
+
+    started_at = time.monotonic()
+    supervisor._stop()
+
+    assert not process.is_alive()
+    assert process.exitcode == -signal.SIGKILL
+    assert 1 <= time.monotonic() - started_at < 5
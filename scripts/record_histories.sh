@@ -0,0 +1,20 @@
+#!/bin/sh
+# records the replay fixtures of the Temporal samples in benchmarks/histories against a real Temporal server, the test
+# server by default, downloaded by the Temporal SDK on its first run, and replays them with the current workflows
+#
+# The fixtures stand for the workflows open when a workflow change is deployed, so record them with the workflows of
+# the last release: scripts/record_histories.sh <git revision of the last release> [local|time-skipping|host:port]
+# set -x
+set -u
+set -e
+DIR="$( cd "$( dirname "$0" )" && pwd )"
+cd "${DIR}/.." || exit
+
+_revision="${1:?usage: scripts/record_histories.sh <git revision> [local|time-skipping|host:port]}"
+_server="${2:-time-skipping}"
+for sample in loan expense
+do
+  echo "=== recording ${sample} with the workflows of ${_revision} on ${_server} ==="
+  poetry run python -m benchmarks.replay record --sample "${sample}" --workflows 10 --server "${_server}" --revision "${_revision}"
+done
+poetry run python -m benchmarks.replay replay --iterations 1
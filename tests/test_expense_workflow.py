@@ -0,0 +1,116 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import asyncio
+import dataclasses
+from typing import List
+
+import pytest
+from temporalio.client import WorkflowHistory
+
+from benchmarks.load_test import run_in_process
+from benchmarks.replay import load_histories, replay
+from benchmarks.samples import SAMPLES, kuflow_data_converter
+from kuflow_samples_expense_reimbursement.features import WorkflowFeatures, set_workflow_features
+from kuflow_samples_expense_reimbursement.workflow import ExpenseClaimReview
+
+
+@pytest.fixture(autouse=True)
+def default_workflow_features():
+    yield
+    set_workflow_features(WorkflowFeatures())
+
+
+def run_expense_workflow(features: WorkflowFeatures, reviews: int) -> List[WorkflowHistory]:
+    """Histories of the runs of a workflow whose claim is sent back for review ``reviews`` times and then accepted"""
+
+    sample = dataclasses.replace(
+        SAMPLES["expense"],
+        human_tasks={
+            "FILL_INFO": [{"AMOUNT": "2000"}],
+            "APPROVAL": [{"DECISION": "REVIEW"}] * reviews + [{"DECISION": "ACCEPTED"}],
+        },
+    )
+    set_workflow_features(features)
+    histories: List[WorkflowHistory] = []
+    report = asyncio.run(run_in_process(sample, server="fake", workflows=1, concurrency=1, histories=histories))
+    assert report.failed == 0
+
+    return histories
+
+
+def scheduled_activities(history: WorkflowHistory, activity_type: str) -> int:
+    return sum(
+        1
+        for event in history.events
+        if event.HasField("activity_task_scheduled_event_attributes")
+        and event.activity_task_scheduled_event_attributes.activity_type.name == activity_type
+    )
+
+
+def review_memo(history: WorkflowHistory) -> ExpenseClaimReview:
+    memo = history.events[0].workflow_execution_started_event_attributes.memo.fields
+
+    return kuflow_data_converter().payload_converter.from_payloads([memo["review"]], [ExpenseClaimReview])[0]
+
+
+def test_review_loop_continues_as_new_carrying_its_state():
+    histories = run_expense_workflow(WorkflowFeatures(review_continue_as_new_iterations=40), reviews=200)
+
+    # 40 reviews per run, the last run has the acceptance
+    assert len(histories) == 6
+    for history in histories[:-1]:
+        assert history.events[-1].HasField("workflow_execution_continued_as_new_event_attributes")
+    assert histories[-1].events[-1].HasField("workflow_execution_completed_event_attributes")
+
+    assert "review" not in histories[0].events[0].workflow_execution_started_event_attributes.memo.fields
+    for history in histories[1:]:
+        assert review_memo(history) == ExpenseClaimReview(previous_task_data={"AMOUNT": "2000"}, owner_id="initiator")
+
+    # The submit and approve tasks of the 200 reviews and of the acceptance, and the reimbursement
+    assert sum(scheduled_activities(history, "KuFlow_Engine_createProcessItem") for history in histories) == 2 * 201 + 1
+
+    # The runs replay with other thresholds, they recorded when they continued as new
+    set_workflow_features(WorkflowFeatures())
+    assert asyncio.run(replay(SAMPLES["expense"], histories))
+    set_workflow_features(
+        WorkflowFeatures(review_continue_as_new_iterations=7, review_continue_as_new_history_length=50)
+    )
+    assert asyncio.run(replay(SAMPLES["expense"], histories))
+
+
+def test_process_initiator_is_retrieved_once():
+    histories = run_expense_workflow(WorkflowFeatures(review_continue_as_new_iterations=2), reviews=5)
+
+    # Retrieved by the first submission, the next ones and the runs continued as new reuse it
+    assert [scheduled_activities(history, "KuFlow_Engine_retrieveProcess") for history in histories] == [1, 0, 0]
+    assert asyncio.run(replay(SAMPLES["expense"], histories))
+
+
+def test_recorded_histories_replay():
+    # Recorded when the process initiator was retrieved on every submission
+    histories = load_histories(SAMPLES["expense"])
+
+    assert histories
+    assert asyncio.run(replay(SAMPLES["expense"], histories))
@@ -0,0 +1,96 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import asyncio
+from typing import List, Sequence
+
+from temporalio.client import WorkflowHistory
+
+from benchmarks.fake_kuflow import KuFlowFault
+from benchmarks.load_test import LoadTestReport, run_in_process
+from benchmarks.samples import SAMPLES
+
+
+# The Temporal stand-in enforces the activity timeouts 500 times faster: 30 seconds are 60 ms and 10 minutes 1.2 s
+TIME_SCALE = 0.002
+# A hung KuFlow call, longer than any recovery
+HANG = 10
+
+
+def run_with_faults(
+    sample: str, faults: Sequence[KuFlowFault], histories: List[WorkflowHistory], workflows: int = 3
+) -> LoadTestReport:
+    report = asyncio.run(
+        run_in_process(
+            SAMPLES[sample],
+            server="fake",
+            workflows=workflows,
+            concurrency=workflows,
+            histories=histories,
+            time_scale=TIME_SCALE,
+            kuflow_faults=faults,
+        )
+    )
+    assert report.failed == 0
+
+    return report
+
+
+def started_attempts(history: WorkflowHistory, activity_type: str) -> List[int]:
+    activity_types = {
+        event.event_id: event.activity_task_scheduled_event_attributes.activity_type.name
+        for event in history.events
+        if event.HasField("activity_task_scheduled_event_attributes")
+    }
+
+    return [
+        event.activity_task_started_event_attributes.attempt
+        for event in history.events
+        if event.HasField("activity_task_started_event_attributes")
+        and activity_types[event.activity_task_started_event_attributes.scheduled_event_id] == activity_type
+    ]
+
+
+def test_hung_quick_call_is_retried_after_its_start_to_close_timeout():
+    histories: List[WorkflowHistory] = []
+    # The metadata update of every workflow hangs once
+    report = run_with_faults(
+        "loan", [KuFlowFault("PATCH", r"/processes/[^/]+/metadata$", times=3, hang=HANG)], histories
+    )
+
+    # Recovered once the 30 seconds, 60 ms here, of the quick policy are over, instead of when the call returns
+    assert report.latency_max < HANG / 4
+    for history in histories:
+        assert started_attempts(history, "KuFlow_Engine_patchProcessMetadata") == [2]
+
+
+def test_hung_upload_call_is_retried_after_its_start_to_close_timeout():
+    histories: List[WorkflowHistory] = []
+    # The task data update of the reimbursement hangs once
+    report = run_with_faults("expense", [KuFlowFault("PUT", r"/task/data$", hang=HANG)], histories, workflows=1)
+
+    # The worker heartbeats while the call hangs, so it only recovers after the 10 minutes, 1.2 s here, of the upload
+    # policy, without a heartbeat timeout on the way
+    assert 1.2 < report.latency_max < HANG / 4
+    assert started_attempts(histories[0], "KuFlow_Engine_updateProcessItemTaskData") == [2]
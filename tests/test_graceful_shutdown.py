@@ -0,0 +1,112 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+import asyncio
+import os
+import signal
+import uuid
+from datetime import timedelta
+
+from temporalio import activity, workflow
+from temporalio.client import Client
+from temporalio.common import RetryPolicy
+from temporalio.worker import UnsandboxedWorkflowRunner, Worker
+
+from benchmarks.fake_temporal import FakeTemporalServer
+from kuflow_samples_temporal_loan.shutdown import (
+    EXIT_CODE_ACTIVITIES_CANCELLED,
+    EXIT_CODE_STOPPED,
+    GracefulShutdown,
+)
+
+
+TASK_QUEUE = "graceful-shutdown"
+
+
+@workflow.defn(name="GracefulShutdownInFlightActivity")
+class InFlightActivityWorkflow:
+    @workflow.run
+    async def run(self, seconds: float) -> None:
+        await workflow.execute_activity(
+            "InFlightActivity",
+            seconds,
+            start_to_close_timeout=timedelta(minutes=1),
+            retry_policy=RetryPolicy(maximum_attempts=1),
+        )
+
+
+class WorkerConnection:
+    """The part of ``KuFlowTemporalConnection`` that ``GracefulShutdown`` uses, for a worker created by the test"""
+
+    def __init__(self, worker: Worker):
+        self._worker = worker
+
+    async def create_worker(self) -> Worker:
+        return self._worker
+
+    async def run_worker(self) -> None:
+        await self._worker.run()
+
+
+async def stop_with_an_activity_in_flight(activity_seconds: float, graceful_shutdown_timeout: float) -> int:
+    """Exit code of a worker receiving SIGTERM while it runs an activity lasting ``activity_seconds``"""
+
+    activity_started = asyncio.Event()
+
+    @activity.defn(name="InFlightActivity")
+    async def in_flight_activity(seconds: float) -> None:
+        activity_started.set()
+        await asyncio.sleep(seconds)
+
+    with FakeTemporalServer(poll_timeout=1) as server:
+        client = await Client.connect(server.target)
+        graceful_shutdown = GracefulShutdown()
+        worker = Worker(
+            client,
+            task_queue=TASK_QUEUE,
+            workflows=[InFlightActivityWorkflow],
+            activities=[in_flight_activity],
+            interceptors=[graceful_shutdown],
+            workflow_runner=UnsandboxedWorkflowRunner(),
+            graceful_shutdown_timeout=timedelta(seconds=graceful_shutdown_timeout),
+        )
+        # Installs the signal handlers before polling, so before the activity starts
+        run_task = asyncio.create_task(graceful_shutdown.run_worker(WorkerConnection(worker)))
+
+        await client.start_workflow(
+            InFlightActivityWorkflow.run, activity_seconds, id=str(uuid.uuid4()), task_queue=TASK_QUEUE
+        )
+        await asyncio.wait_for(activity_started.wait(), 10)
+        os.kill(os.getpid(), signal.SIGTERM)
+
+        return await asyncio.wait_for(run_task, 10)
+
+
+def test_worker_exits_with_stopped_when_the_activity_finishes_within_the_timeout():
+    assert asyncio.run(stop_with_an_activity_in_flight(0.5, graceful_shutdown_timeout=5)) == EXIT_CODE_STOPPED
+
+
+def test_worker_exits_with_activities_cancelled_when_the_timeout_is_hit():
+    exit_code = asyncio.run(stop_with_an_activity_in_flight(30, graceful_shutdown_timeout=0.5))
+
+    assert exit_code == EXIT_CODE_ACTIVITIES_CANCELLED
@@ -0,0 +1,117 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import asyncio
+from typing import Dict, List
+
+import pytest
+from temporalio.client import WorkflowHistory
+
+from benchmarks.load_test import run_in_process
+from benchmarks.replay import load_histories, replay
+from benchmarks.samples import SAMPLES
+from kuflow_samples_temporal_loan.features import WorkflowFeatures, set_workflow_features
+
+
+@pytest.fixture(autouse=True)
+def default_workflow_features():
+    yield
+    set_workflow_features(WorkflowFeatures())
+
+
+def run_loan_workflows(features: WorkflowFeatures, workflows: int = 3) -> List[WorkflowHistory]:
+    set_workflow_features(features)
+    histories: List[WorkflowHistory] = []
+    report = asyncio.run(
+        run_in_process(SAMPLES["loan"], server="fake", workflows=workflows, concurrency=workflows, histories=histories)
+    )
+    assert report.failed == 0
+
+    return histories
+
+
+def scheduled_activities(history: WorkflowHistory) -> List[str]:
+    return [
+        event.activity_task_scheduled_event_attributes.activity_type.name
+        for event in history.events
+        if event.HasField("activity_task_scheduled_event_attributes")
+    ]
+
+
+def scheduling_workflow_tasks(history: WorkflowHistory) -> Dict[str, int]:
+    return {
+        event.activity_task_scheduled_event_attributes.activity_type.name: (
+            event.activity_task_scheduled_event_attributes.workflow_task_completed_event_id
+        )
+        for event in history.events
+        if event.HasField("activity_task_scheduled_event_attributes")
+    }
+
+
+def markers(history: WorkflowHistory) -> List[str]:
+    return [
+        event.marker_recorded_event_attributes.marker_name
+        for event in history.events
+        if event.HasField("marker_recorded_event_attributes")
+    ]
+
+
+def test_currency_conversion_is_a_remote_activity_by_default():
+    histories = run_loan_workflows(WorkflowFeatures())
+
+    for history in histories:
+        assert "Currency_convert" in scheduled_activities(history)
+        assert "core_local_activity" not in markers(history)
+
+    # Enabling the local activity does not change the workflows that already converted
+    set_workflow_features(WorkflowFeatures(currency_conversion_local_activity=True))
+    assert asyncio.run(replay(SAMPLES["loan"], histories))
+
+
+def test_currency_conversion_local_activity_replays_once_disabled():
+    histories = run_loan_workflows(WorkflowFeatures(currency_conversion_local_activity=True))
+
+    for history in histories:
+        assert "Currency_convert" not in scheduled_activities(history)
+        assert "core_local_activity" in markers(history)
+
+    set_workflow_features(WorkflowFeatures(currency_conversion_local_activity=False))
+    assert asyncio.run(replay(SAMPLES["loan"], histories))
+
+
+def test_process_metadata_and_currency_conversion_run_concurrently():
+    histories = run_loan_workflows(WorkflowFeatures())
+
+    for history in histories:
+        workflow_tasks = scheduling_workflow_tasks(history)
+        assert workflow_tasks["KuFlow_Engine_patchProcessMetadata"] == workflow_tasks["Currency_convert"]
+        assert "core_patch" in markers(history)
+
+
+def test_recorded_histories_replay():
+    # Recorded before the metadata update and the currency conversion ran at the same time
+    histories = load_histories(SAMPLES["loan"])
+
+    assert histories
+    assert asyncio.run(replay(SAMPLES["loan"], histories))
@@ -0,0 +1,105 @@
+#
+# MIT License
+#
+# Copyright © 2024-present KuFlow S.L.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import asyncio
+from collections import defaultdict
+from typing import Any, Dict, List
+
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from benchmarks.load_test import run_in_process
+from benchmarks.samples import SAMPLES
+from kuflow_samples_temporal_loan.tracing import (
+    KuFlowTracingInterceptor,
+    create_tracer_provider,
+    workflow_root_ids,
+)
+
+
+def run_traced_loan_workflows(sampling_ratio: float, workflows: int = 3, **worker_options: Any) -> List[ReadableSpan]:
+    exporter = InMemorySpanExporter()
+    tracer_provider = create_tracer_provider(service_name="test", sampling_ratio=sampling_ratio)
+    tracer_provider.add_span_processor(SimpleSpanProcessor(exporter))
+
+    report = asyncio.run(
+        run_in_process(
+            SAMPLES["loan"],
+            server="fake",
+            workflows=workflows,
+            concurrency=workflows,
+            interceptors=[KuFlowTracingInterceptor(tracer_provider)],
+            **worker_options,
+        )
+    )
+    assert report.failed == 0
+
+    return list(exporter.get_finished_spans())
+
+
+def test_workflows_started_without_trace_context_get_a_root_span():
+    spans = run_traced_loan_workflows(sampling_ratio=1.0)
+
+    traces: Dict[int, List[ReadableSpan]] = defaultdict(list)
+    for span in spans:
+        traces[span.context.trace_id].append(span)
+    assert len(traces) == 3
+
+    for trace_spans in traces.values():
+        (root,) = (span for span in trace_spans if span.parent is None)
+        assert root.name == "Workflow:SampleEngineWorkerLoanWorkflow"
+        assert (root.context.trace_id, root.context.span_id) == workflow_root_ids(root.attributes["temporalRunID"])
+
+        names = {span.name for span in trace_spans}
+        assert "RunWorkflow:SampleEngineWorkerLoanWorkflow" in names
+        assert "RunActivity:KuFlow_Engine_createProcessItem" in names
+
+        process_id = root.attributes["kuflow.process.id"]
+        for span in trace_spans:
+            # The workflow spans, the activities get the ids of their own arguments
+            if span.name.startswith(("RunWorkflow", "StartActivity", "HandleSignal")):
+                assert span.attributes["kuflow.process.id"] == process_id
+
+        spans_by_id = {span.context.span_id: span for span in trace_spans}
+        for span in trace_spans:
+            if span.name == "RunActivity:KuFlow_Engine_createProcessItem":
+                assert span.attributes["kuflow.process_item.id"]
+                assert spans_by_id[span.parent.span_id].name == "StartActivity:KuFlow_Engine_createProcessItem"
+
+
+def test_workflows_are_sampled_as_a_whole():
+    assert run_traced_loan_workflows(sampling_ratio=0) == []
+
+
+def test_replayed_workflows_record_their_spans_once():
+    # Without a workflow cache every workflow task replays the run from the start
+    spans = run_traced_loan_workflows(sampling_ratio=1.0, workflows=1, max_cached_workflows=0)
+
+    names = [span.name for span in spans]
+    assert names.count("Workflow:SampleEngineWorkerLoanWorkflow") == 1
+    assert names.count("RunWorkflow:SampleEngineWorkerLoanWorkflow") == 1
+    assert names.count("StartActivity:KuFlow_Engine_createProcessItem") == names.count(
+        "RunActivity:KuFlow_Engine_createProcessItem"
+    )